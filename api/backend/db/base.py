@@ -0,0 +1,226 @@
+"""
+PostgreSQL backend with an in-process connection pool and health checks.
+
+Django 3.2 has neither, so this wraps the stock ``postgresql`` backend. Extra
+keys read from the ``DATABASES`` entry:
+
+    POOL_SIZE           maximum connections per process, 0 disables the pool
+    POOL_TIMEOUT        seconds to wait for a free connection before failing
+    CONN_HEALTH_CHECKS  check a reused connection before its first query in
+                        a request (same meaning as in Django >= 4.1)
+
+With a pool, ``close()`` hands the connection back instead of closing it, so
+use it with ``CONN_MAX_AGE = 0``.
+"""
+
+import threading
+
+import psycopg2
+import psycopg2.extras
+from django.db.backends.postgresql import base, creation
+from psycopg2.extensions import (
+    TRANSACTION_STATUS_IDLE,
+    TRANSACTION_STATUS_UNKNOWN,
+)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """Thread-safe pool of idle connections to one database.
+
+    Connections are opened lazily, handed out most recently used first, and
+    callers block for up to ``timeout`` seconds when all ``size`` are taken.
+    """
+
+    def __init__(self, alias, size, timeout, conn_params):
+        self.alias = alias
+        self.dbname = conn_params.get('database') or conn_params.get('dbname')
+        self.size = size
+        self.timeout = timeout
+        self.conn_params = conn_params
+        self.in_use = 0
+        self.waiting = 0
+        self.closed = False
+        self._idle = []
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+    def getconn(self, health_check=False):
+        with self._lock:
+            self.waiting += 1
+        acquired = self._slots.acquire(timeout=self.timeout)
+        with self._lock:
+            self.waiting -= 1
+        if not acquired:
+            raise psycopg2.OperationalError(
+                f"connection pool exhausted ({self.size} connections in use)"
+            )
+        try:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            if connection is not None:
+                usable = (
+                    self.is_usable(connection)
+                    if health_check
+                    else not connection.closed
+                )
+                if not usable:
+                    connection.close()
+                    connection = None
+            if connection is None:
+                connection = psycopg2.connect(**self.conn_params)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_use += 1
+        return connection
+
+    def putconn(self, connection):
+        try:
+            if not connection.closed:
+                status = connection.info.transaction_status
+                if self.closed or status == TRANSACTION_STATUS_UNKNOWN:
+                    connection.close()
+                elif status != TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+        except psycopg2.Error:
+            connection.close()
+        finally:
+            with self._lock:
+                if not connection.closed:
+                    self._idle.append(connection)
+                self.in_use -= 1
+            self._slots.release()
+
+    @staticmethod
+    def is_usable(connection):
+        if connection.closed:
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except psycopg2.Error:
+            return False
+        return True
+
+    def closeall(self):
+        """Close idle connections now and checked-out ones when returned."""
+        with self._lock:
+            self.closed = True
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'in_use': self.in_use,
+                'idle': len(self._idle),
+                'waiting': self.waiting,
+                'saturation': round(self.in_use / self.size, 3),
+            }
+
+
+def get_pools(alias=None):
+    with _pools_lock:
+        return [pool for pool in _pools.values() if alias in (None, pool.alias)]
+
+
+def close_pools(dbname):
+    """Close every pooled connection to ``dbname``, e.g. before dropping it."""
+    with _pools_lock:
+        for key, pool in list(_pools.items()):
+            if pool.dbname == dbname:
+                pool.closeall()
+                del _pools[key]
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # idle pooled connections would make DROP DATABASE fail
+        close_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = None
+        self.health_check_done = False
+
+    @property
+    def pool_size(self):
+        return self.settings_dict.get('POOL_SIZE', 0)
+
+    @property
+    def health_checks_enabled(self):
+        return self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+
+    def get_pool(self, conn_params):
+        # keyed by the parameters too: the test runner renames the database
+        key = (self.alias, repr(sorted(conn_params.items())))
+        with _pools_lock:
+            if key not in _pools:
+                _pools[key] = ConnectionPool(
+                    self.alias,
+                    self.pool_size,
+                    self.settings_dict.get('POOL_TIMEOUT', 10),
+                    conn_params,
+                )
+            return _pools[key]
+
+    def get_new_connection(self, conn_params):
+        if not self.pool_size:
+            return super().get_new_connection(conn_params)
+
+        self.pool = self.get_pool(conn_params)
+        connection = self.pool.getconn(health_check=self.health_checks_enabled)
+        # a checked-out connection is fresh for the current request
+        self.health_check_done = True
+
+        # same session setup as the stock backend does for new connections
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(
+            conn_or_curs=connection, loads=lambda x: x
+        )
+        return connection
+
+    def _close(self):
+        if self.pool is None or self.connection is None:
+            return super()._close()
+        pool, self.pool = self.pool, None
+        with self.wrap_database_errors:
+            pool.putconn(self.connection)
+
+    def close_if_unusable_or_obsolete(self):
+        # runs at the start and end of every request
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (
+            self.connection is not None
+            and self.health_checks_enabled
+            and not self.health_check_done
+            and not self.in_atomic_block
+        ):
+            if not self.is_usable():
+                self.close()
+            self.health_check_done = True
+        super().ensure_connection()
+
+    def pool_stats(self):
+        return [pool.stats() for pool in get_pools(self.alias)]
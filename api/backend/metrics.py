@@ -0,0 +1,245 @@
+"""
+Per-endpoint request metrics, exported in the Prometheus text format.
+
+``MetricsMiddleware`` records, per view name and DRF action, the request
+latency, how many SQL queries ran and how long they took, and how long the
+response took to render (DRF serializes to JSON at render time). Requests
+going over ``METRICS_QUERY_BUDGET`` queries are logged as warnings.
+
+Under ASGI the middleware runs on the event loop, so it doesn't push the
+whole stack onto Django's single sync thread. Queries are counted in
+whichever thread runs them: every connection carries ``track_query``,
+which reports to the tracker of the current request, found through a
+context variable that asgiref copies into its worker threads.
+
+Metrics live in process memory: with several server workers each one
+reports its own numbers under ``/metrics``.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class MetricsRegistry:
+    """Thread-safe store of labelled counters and histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.help = {}
+        self.counters = {}  # name -> {labels: value}
+        self.histograms = {}  # name -> {labels: Histogram}
+
+    def inc(self, name, help_text, labels, amount=1):
+        with self._lock:
+            self.help[name] = ('counter', help_text)
+            series = self.counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + amount
+
+    def observe(self, name, help_text, labels, value, buckets=LATENCY_BUCKETS):
+        with self._lock:
+            self.help[name] = ('histogram', help_text)
+            series = self.histograms.setdefault(name, {})
+            if labels not in series:
+                series[labels] = Histogram(buckets)
+            series[labels].observe(value)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (kind, help_text) in sorted(self.help.items()):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                if kind == 'counter':
+                    for labels, value in sorted(self.counters[name].items()):
+                        lines.append(f'{name}{format_labels(labels)} {value}')
+                    continue
+                for labels, histogram in sorted(self.histograms[name].items()):
+                    cumulative = 0
+                    bounds = [*map(str, histogram.buckets), '+Inf']
+                    for bound, count in zip(bounds, histogram.counts):
+                        cumulative += count
+                        bucket_labels = format_labels(labels + (('le', bound),))
+                        lines.append(f'{name}_bucket{bucket_labels} {cumulative}')
+                    lines.append(f'{name}_sum{format_labels(labels)} {histogram.sum}')
+                    lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', r'\\').replace('"', r'\"'))
+        for key, value in labels
+    )
+    return '{' + pairs + '}'
+
+
+registry = MetricsRegistry()
+
+
+class QueryTracker:
+    """``execute_wrapper`` counting queries and their total duration."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+current_tracker = ContextVar('current_tracker', default=None)
+
+
+def track_query(execute, sql, params, many, context):
+    tracker = current_tracker.get()
+    if tracker is None:
+        return execute(sql, params, many, context)
+    return tracker(execute, sql, params, many, context)
+
+
+def install_tracking(connection, **kwargs):
+    if track_query not in connection.execute_wrappers:
+        # first, execute_wrapper() pops the last wrapper on exit
+        connection.execute_wrappers.insert(0, track_query)
+
+
+# connections are per thread, equip each one as it connects
+connection_created.connect(install_tracking, dispatch_uid='metrics')
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # how Django 3.2 marks async middleware instances
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        # connected before the signal receiver was
+        for connection in connections.all():
+            install_tracking(connection)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        tracker = QueryTracker()
+        token = current_tracker.set(tracker)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_tracker.reset(token)
+        self.record(request, response, tracker, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        tracker = QueryTracker()
+        token = current_tracker.set(tracker)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_tracker.reset(token)
+        self.record(request, response, tracker, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, tracker, duration):
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        action = getattr(request, '_metrics_action', '')
+        labels = (('view', view), ('action', action), ('method', request.method))
+
+        registry.inc(
+            'http_requests_total',
+            'Requests handled.',
+            labels + (('status', response.status_code),),
+        )
+        registry.observe(
+            'http_request_duration_seconds', 'Request latency.', labels, duration
+        )
+        registry.observe(
+            'db_queries_per_request',
+            'SQL queries run per request.',
+            labels,
+            tracker.count,
+            buckets=QUERY_COUNT_BUCKETS,
+        )
+        registry.observe(
+            'db_query_duration_seconds',
+            'Time spent in SQL queries per request.',
+            labels,
+            tracker.duration,
+        )
+        render_duration = getattr(request, '_metrics_render_duration', None)
+        if render_duration is not None:
+            registry.observe(
+                'serialization_duration_seconds',
+                'Time spent rendering the response body.',
+                labels,
+                render_duration,
+            )
+
+        if tracker.count > settings.METRICS_QUERY_BUDGET:
+            registry.inc(
+                'query_budget_exceeded_total',
+                'Requests that ran more queries than METRICS_QUERY_BUDGET.',
+                labels,
+            )
+            logger.warning(
+                "%s %s (%s) ran %d queries, budget is %d",
+                request.method,
+                request.path,
+                view,
+                tracker.count,
+                settings.METRICS_QUERY_BUDGET,
+            )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # DRF viewsets map HTTP methods to actions such as list/retrieve
+        actions = getattr(view_func, 'actions', None) or {}
+        request._metrics_action = actions.get(request.method.lower(), '')
+
+    def process_template_response(self, request, response):
+        # called right before the response is rendered
+        start = time.perf_counter()
+
+        def rendered(response):
+            request._metrics_render_duration = time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
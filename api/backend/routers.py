@@ -0,0 +1,73 @@
+"""
+Primary/replica database routing.
+
+Everything goes to the ``default`` (primary) database unless code opts in
+with ``read_from_replicas()``; reads inside that block are spread over
+``settings.DATABASE_REPLICAS``. Writes, reads inside a transaction on the
+primary and reads of a scope recently pinned with ``pin_to_primary()``
+always use the primary.
+
+Pins are kept in the ``DATABASE_REPLICA_PIN_CACHE_ALIAS`` cache, shared by
+every web process and the job worker: a write handled by one process pins
+the reads served by all of them.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def get_pin_cache():
+    return caches[settings.DATABASE_REPLICA_PIN_CACHE_ALIAS]
+
+
+def pinned_key(scope):
+    return f'db:pinned:{scope}'
+
+
+def pin_to_primary(scope):
+    """Keep ``scope``'s replica reads on the primary for a little while."""
+    if settings.DATABASE_REPLICAS:
+        get_pin_cache().set(
+            pinned_key(scope), True, settings.DATABASE_REPLICA_STICKY_SECONDS
+        )
+
+
+def is_pinned(scope):
+    return get_pin_cache().get(pinned_key(scope)) is not None
+
+
+@contextmanager
+def read_from_replicas(scope=None):
+    """Send the reads of the block to a replica, unless ``scope`` is pinned."""
+    enabled = bool(settings.DATABASE_REPLICAS) and not (
+        scope is not None and is_pinned(scope)
+    )
+    token = _replica_reads.set(enabled)
+    try:
+        yield enabled
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
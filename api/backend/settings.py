@@ -42,11 +42,15 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'recipe',
+    'jobs',
     'rest_framework',
 ]
 
 MIDDLEWARE = [
+    # first, so its timings cover the whole middleware stack
+    'backend.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,19 +84,82 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Connection reuse: with POSTGRES_POOL_SIZE > 0 every process keeps a pool
+# of up to that many connections and requests hand theirs back when they
+# finish; otherwise each thread keeps one persistent connection for
+# POSTGRES_CONN_MAX_AGE seconds. See backend/db/base.py.
+POSTGRES_POOL_SIZE = int(os.environ.get("POSTGRES_POOL_SIZE", 0))
+POSTGRES_CONN_MAX_AGE = (
+    0 if POSTGRES_POOL_SIZE else int(os.environ.get("POSTGRES_CONN_MAX_AGE", 60))
+)
+# ping reused connections before their first query in a request
+POSTGRES_CONN_HEALTH_CHECKS = (
+    os.environ.get("POSTGRES_CONN_HEALTH_CHECKS", "true").lower() == "true"
+)
+
 DATABASES = {
     'default': {
         # 'ENGINE': 'django.db.backends.sqlite3',
         # 'NAME': BASE_DIR / 'db.sqlite3',
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'backend.db',
         'NAME': os.environ.get("POSTGRES_DB"),
         'USER': os.environ.get("POSTGRES_USER"),
         'PASSWORD': os.environ.get("POSTGRES_PASSWORD"),
         'HOST': os.environ.get("POSTGRES_HOST"),
         'PORT': os.environ.get("POSTGRES_PORT"),
+        'CONN_MAX_AGE': POSTGRES_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': POSTGRES_CONN_HEALTH_CHECKS,
+        'POOL_SIZE': POSTGRES_POOL_SIZE,
+        'POOL_TIMEOUT': float(os.environ.get("POSTGRES_POOL_TIMEOUT", 10)),
     }
 }
 
+# read replicas of the default database, e.g.
+# POSTGRES_REPLICA_HOSTS=replica-1,replica-2:5433 (same name and credentials);
+# recipe list/retrieve reads go to them, see backend/routers.py
+DATABASE_REPLICAS = []
+for index, host in enumerate(
+    filter(None, os.environ.get("POSTGRES_REPLICA_HOSTS", "").split(",")), start=1
+):
+    hostname, _, port = host.strip().partition(":")
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': hostname,
+        'PORT': port or DATABASES['default']['PORT'],
+        # tests run against the default database only
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
+DATABASE_ROUTERS = ['backend.routers.ReplicaRouter']
+# seconds a user's reads stay on the primary after they changed something,
+# so they don't read their own writes from a lagging replica
+DATABASE_REPLICA_STICKY_SECONDS = int(
+    os.environ.get("DATABASE_REPLICA_STICKY_SECONDS", 5)
+)
+DATABASE_REPLICA_PIN_CACHE_ALIAS = 'replica_pins'
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# local memory by default, for a single development process; several server
+# processes must share one, e.g. CACHE_BACKEND=
+# django.core.cache.backends.memcached.PyMemcacheCache and
+# CACHE_LOCATION=memcached:11211 (see docker-compose.yml), gunicorn refuses
+# to start more than one worker on a process-local cache
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            "CACHE_BACKEND", 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get("CACHE_LOCATION", ''),
+    }
+}
+# primary pins of backend/routers.py: every process must see them, so the
+# same shared backend, under a prefix of their own
+CACHES['replica_pins'] = {**CACHES['default'], 'KEY_PREFIX': 'pins'}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -136,3 +203,104 @@ STATIC_URL = '/static/'
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Recipe API
+
+# default and maximum number of recipes per page when a client asks for
+# cursor pagination (``?page_size=`` / ``?cursor=``)
+RECIPE_PAGE_SIZE = int(os.environ.get("RECIPE_PAGE_SIZE", 50))
+RECIPE_MAX_PAGE_SIZE = int(os.environ.get("RECIPE_MAX_PAGE_SIZE", 500))
+
+# maximum number of ranked results returned by ``?q=`` searches
+RECIPE_SEARCH_LIMIT = int(os.environ.get("RECIPE_SEARCH_LIMIT", 50))
+
+# number of recipes written per transaction by /recipes/bulk/
+RECIPE_BULK_CHUNK_SIZE = int(os.environ.get("RECIPE_BULK_CHUNK_SIZE", 500))
+
+# number of recipes fetched per database round trip by /recipes/export/
+RECIPE_EXPORT_CHUNK_SIZE = int(os.environ.get("RECIPE_EXPORT_CHUNK_SIZE", 2000))
+
+# cache holding rendered recipe list/detail payloads, and their lifetime
+RECIPE_CACHE_ALIAS = 'default'
+RECIPE_CACHE_TIMEOUT = int(os.environ.get("RECIPE_CACHE_TIMEOUT", 300))
+
+# time /mealplan/ may spend improving a plan (seconds), and how many of the
+# user's recipes it considers at most
+MEALPLAN_TIME_BUDGET = float(os.environ.get("MEALPLAN_TIME_BUDGET", 0.5))
+MEALPLAN_CANDIDATES = int(os.environ.get("MEALPLAN_CANDIDATES", 300))
+
+# seconds browsers and shared caches (CDN, reverse proxy) may reuse a
+# /catalog/ response without revalidating it
+RECIPE_CATALOG_MAX_AGE = int(os.environ.get("RECIPE_CATALOG_MAX_AGE", 60))
+
+# directory of the /recipes/{id}/similar/ index files, shared by the web
+# processes and the worker, see recipe/similar.py
+RECIPE_SIMILARITY_DIR = os.environ.get(
+    "RECIPE_SIMILARITY_DIR", str(BASE_DIR / 'var' / 'similarity')
+)
+
+# every Nth revision of a recipe is stored in full, the others as deltas:
+# reading any version applies at most N - 1 of them, see recipe/revisions.py
+RECIPE_REVISION_SNAPSHOT_INTERVAL = int(
+    os.environ.get("RECIPE_REVISION_SNAPSHOT_INTERVAL", 10)
+)
+
+# admin recipe lists estimated (by the PostgreSQL planner) to hold more rows
+# than this show the estimate rather than counting them, see recipe/admin.py
+RECIPE_ADMIN_ESTIMATE_THRESHOLD = int(
+    os.environ.get("RECIPE_ADMIN_ESTIMATE_THRESHOLD", 100_000)
+)
+
+# lifetime in seconds of the signed tokens issued by /auth/token/
+AUTH_TOKEN_ACCESS_TTL = int(os.environ.get("AUTH_TOKEN_ACCESS_TTL", 5 * 60))
+AUTH_TOKEN_REFRESH_TTL = int(os.environ.get("AUTH_TOKEN_REFRESH_TTL", 14 * 24 * 3600))
+
+# requests running more SQL queries than this are logged as warnings
+METRICS_QUERY_BUDGET = int(os.environ.get("METRICS_QUERY_BUDGET", 20))
+
+# token-bucket rate limits per user (per IP when anonymous) and scope, see
+# recipe/throttling.py: "<requests>/<s|min|hour|day>", empty disables one;
+# RECIPE_THROTTLE_DISABLED=1 disables them all, e.g. for servers under
+# manage.py benchmark/loadtest
+RECIPE_THROTTLE_RATES = (
+    {}
+    if os.environ.get("RECIPE_THROTTLE_DISABLED")
+    else {
+        'read': os.environ.get("RECIPE_THROTTLE_READ", "600/min"),
+        'write': os.environ.get("RECIPE_THROTTLE_WRITE", "120/min"),
+        'bulk': os.environ.get("RECIPE_THROTTLE_BULK", "20/min"),
+        'auth': os.environ.get("RECIPE_THROTTLE_AUTH", "30/min"),
+    }
+)
+# tokens taken by a full, unpaginated /recipes/ list instead of one
+RECIPE_THROTTLE_FULL_LIST_COST = int(
+    os.environ.get("RECIPE_THROTTLE_FULL_LIST_COST", 10)
+)
+# where buckets are kept: in each process, or with
+# 'recipe.throttling.CacheBucketStore' in a cache shared by all (e.g. Redis)
+RECIPE_THROTTLE_STORE = os.environ.get(
+    "RECIPE_THROTTLE_STORE", 'recipe.throttling.LocalBucketStore'
+)
+RECIPE_THROTTLE_CACHE_ALIAS = 'default'
+
+REST_FRAMEWORK = {
+    'DEFAULT_THROTTLE_CLASSES': ['recipe.throttling.TokenBucketThrottle'],
+    # proxies in front of the app, to find the client IP in X-Forwarded-For
+    'NUM_PROXIES': int(os.environ["NUM_PROXIES"])
+    if "NUM_PROXIES" in os.environ
+    else None,
+}
+
+
+# Background jobs, see jobs/queue.py
+
+# run tasks inline instead of queueing them, e.g. when no worker runs
+JOBS_EAGER = os.environ.get("JOBS_EAGER", "false").lower() == "true"
+# threads per `manage.py run_worker` and seconds between polls when idle
+JOBS_CONCURRENCY = int(os.environ.get("JOBS_CONCURRENCY", 2))
+JOBS_POLL_INTERVAL = float(os.environ.get("JOBS_POLL_INTERVAL", 1.0))
+# running jobs older than this many seconds are considered lost and rerun
+JOBS_TIMEOUT = int(os.environ.get("JOBS_TIMEOUT", 600))
+# seconds finished jobs are kept before workers delete them
+JOBS_KEEP_DONE = int(os.environ.get("JOBS_KEEP_DONE", 7 * 24 * 3600))
@@ -0,0 +1,105 @@
+"""
+Checks run before a process takes traffic, see ``manage.py prestart`` and
+the ``readyz`` view.
+"""
+
+import pkgutil
+import time
+from importlib.util import find_spec
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, connections
+from django.utils.module_loading import import_string
+
+# cache backends whose entries only the process storing them can see
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def wait_for_database(
+    alias='default', timeout=60.0, delay=0.1, max_delay=5.0, sleep=time.sleep
+):
+    """Connect to ``alias``, retrying with exponential backoff.
+
+    Returns the number of failed attempts; re-raises the last error once
+    ``timeout`` seconds would be exceeded.
+    """
+    deadline = time.monotonic() + timeout
+    failures = 0
+    while True:
+        try:
+            connections[alias].ensure_connection()
+            return failures
+        except DatabaseError:
+            failures += 1
+            if time.monotonic() + delay > deadline:
+                raise
+            sleep(delay)
+            delay = min(delay * 2, max_delay)
+
+
+def migration_names():
+    """``(app_label, name)`` of every migration file, found without importing them."""
+    from django.db.migrations.loader import MigrationLoader
+
+    names = set()
+    for app_config in apps.get_app_configs():
+        module_name, _ = MigrationLoader.migrations_module(app_config.label)
+        spec = module_name and find_spec(module_name)
+        if not spec or not spec.submodule_search_locations:
+            continue
+        for module in pkgutil.iter_modules(spec.submodule_search_locations):
+            if not module.ispkg and module.name[0] not in '_~':
+                names.add((app_config.label, module.name))
+    return names
+
+
+def pending_migrations(alias='default'):
+    """``app_label.name`` of the migrations not applied to ``alias`` yet.
+
+    Usually answered from the migration file names and one query; only when
+    some file is not recorded as applied (possibly a squashed migration) are
+    the migrations loaded to plan them exactly, as ``migrate`` would.
+    """
+    from django.db.migrations.recorder import MigrationRecorder
+
+    connection = connections[alias]
+    recorder = MigrationRecorder(connection)
+    applied = set(recorder.applied_migrations()) if recorder.has_table() else set()
+    if migration_names() <= applied:
+        return []
+
+    from django.db.migrations.executor import MigrationExecutor
+
+    executor = MigrationExecutor(connection)
+    plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    return [f'{migration.app_label}.{migration.name}' for migration, _ in plan]
+
+
+def process_local_caches():
+    """Aliases of ``CACHES`` using a backend of ``PROCESS_LOCAL_CACHES``."""
+    local = tuple(import_string(path) for path in PROCESS_LOCAL_CACHES)
+    return [
+        alias
+        for alias, config in settings.CACHES.items()
+        if issubclass(import_string(config['BACKEND']), local)
+    ]
+
+
+def require_shared_cache():
+    """Raise ``ImproperlyConfigured`` if some cache isn't shared by processes.
+
+    Cache versions drive ETags, Last-Modified, the PriceTable and
+    NutrientMatrix reloads and replica pinning; processes that each keep
+    their own disagree on all of them.
+    """
+    local = process_local_caches()
+    if local:
+        raise ImproperlyConfigured(
+            f"Caches {', '.join(local)} are local to each process; set "
+            f"CACHE_BACKEND/CACHE_LOCATION to a shared backend such as memcached."
+        )
@@ -16,7 +16,13 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from .views import healthz, livez, metrics, readyz
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('healthz', healthz, name='healthz'),
+    path('livez', livez, name='livez'),
+    path('readyz', readyz, name='readyz'),
+    path('metrics', metrics, name='metrics'),
     path('', include('recipe.urls')),
 ]
@@ -0,0 +1,68 @@
+from django.db import DatabaseError, connections
+from django.http import HttpResponse, JsonResponse
+
+from .metrics import registry
+from .startup import pending_migrations
+
+# migrations don't get unapplied under a running process, check until true
+migrations_applied = False
+
+
+def healthz(request):
+    """Database reachability and connection pool saturation, per alias."""
+    databases = {}
+    healthy = True
+    for alias in connections:
+        connection = connections[alias]
+        try:
+            connection.ensure_connection()
+            reachable = connection.is_usable()
+        except DatabaseError:
+            reachable = False
+        healthy = healthy and reachable
+        databases[alias] = {
+            'vendor': connection.vendor,
+            'reachable': reachable,
+            'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+            'health_checks': connection.settings_dict.get('CONN_HEALTH_CHECKS', False),
+            'pools': connection.pool_stats()
+            if hasattr(connection, 'pool_stats')
+            else [],
+        }
+    return JsonResponse(
+        {'status': 'ok' if healthy else 'unavailable', 'databases': databases},
+        status=200 if healthy else 503,
+    )
+
+
+def metrics(request):
+    """Request metrics of this process in the Prometheus text format."""
+    return HttpResponse(
+        registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+def livez(request):
+    """Liveness: the process serves requests. Restart it when this fails."""
+    return JsonResponse({'status': 'ok'})
+
+
+def readyz(request):
+    """Readiness: the database is reachable and fully migrated.
+
+    Send no traffic to the process while this fails.
+    """
+    global migrations_applied
+    try:
+        connections['default'].ensure_connection()
+        pending = [] if migrations_applied else pending_migrations()
+    except DatabaseError:
+        return JsonResponse(
+            {'status': 'unavailable', 'reason': 'database unreachable'}, status=503
+        )
+    if pending:
+        return JsonResponse(
+            {'status': 'unavailable', 'pending_migrations': pending}, status=503
+        )
+    migrations_applied = True
+    return JsonResponse({'status': 'ok'})
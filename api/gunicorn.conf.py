@@ -0,0 +1,41 @@
+"""
+Gunicorn config for serving backend.asgi with uvicorn workers.
+
+    gunicorn backend.asgi:application -c gunicorn.conf.py
+
+Workers share nothing but the database and the cache: with more than one,
+the cache must be shared too (memcached, see CACHE_BACKEND), or the server
+refuses to start.
+
+Send SIGHUP to the master for a graceful reload: new workers are started
+with the new code while the old ones finish their in-flight requests.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+
+# seconds an idle client connection is kept open
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+# seconds a worker may be silent before it is killed and replaced
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+# seconds workers get to finish in-flight requests on reload/shutdown
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+
+# recycle workers periodically, jittered so they don't all restart at once
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 1000))
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+
+
+def on_starting(server):
+    if server.cfg.workers > 1:
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+        from backend.startup import require_shared_cache
+
+        require_shared_cache()
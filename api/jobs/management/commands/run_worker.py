@@ -0,0 +1,49 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = "Run background jobs queued with jobs.queue.enqueue()."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=settings.JOBS_CONCURRENCY,
+            help="Number of jobs run in parallel (threads).",
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=settings.JOBS_POLL_INTERVAL,
+            help="Seconds to wait before looking for new jobs when idle.",
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help="Exit once no job is due instead of waiting for more.",
+        )
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            concurrency=options['concurrency'],
+            poll_interval=options['poll_interval'],
+            burst=options['burst'],
+        )
+
+        def stop(signum, frame):
+            self.stdout.write("Stopping after the running jobs...")
+            worker.stop()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        self.stdout.write(
+            f"Worker {worker.name} running {worker.concurrency} thread(s)."
+        )
+        worker.start()
+        worker.join()
@@ -0,0 +1,40 @@
+# Generated by Django 3.2 on 2026-10-18 15:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=100, verbose_name='任务')),
+                ('args', models.JSONField(default=list, verbose_name='参数')),
+                ('dedup_key', models.CharField(blank=True, max_length=200, null=True, verbose_name='去重键')),
+                ('status', models.CharField(choices=[('queued', '排队中'), ('running', '运行中'), ('done', '已完成'), ('failed', '已失败')], default='queued', max_length=10, verbose_name='状态')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='已尝试次数')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3, verbose_name='最大尝试次数')),
+                ('run_at', models.DateTimeField(verbose_name='计划运行时间')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='开始运行时间')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='执行者')),
+                ('last_error', models.TextField(blank=True, verbose_name='最近错误')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='完成时间')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['status', 'run_at', 'id'], name='job_status_run_at_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(condition=models.Q(status='queued'), fields=('dedup_key',), name='job_queued_dedup_key_unique'),
+        ),
+    ]
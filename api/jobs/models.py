@@ -0,0 +1,53 @@
+from django.db import models
+from django.db.models import Q
+
+
+class Job(models.Model):
+    """A queued call of a registered task, see jobs/queue.py."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "排队中"),
+        (RUNNING, "运行中"),
+        (DONE, "已完成"),
+        (FAILED, "已失败"),
+    ]
+
+    task = models.CharField(max_length=100, verbose_name="任务")
+    args = models.JSONField(default=list, verbose_name="参数")
+    # at most one queued job per key, later duplicates are dropped
+    dedup_key = models.CharField(
+        max_length=200, null=True, blank=True, verbose_name="去重键"
+    )
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=QUEUED, verbose_name="状态"
+    )
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="已尝试次数")
+    max_attempts = models.PositiveSmallIntegerField(default=3, verbose_name="最大尝试次数")
+    run_at = models.DateTimeField(verbose_name="计划运行时间")
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name="开始运行时间")
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name="执行者")
+    last_error = models.TextField(blank=True, verbose_name="最近错误")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="完成时间")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dedup_key"],
+                condition=Q(status="queued"),
+                name="job_queued_dedup_key_unique",
+            ),
+        ]
+        indexes = [
+            # workers poll for due jobs in this order
+            models.Index(
+                fields=["status", "run_at", "id"], name="job_status_run_at_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
@@ -0,0 +1,177 @@
+"""
+A small database-backed job queue.
+
+Tasks are plain functions registered with ``@task``; ``enqueue()`` stores a
+``Job`` row in the same transaction as the caller's writes, so a job only
+becomes visible to the workers (``manage.py run_worker``) once that data is
+committed. Jobs are retried with exponential backoff and a ``dedup_key``
+collapses repeated requests for the same work while one is still queued.
+With ``JOBS_EAGER`` tasks run inline instead, e.g. in tests or when no
+worker is running.
+"""
+
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+# attempts at recording the outcome of a job that ran, see save_outcome()
+OUTCOME_ATTEMPTS = 5
+
+
+class Task:
+    def __init__(self, func, name, max_attempts, retry_delay):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        # seconds before the first retry, doubled for every further one
+        self.retry_delay = retry_delay
+
+    def __call__(self, *args):
+        return self.func(*args)
+
+    def enqueue(self, *args, **options):
+        return enqueue(self, *args, **options)
+
+
+def task(name=None, max_attempts=3, retry_delay=10):
+    """Register a function as a task, by default under its dotted path."""
+
+    def register(func):
+        registered = Task(
+            func,
+            name or f'{func.__module__}.{func.__name__}',
+            max_attempts,
+            retry_delay,
+        )
+        registry[registered.name] = registered
+        return registered
+
+    return register
+
+
+def enqueue(task, *args, dedup_key=None, delay=0):
+    """Queue ``task(*args)``, ``args`` must be JSON serializable.
+
+    Returns the new job, or None when it ran eagerly or a queued job with
+    the same ``dedup_key`` already exists.
+    """
+    if isinstance(task, str):
+        task = registry[task]
+    if settings.JOBS_EAGER:
+        task(*args)
+        return None
+
+    job = Job(
+        task=task.name,
+        args=list(args),
+        dedup_key=dedup_key,
+        max_attempts=task.max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        if dedup_key is None:
+            raise
+        return None
+    return job
+
+
+def claimable():
+    """Due jobs, and running jobs whose worker seems to have died."""
+    now = timezone.now()
+    lost = now - timedelta(seconds=settings.JOBS_TIMEOUT)
+    return Q(status=Job.QUEUED, run_at__lte=now) | Q(
+        status=Job.RUNNING, locked_at__lt=lost
+    )
+
+
+def claim(worker_id):
+    """Take the next due job, or return None.
+
+    A conditional UPDATE decides which worker gets a job, which needs no
+    row locks and works the same on every database.
+    """
+    candidates = (
+        Job.objects.filter(claimable())
+        .order_by('run_at', 'id')
+        .values_list('id', flat=True)[:10]
+    )
+    for pk in list(candidates):
+        claimed = Job.objects.filter(claimable(), pk=pk).update(
+            status=Job.RUNNING,
+            locked_at=timezone.now(),
+            locked_by=worker_id,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def save_outcome(owned, **fields):
+    """``owned.update(**fields)``, retried while the database is busy.
+
+    The task has already run: losing its outcome to a passing lock (SQLite
+    locks the whole table) would leave the job running until
+    ``JOBS_TIMEOUT`` and then run it again.
+    """
+    for attempt in range(OUTCOME_ATTEMPTS):
+        try:
+            return owned.update(**fields)
+        except OperationalError:
+            if attempt == OUTCOME_ATTEMPTS - 1:
+                raise
+            time.sleep(0.05 * 2**attempt)
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome; True if it succeeded."""
+    owned = Job.objects.filter(pk=job.pk, locked_by=job.locked_by)
+    task = registry.get(job.task)
+    try:
+        if task is None:
+            raise LookupError(f"Unknown task {job.task!r}.")
+        task(*job.args)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception("Job %s (%s) failed", job.pk, job.task)
+        if task is not None and job.attempts < job.max_attempts:
+            delay = task.retry_delay * 2 ** (job.attempts - 1)
+            try:
+                with transaction.atomic():
+                    owned.update(
+                        status=Job.QUEUED,
+                        run_at=timezone.now() + timedelta(seconds=delay),
+                        last_error=error,
+                    )
+                return False
+            except IntegrityError:
+                # a newer job with the same dedup_key is queued, it does the work
+                error += "\nSuperseded by a newer queued job."
+        save_outcome(
+            owned, status=Job.FAILED, last_error=error, finished_at=timezone.now()
+        )
+        return False
+
+    save_outcome(owned, status=Job.DONE, last_error='', finished_at=timezone.now())
+    return True
+
+
+def purge(older_than):
+    """Delete jobs that finished successfully more than ``older_than`` seconds ago."""
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    return Job.objects.filter(status=Job.DONE, finished_at__lt=cutoff).delete()[0]
@@ -0,0 +1,132 @@
+import io
+from datetime import timedelta
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import OperationalError
+from django.db.models import QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .models import Job
+from .queue import claim, enqueue, purge, run_job, task
+from .worker import Worker
+
+calls = []
+
+
+@task('jobs.tests.record')
+def record(value):
+    calls.append(value)
+
+
+@task('jobs.tests.flaky', max_attempts=2, retry_delay=30)
+def flaky(value):
+    raise RuntimeError(value)
+
+
+class JobQueueTest(TestCase):
+    """Enqueueing, deduplication, retries"""
+
+    def setUp(self) -> None:
+        calls.clear()
+
+    def run_due(self):
+        return Worker().work('test')
+
+    def test_enqueue_and_run(self):
+        job = record.enqueue(1)
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(calls, [])
+        self.assertEqual(self.run_due(), 1)
+        self.assertEqual(calls, [1])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DONE, 1))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_dedup_key(self):
+        self.assertIsNotNone(enqueue('jobs.tests.record', 1, dedup_key='k'))
+        self.assertIsNone(enqueue('jobs.tests.record', 2, dedup_key='k'))
+        self.assertIsNotNone(enqueue('jobs.tests.record', 3, dedup_key='other'))
+        self.run_due()
+        self.assertEqual(calls, [1, 3])
+        # once the first job left the queue the key can be used again
+        self.assertIsNotNone(enqueue('jobs.tests.record', 4, dedup_key='k'))
+
+    def test_delay(self):
+        record.enqueue(1, delay=60)
+        self.assertEqual(self.run_due(), 0)
+        Job.objects.update(run_at=timezone.now())
+        self.assertEqual(self.run_due(), 1)
+
+    def test_retry_with_backoff_then_fail(self):
+        job = flaky.enqueue('boom')
+        self.run_due()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn('RuntimeError: boom', job.last_error)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=25))
+
+        Job.objects.update(run_at=timezone.now())
+        self.run_due()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_unknown_task_fails(self):
+        Job.objects.create(task='jobs.tests.missing', run_at=timezone.now())
+        job = claim('test')
+        self.assertFalse(run_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn('Unknown task', job.last_error)
+
+    def test_outcome_survives_a_busy_database(self):
+        job = record.enqueue(1)
+        update = QuerySet.update
+        busy = [OperationalError("database table is locked")]
+
+        def flaky_update(queryset, **fields):
+            if fields.get('status') == Job.DONE and busy:
+                raise busy.pop()
+            return update(queryset, **fields)
+
+        with mock.patch.object(QuerySet, 'update', flaky_update), mock.patch(
+            'jobs.queue.time.sleep'
+        ):
+            self.assertEqual(self.run_due(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+
+    def test_lost_jobs_are_reclaimed(self):
+        job = record.enqueue(1)
+        self.assertEqual(claim('dead worker').pk, job.pk)
+        self.assertIsNone(claim('test'))
+        with self.settings(JOBS_TIMEOUT=-1):
+            self.assertEqual(claim('test').pk, job.pk)
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager(self):
+        self.assertIsNone(record.enqueue(1))
+        self.assertEqual(calls, [1])
+        self.assertFalse(Job.objects.exists())
+
+    def test_purge(self):
+        record.enqueue(1)
+        self.run_due()
+        self.assertEqual(purge(3600), 0)
+        Job.objects.update(finished_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(purge(3600), 1)
+
+
+class RunWorkerCommandTest(TransactionTestCase):
+    """manage.py run_worker on real threads"""
+
+    def test_burst(self):
+        calls.clear()
+        for value in range(20):
+            record.enqueue(value)
+        call_command(
+            'run_worker', '--burst', '--concurrency', '2', stdout=io.StringIO()
+        )
+        self.assertEqual(sorted(calls), list(range(20)))
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 20)
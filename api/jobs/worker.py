@@ -0,0 +1,81 @@
+import logging
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection
+
+from .queue import claim, purge, run_job
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    """Runs queued jobs on ``concurrency`` threads until stopped.
+
+    With ``burst`` the threads exit as soon as no job is due, instead of
+    polling every ``poll_interval`` seconds.
+    """
+
+    def __init__(self, concurrency=1, poll_interval=1.0, burst=False):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.burst = burst
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = threading.Event()
+        self.purged_at = 0.0
+
+    def stop(self):
+        self.stopping.set()
+
+    def work(self, worker_id):
+        """Run due jobs in this thread until none is left; returns how many ran."""
+        count = 0
+        while not self.stopping.is_set():
+            job = claim(worker_id)
+            if job is None:
+                break
+            run_job(job)
+            count += 1
+        return count
+
+    def loop(self, index):
+        worker_id = f'{self.name}:{index}'
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                try:
+                    if self.work(worker_id):
+                        continue
+                except DatabaseError as e:
+                    # e.g. the database restarted or is locked (SQLite)
+                    logger.warning("Worker %s: %s, retrying", worker_id, e)
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                if self.burst:
+                    break
+                if index == 0 and time.monotonic() - self.purged_at > 3600:
+                    self.purged_at = time.monotonic()
+                    purge(settings.JOBS_KEEP_DONE)
+                self.stopping.wait(self.poll_interval)
+        except Exception:
+            logger.exception("Worker thread %s crashed", worker_id)
+            raise
+        finally:
+            connection.close()
+
+    def start(self):
+        self.threads = [
+            threading.Thread(target=self.loop, args=(index,), daemon=True)
+            for index in range(self.concurrency)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def join(self):
+        # short timeouts keep the main thread responsive to signals
+        while any(thread.is_alive() for thread in self.threads):
+            for thread in self.threads:
+                thread.join(0.5)
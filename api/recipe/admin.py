@@ -1,3 +1,188 @@
-from django.contrib import admin
+import json
+
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchQuery
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from backend.routers import pin_to_primary
+
+from .cache import bump_version, user_scope
+from .export import export_response
+from .models import Recipe
+from .nutrition import NUTRIENTS
+from .search import SEARCH_CONFIG
+from .serializers import AdminRecipeRowSerializer
+from .signals import recipes_bulk_saved
+
+
+def estimated_count(queryset):
+    """Rows of ``queryset`` as estimated by the PostgreSQL planner, no scan."""
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator trusting the planner's estimate for large results.
+
+    An exact ``COUNT(*)`` reads every matching row, seconds on millions of
+    them, while the estimate costs a planning pass. Results estimated under
+    ``RECIPE_ADMIN_ESTIMATE_THRESHOLD`` rows, and any result on other
+    databases, are counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if connections[queryset.db].vendor == 'postgresql':
+            estimate = estimated_count(queryset)
+            if estimate >= settings.RECIPE_ADMIN_ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class RecipeActionForm(ActionForm):
+    new_owner = forms.CharField(required=False, label="新用户名")
+    confirm = forms.BooleanField(required=False, label="确认删除")
+
 
 # Register your models here.
+@admin.register(Recipe)
+class RecipeAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'user', 'cost', 'is_public')
+    list_display_links = ('id', 'name')
+    list_filter = ('is_public',)
+    # the owner of each row comes with the page, not in a query per row
+    list_select_related = ('user',)
+    # a select box would list every user
+    raw_id_fields = ('user',)
+    readonly_fields = ('cost', *NUTRIENTS)
+    # only used off PostgreSQL, see get_search_results
+    search_fields = ('name',)
+    ordering = ('-id',)
+    paginator = EstimatedCountPaginator
+    # no second, unfiltered COUNT(*) next to search and filter results
+    show_full_result_count = False
+    action_form = RecipeActionForm
+    actions = ['reassign_owner', 'export_csv', 'delete_in_chunks']
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # lists every selected recipe and its relations before deleting them
+        # one by one, replaced by delete_in_chunks
+        actions.pop('delete_selected', None)
+        return actions
+
+    def get_search_results(self, request, queryset, search_term):
+        """Search through indexes only.
+
+        An id or an exact name, an exact owner username, or words of the
+        full-text ``search_vector``; ``icontains`` on names off PostgreSQL.
+        """
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        condition = Q(name=term)
+        if term.isdigit() and len(term) < 19:
+            condition |= Q(pk=int(term))
+        if connections[queryset.db].vendor != 'postgresql':
+            found, duplicates = super().get_search_results(request, queryset, term)
+            return found | queryset.filter(condition), duplicates
+        owners = get_user_model().objects.filter(username=term).values('pk')
+        query = SearchQuery(term, config=SEARCH_CONFIG, search_type='websearch')
+        return (
+            queryset.filter(condition | Q(user__in=owners) | Q(search_vector=query)),
+            False,
+        )
+
+    def chunks(self, queryset):
+        """Primary keys of ``queryset``, ``RECIPE_BULK_CHUNK_SIZE`` at a time.
+
+        Each chunk is a keyset query of its own, so no cursor stays open
+        while the chunks are written.
+        """
+        chunk_size = settings.RECIPE_BULK_CHUNK_SIZE
+        pks = queryset.order_by('pk').values_list('pk', flat=True)
+        last = 0
+        while True:
+            chunk = list(pks.filter(pk__gt=last)[:chunk_size])
+            if not chunk:
+                return
+            yield chunk
+            last = chunk[-1]
+
+    @admin.action(description="转给其他用户", permissions=['change'])
+    def reassign_owner(self, request, queryset):
+        username = request.POST.get('new_owner', '').strip()
+        owner = get_user_model().objects.filter(username=username).first()
+        if owner is None:
+            self.message_user(request, f"用户 {username!r} 不存在。", messages.ERROR)
+            return
+        moved, skipped = 0, []
+        for pks in self.chunks(queryset):
+            with transaction.atomic():
+                recipes = list(Recipe.objects.filter(pk__in=pks).exclude(user=owner))
+                # a name is unique per owner: keep the recipes whose name the
+                # new owner already has, or another selected recipe takes
+                taken = set(
+                    Recipe.objects.filter(
+                        user=owner, name__in={recipe.name for recipe in recipes}
+                    ).values_list('name', flat=True)
+                )
+                moving = []
+                for recipe in recipes:
+                    if recipe.name in taken:
+                        skipped.append(recipe.name)
+                        continue
+                    taken.add(recipe.name)
+                    moving.append(recipe)
+                previous = {recipe.user_id for recipe in moving}
+                for recipe in moving:
+                    recipe.user = owner
+                Recipe.objects.bulk_update(moving, ['user'])
+                recipes_bulk_saved.send(sender=Recipe, instances=moving, created=False)
+            # the signal only knows the new owner
+            for user_id in previous:
+                bump_version(user_scope(user_id))
+                pin_to_primary(user_scope(user_id))
+            moved += len(moving)
+        self.message_user(
+            request, f"已将 {moved} 个食谱转给 {owner.username}。", messages.SUCCESS
+        )
+        if skipped:
+            self.message_user(
+                request,
+                f"{owner.username} 已有同名食谱，未转移 {len(skipped)} 个："
+                f"{'、'.join(sorted(set(skipped)))}。",
+                messages.WARNING,
+            )
+
+    @admin.action(description="导出为 CSV", permissions=['view'])
+    def export_csv(self, request, queryset):
+        # streamed a chunk at a time, see recipe/export.py
+        return export_response(
+            request, queryset.order_by('pk'), AdminRecipeRowSerializer(), 'csv'
+        )
+
+    @admin.action(description="分批删除", permissions=['delete'])
+    def delete_in_chunks(self, request, queryset):
+        if not request.POST.get('confirm'):
+            self.message_user(request, "请先勾选“确认删除”。", messages.WARNING)
+            return
+        deleted = 0
+        for pks in self.chunks(queryset):
+            with transaction.atomic():
+                _, counts = Recipe.objects.filter(pk__in=pks).delete()
+            deleted += counts.get(Recipe._meta.label, 0)
+        self.message_user(request, f"已删除 {deleted} 个食谱。", messages.SUCCESS)
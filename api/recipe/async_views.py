@@ -0,0 +1,44 @@
+"""
+Async variants of the RecipeViewSet read paths, for the ASGI server.
+
+Under ASGI, Django 3.2 runs every sync view on a single thread per process
+(``thread_sensitive=True``), so one slow query stalls all sync requests of
+that worker. Django 3.2 has no async ORM yet; these views run the regular
+``list``/``retrieve`` actions, including authentication, caching and
+rendering, on asgiref's thread pool instead, leaving the event loop free to
+serve slow clients.
+"""
+
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from .views import RecipeViewSet
+
+
+def run_in_thread(view, request, *args, **kwargs):
+    # pool threads don't see request_started/finished, manage connections here
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def as_async_view(view):
+    async def async_view(request, *args, **kwargs):
+        return await sync_to_async(
+            partial(run_in_thread, view), thread_sensitive=False
+        )(request, *args, **kwargs)
+
+    # DRF views do their own CSRF checks
+    async_view.csrf_exempt = True
+    return async_view
+
+
+recipe_list = as_async_view(RecipeViewSet.as_view({'get': 'list'}))
+recipe_detail = as_async_view(RecipeViewSet.as_view({'get': 'retrieve'}))
@@ -0,0 +1,87 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.utils.crypto import constant_time_compare
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+User = get_user_model()
+
+ACCESS_SALT = 'recipe.authentication.access'
+REFRESH_SALT = 'recipe.authentication.refresh'
+
+
+def issue_tokens(user):
+    """Signed access/refresh token pair for ``user``.
+
+    The refresh token carries the same password-derived hash as a session,
+    so changing the password revokes it.
+    """
+    return {
+        'access': issue_access_token(user.pk),
+        'refresh': signing.dumps(
+            {'uid': user.pk, 'hash': user.get_session_auth_hash()}, salt=REFRESH_SALT
+        ),
+        'expires_in': settings.AUTH_TOKEN_ACCESS_TTL,
+    }
+
+
+def issue_access_token(user_id):
+    return signing.dumps({'uid': user_id}, salt=ACCESS_SALT)
+
+
+def user_from_refresh_token(token):
+    """The still valid user a refresh token was issued to, or ``None``."""
+    try:
+        payload = signing.loads(
+            token, salt=REFRESH_SALT, max_age=settings.AUTH_TOKEN_REFRESH_TTL
+        )
+        user = User.objects.get(pk=payload['uid'], is_active=True)
+    except (signing.BadSignature, KeyError, TypeError, User.DoesNotExist):
+        return None
+    if not constant_time_compare(payload.get('hash', ''), user.get_session_auth_hash()):
+        return None
+    return user
+
+
+def token_user(user_id):
+    """A ``User`` carrying only its primary key, built without a query."""
+    user = User(pk=user_id)
+    user._state.adding = False
+    return user
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """Stateless ``Authorization: Bearer <token>`` authentication.
+
+    Access tokens are HMAC-signed by ``django.core.signing`` with the
+    project's ``SECRET_KEY`` and expire after ``AUTH_TOKEN_ACCESS_TTL``
+    seconds, so verifying one needs no session or user lookup. The
+    resulting ``request.user`` only has its ``pk`` set; deactivating a user
+    takes effect once their access token expires.
+    """
+
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+
+        try:
+            payload = signing.loads(
+                auth[1].decode(),
+                salt=ACCESS_SALT,
+                max_age=settings.AUTH_TOKEN_ACCESS_TTL,
+            )
+            user_id = int(payload['uid'])
+        except signing.SignatureExpired:
+            raise exceptions.AuthenticationFailed('Token has expired.')
+        except (signing.BadSignature, UnicodeError, KeyError, TypeError, ValueError):
+            raise exceptions.AuthenticationFailed('Invalid token.')
+        return token_user(user_id), payload
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,200 @@
+"""
+Repeatable performance scenarios for the recipe API.
+
+``manage.py seed_recipes`` fills the database with synthetic users and
+recipes, ``manage.py benchmark`` runs the scenarios below as one of them,
+either in process through the Django test client (which also counts SQL
+queries) or against a real server, and compares the results to a baseline.
+"""
+
+import json
+import random
+import time
+from uuid import uuid4
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .authentication import issue_access_token
+from .bulk import chunked, create_recipes
+from .loadtest import summarize
+from .models import Ingredient, Recipe
+
+SCENARIOS = ('list', 'detail', 'create', 'update', 'delete')
+
+# p95 changes below this many milliseconds are noise, not regressions
+LATENCY_SLACK_MS = 1.0
+
+
+def seed_username(prefix, index):
+    return f'{prefix}{index}'
+
+
+def seed(users, recipes, prefix='bench', batch_size=2000, seed=0):
+    """Create ``users`` users owning ``recipes`` recipes each.
+
+    Users that already exist are left alone, so seeding is idempotent. All
+    users share the password ``prefix``, hashed once.
+    """
+    User = get_user_model()
+    usernames = [seed_username(prefix, index) for index in range(users)]
+    existing = set(
+        User.objects.filter(username__in=usernames).values_list('username', flat=True)
+    )
+    password = make_password(prefix)
+    User.objects.bulk_create(
+        [
+            User(username=username, password=password)
+            for username in usernames
+            if username not in existing
+        ],
+        batch_size=batch_size,
+    )
+    created = User.objects.filter(username__in=usernames).exclude(username__in=existing)
+
+    rng = random.Random(seed)
+    # no trailing numbers: "ingredient 3" reads as 3 of "ingredient"
+    vocabulary = list(Ingredient.objects.values_list('name', flat=True)[:200])
+    # steps take 10 distinct words
+    if len(vocabulary) < 10:
+        vocabulary = [f'ingredient-{index}' for index in range(200)]
+    count = 0
+    for user in created.order_by('id'):
+        for chunk in chunked(range(recipes), batch_size):
+            batch = [
+                Recipe(
+                    user=user,
+                    # unique and within the 20 characters of Recipe.name
+                    name=f'{prefix}{user.pk}.{index}',
+                    ingredient=', '.join(rng.sample(vocabulary, 5)),
+                    step=' '.join(rng.sample(vocabulary, 10)),
+                )
+                for index in chunk
+            ]
+            with transaction.atomic():
+                create_recipes(batch)
+            count += len(batch)
+    return len(usernames) - len(existing), count
+
+
+class BenchmarkRun:
+    """The requests of every scenario, as one seeded user.
+
+    Recipes created by ``create`` are the ones ``update`` and ``delete``
+    work on, so a full run leaves the seeded data as it found it.
+    """
+
+    def __init__(self, user, requests, seed=0):
+        self.user = user
+        self.requests = requests
+        self.rng = random.Random(seed)
+        self.recipe_ids = list(
+            Recipe.objects.filter(user=user).values_list('id', flat=True)
+        )
+        if not self.recipe_ids:
+            raise ValueError(f"{user.username} has no recipes to read.")
+        # prefix of the recipes this run creates
+        self.tag = f'run-{uuid4().hex[:6]}-'
+        self.headers = {'Authorization': f'Bearer {issue_access_token(user.pk)}'}
+
+    def created(self):
+        return Recipe.objects.filter(user=self.user, name__startswith=self.tag)
+
+    def plan(self, scenario):
+        """``(method, path, body)`` of each request of ``scenario``."""
+        if scenario == 'list':
+            return [('GET', reverse('recipe-list') + '?page_size=50', None)] * (
+                self.requests
+            )
+        if scenario == 'detail':
+            return [
+                ('GET', self.detail(self.rng.choice(self.recipe_ids)), None)
+                for _ in range(self.requests)
+            ]
+        if scenario == 'create':
+            return [
+                (
+                    'POST',
+                    reverse('recipe-list'),
+                    json.dumps(
+                        {
+                            'name': f'{self.tag}{index}',
+                            'ingredient': 'flour, eggs, milk',
+                            'step': 'Mix and bake.',
+                        }
+                    ),
+                )
+                for index in range(self.requests)
+            ]
+        ids = list(self.created().order_by('id').values_list('id', flat=True))
+        if scenario == 'update':
+            return [
+                ('PATCH', self.detail(pk), json.dumps({'step': 'Mix, rest, bake.'}))
+                for pk in ids
+            ]
+        return [('DELETE', self.detail(pk), None) for pk in ids]
+
+    def detail(self, pk):
+        return reverse('recipe-detail', kwargs={'pk': pk})
+
+    def run_client(self, plan):
+        """Run ``plan`` serially through the test client, counting queries."""
+        client = Client()
+        headers = {
+            f'HTTP_{name.upper()}': value for name, value in self.headers.items()
+        }
+        latencies, queries, errors = [], [], 0
+        start = time.perf_counter()
+        for method, path, body in plan:
+            with CaptureQueriesContext(connection) as ctx:
+                began = time.perf_counter()
+                response = client.generic(
+                    method,
+                    path,
+                    body or '',
+                    content_type='application/json',
+                    **headers,
+                )
+                latencies.append(time.perf_counter() - began)
+            queries.append(len(ctx.captured_queries))
+            errors += response.status_code >= 400
+        result = summarize(latencies, errors, time.perf_counter() - start)
+        result['queries'] = round(sum(queries) / len(queries), 1) if queries else 0
+        return result
+
+
+def compare_results(results, baseline, tolerance):
+    """Regressions of ``results`` against ``baseline``, as messages.
+
+    Latency and throughput may be ``tolerance`` (a fraction) worse than the
+    baseline; errors and query counts may not grow at all.
+    """
+    regressions = []
+    for name, base in baseline['scenarios'].items():
+        current = results['scenarios'].get(name)
+        if current is None:
+            continue
+        if current['errors'] > base['errors']:
+            regressions.append(
+                f"{name}: {current['errors']} errors, baseline {base['errors']}"
+            )
+        if current['p95_ms'] > base['p95_ms'] * (1 + tolerance) + LATENCY_SLACK_MS:
+            regressions.append(
+                f"{name}: p95 {current['p95_ms']}ms, baseline {base['p95_ms']}ms"
+            )
+        if current['rps'] < base['rps'] / (1 + tolerance):
+            regressions.append(
+                f"{name}: {current['rps']} req/s, baseline {base['rps']} req/s"
+            )
+        if None not in (current.get('queries'), base.get('queries')) and (
+            current['queries'] > base['queries']
+        ):
+            regressions.append(
+                f"{name}: {current['queries']} queries per request, "
+                f"baseline {base['queries']}"
+            )
+    return regressions
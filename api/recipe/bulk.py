@@ -0,0 +1,254 @@
+from itertools import islice
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import Recipe, RecipeIngredient
+from .nutrition import NUTRIENTS, set_nutrition
+from .pricing import set_costs
+from .serializers import NAME_TAKEN, RecipeSerializer
+from .signals import recipes_bulk_saved
+
+WRITE_FIELDS = ['name', 'ingredient', 'step']
+
+
+def chunked(iterable, size):
+    """Split an iterable (possibly a lazy NDJSON stream) into lists."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def to_pk(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def item_error(index, errors):
+    return {'index': index, 'errors': errors}
+
+
+def create_recipes(recipes):
+    """Insert unsaved, already validated recipes of one user.
+
+    With their cost, nutrient totals and ingredient links, and announced by
+    ``recipes_bulk_saved`` like any bulk write. Meant to run in a
+    transaction.
+    """
+    set_costs(recipes)
+    set_nutrition(recipes)
+    Recipe.objects.bulk_create(recipes)
+    if recipes[0].pk is None:
+        # backends without INSERT ... RETURNING (SQLite), names are unique
+        # per user and the recipes passed share one
+        pks = dict(
+            Recipe.objects.filter(
+                user=recipes[0].user, name__in=[recipe.name for recipe in recipes]
+            ).values_list('name', 'id')
+        )
+        for recipe in recipes:
+            recipe.pk = pks[recipe.name]
+            recipe._state.adding = False
+    RecipeIngredient.sync(recipes)
+    recipes_bulk_saved.send(sender=Recipe, instances=recipes, created=True)
+
+
+class BulkWriter:
+    """Validate and write many recipes per round trip.
+
+    Items go through ``RecipeSerializer`` one by one so every item gets its
+    own error report, then each chunk of valid items is written with a
+    single ``bulk_create``/``bulk_update`` in its own transaction. Chunks
+    that already committed stay committed when a later chunk fails.
+    """
+
+    def __init__(self, queryset, context):
+        self.queryset = queryset
+        # names are checked per chunk, see free_names
+        self.context = {**context, 'names_checked': True}
+        self.chunk_size = settings.RECIPE_BULK_CHUNK_SIZE
+        self.errors = []
+
+    def validate(self, index, item, instance=None, partial=False):
+        if not isinstance(item, dict):
+            self.errors.append(
+                item_error(index, {'non_field_errors': ['Expected a JSON object.']})
+            )
+            return None
+        serializer = RecipeSerializer(
+            instance, data=item, partial=partial, context=self.context
+        )
+        if not serializer.is_valid():
+            self.errors.append(item_error(index, serializer.errors))
+            return None
+        return serializer.validated_data
+
+    def check(self, index, recipe):
+        """``check_required_fields``, its error reported for that item."""
+        try:
+            recipe.check_required_fields()
+        except ValueError as e:
+            self.errors.append(item_error(index, {'non_field_errors': [str(e)]}))
+            return False
+        return True
+
+    def free_names(self, items, queryset):
+        """The ``(index, recipe)`` items whose name is free in ``queryset``.
+
+        Those whose name another recipe has are reported. One query for the
+        whole chunk, rather than one per item in ``RecipeSerializer``.
+        """
+        taken = dict(
+            queryset.filter(name__in={recipe.name for _, recipe in items}).values_list(
+                'name', 'id'
+            )
+        )
+        free = []
+        for index, recipe in items:
+            if taken.get(recipe.name, recipe.pk) != recipe.pk:
+                self.errors.append(item_error(index, {'name': [NAME_TAKEN]}))
+            else:
+                free.append((index, recipe))
+        return free
+
+    def write(self, items, write):
+        """Write the recipes of ``(index, recipe)`` items, return those written.
+
+        The chunk goes in one transaction; when it breaks a constraint the
+        items are written again one by one, each in a savepoint, so only the
+        offending ones fail.
+        """
+        recipes = [recipe for _, recipe in items]
+        try:
+            with transaction.atomic():
+                write(recipes)
+            return recipes
+        except IntegrityError:
+            pass
+        written = []
+        with transaction.atomic():
+            for index, recipe in items:
+                try:
+                    with transaction.atomic():
+                        write([recipe])
+                except IntegrityError:
+                    self.errors.append(item_error(index, self.conflict(recipe)))
+                else:
+                    written.append(recipe)
+        return written
+
+    def conflict(self, recipe):
+        """Errors of ``recipe``, which broke a constraint when written.
+
+        Mostly a recipe of the same owner saved under its name since
+        ``free_names``; anything else is no fault of the item's.
+        """
+        taken = (
+            Recipe.objects.filter(user_id=recipe.user_id, name=recipe.name)
+            .exclude(pk=recipe.pk)
+            .exists()
+        )
+        if taken:
+            return {'name': [NAME_TAKEN]}
+        return {'non_field_errors': ['Could not be saved, please try again.']}
+
+    def create(self, items, user):
+        ids = []
+        seen_names = set()
+        for chunk in chunked(enumerate(items), self.chunk_size):
+            valid = []
+            for index, item in chunk:
+                data = self.validate(index, item)
+                if data is None:
+                    continue
+                if data['name'] in seen_names:
+                    self.errors.append(
+                        item_error(index, {'name': ['Duplicated in this request.']})
+                    )
+                    continue
+                recipe = Recipe(user=user, **data)
+                if not self.check(index, recipe):
+                    continue
+                seen_names.add(recipe.name)
+                valid.append((index, recipe))
+
+            if valid:
+                valid = self.free_names(valid, Recipe.objects.filter(user=user))
+            if valid:
+                ids.extend(recipe.pk for recipe in self.write(valid, create_recipes))
+        self.errors.sort(key=itemgetter('index'))
+        return ids
+
+    def update(self, items, partial=False):
+        ids = []
+        seen_ids = set()
+        for chunk in chunked(enumerate(items), self.chunk_size):
+            pks = [
+                to_pk(item.get('id')) if isinstance(item, dict) else None
+                for _, item in chunk
+            ]
+            instances = self.queryset.in_bulk([pk for pk in pks if pk is not None])
+            valid = []
+            for (index, item), pk in zip(chunk, pks):
+                recipe = instances.get(pk)
+                if recipe is None:
+                    self.errors.append(item_error(index, {'id': ['Not found.']}))
+                    continue
+                if pk in seen_ids:
+                    self.errors.append(
+                        item_error(index, {'id': ['Duplicated in this request.']})
+                    )
+                    continue
+                seen_ids.add(pk)
+                data = self.validate(index, item, instance=recipe, partial=partial)
+                if data is None:
+                    continue
+                for attr, value in data.items():
+                    setattr(recipe, attr, value)
+                if not self.check(index, recipe):
+                    continue
+                valid.append((index, recipe))
+
+            if valid:
+                valid = self.free_names(valid, self.queryset)
+            if valid:
+                written = self.write(valid, self._update)
+                ids.extend(recipe.pk for recipe in written)
+        self.errors.sort(key=itemgetter('index'))
+        return ids
+
+    def _update(self, recipes):
+        relinked = [
+            recipe
+            for recipe in recipes
+            if recipe.ingredient != getattr(recipe, '_loaded_ingredient', None)
+        ]
+        set_costs(relinked)
+        set_nutrition(relinked)
+        Recipe.objects.bulk_update(recipes, [*WRITE_FIELDS, 'cost', *NUTRIENTS])
+        RecipeIngredient.sync(relinked)
+        for recipe in relinked:
+            recipe._loaded_ingredient = recipe.ingredient
+        recipes_bulk_saved.send(sender=Recipe, instances=recipes, created=False)
+
+    def delete(self, ids):
+        deleted = 0
+        for chunk in chunked(enumerate(ids), self.chunk_size):
+            pks = [to_pk(pk) for _, pk in chunk]
+            with transaction.atomic():
+                queryset = self.queryset.filter(
+                    id__in=[pk for pk in pks if pk is not None]
+                )
+                found = set(queryset.values_list('id', flat=True))
+                queryset.delete()
+            deleted += len(found)
+            for (index, _), pk in zip(chunk, pks):
+                if pk not in found:
+                    self.errors.append(item_error(index, {'id': ['Not found.']}))
+        return deleted
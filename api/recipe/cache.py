@@ -0,0 +1,165 @@
+import hashlib
+import json
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def get_cache():
+    return caches[settings.RECIPE_CACHE_ALIAS]
+
+
+def version_key(scope):
+    return f'recipe:version:{scope}'
+
+
+def modified_key(scope):
+    return f'recipe:modified:{scope}'
+
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+
+# recipes shared by their authors, see recipe/views.py:CatalogViewSet
+CATALOG_SCOPE = 'catalog'
+
+
+def get_version(scope):
+    """Current version token of a cache scope, created on first use.
+
+    Tokens are random rather than counters so a scope that was evicted or
+    recreated can never collide with payloads cached under an older token.
+    """
+    cache = get_cache()
+    version = cache.get(version_key(scope))
+    if version is None:
+        cache.add(version_key(scope), uuid4().hex, timeout=None)
+        version = cache.get(version_key(scope))
+    return version
+
+
+def bump_version(scope):
+    """Invalidate every payload cached under ``scope``.
+
+    Bumped right away and again once the transaction commits, so readers
+    can't cache pre-commit data under the new version.
+    """
+
+    def bump():
+        get_cache().set_many(
+            {version_key(scope): uuid4().hex, modified_key(scope): int(time.time())},
+            timeout=None,
+        )
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def last_modified(scope):
+    """Timestamp of the last change to ``scope``.
+
+    Unknown after an eviction, in which case it restarts from now: later
+    than the truth, which only costs clients a full response.
+    """
+    cache = get_cache()
+    value = cache.get(modified_key(scope))
+    if value is None:
+        cache.add(modified_key(scope), int(time.time()), timeout=None)
+        value = cache.get(modified_key(scope))
+    return value
+
+
+def cached_for_scope(scope, name, params, compute):
+    """Memoize ``compute()`` per ``params`` until ``scope`` changes.
+
+    ``params`` must be JSON serializable; failures are not cached.
+    """
+    digest = hashlib.sha1(
+        f'{scope}:{get_version(scope)}:{name}:'
+        f'{json.dumps(params, sort_keys=True)}'.encode()
+    ).hexdigest()
+    cache = get_cache()
+    value = cache.get(f'recipe:{name}:{digest}')
+    if value is None:
+        value = compute()
+        cache.set(
+            f'recipe:{name}:{digest}', value, timeout=settings.RECIPE_CACHE_TIMEOUT
+        )
+    return value
+
+
+class CachedReadMixin:
+    """Serve ``list``/``retrieve`` from a versioned cache with ETags.
+
+    Payloads are cached per scope (by default the requesting user) and per
+    URL, so filters and cursors get their own entries. Any change to
+    the scope bumps its version, which both orphans the cached payloads and
+    changes the ETag; a matching ``If-None-Match`` is answered with 304
+    before the database is queried. Views that return ``get_last_modified()``
+    also answer ``If-Modified-Since`` (when there is no ``If-None-Match``).
+    """
+
+    def get_cache_scope(self):
+        return user_scope(self.request.user.pk)
+
+    def get_cache_control(self):
+        return {'private': True, 'no_cache': True}
+
+    def get_last_modified(self):
+        return None
+
+    def not_modified(self, request, etag, modified):
+        if 'If-None-Match' in request.headers:
+            return etag in parse_etags(request.headers['If-None-Match'])
+        since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        return modified is not None and since is not None and modified <= since
+
+    def cached_response(self, request, render):
+        version = get_version(self.get_cache_scope())
+        digest = hashlib.sha1(
+            f'{self.get_cache_scope()}:{version}:{request.build_absolute_uri()}'.encode()
+        ).hexdigest()
+        etag = f'W/"{digest}"'
+        modified = self.get_last_modified()
+
+        if self.not_modified(request, etag, modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            cache = get_cache()
+            data = cache.get(f'recipe:payload:{digest}')
+            if data is not None:
+                response = Response(data)
+            else:
+                response = render()
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(
+                    f'recipe:payload:{digest}',
+                    response.data,
+                    timeout=settings.RECIPE_CACHE_TIMEOUT,
+                )
+
+        response['ETag'] = etag
+        if modified is not None:
+            response['Last-Modified'] = http_date(modified)
+        patch_cache_control(response, **self.get_cache_control())
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, lambda: super(CachedReadMixin, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request,
+            lambda: super(CachedReadMixin, self).retrieve(request, *args, **kwargs),
+        )
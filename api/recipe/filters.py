@@ -0,0 +1,99 @@
+from decimal import Decimal, InvalidOperation
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+from .ingredients import parse_ingredients
+from .nutrition import NUTRIENTS
+from .search import search_recipes
+
+
+class IngredientFilter(BaseFilterBackend):
+    """Only keep recipes that contain every requested ingredient.
+
+    ``?ingredient=flour&ingredient=eggs`` or ``?ingredient=flour,eggs``.
+    Each name is matched through the ``RecipeIngredient`` index, never by
+    scanning ``Recipe.ingredient``.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        names = parse_ingredients(",".join(request.query_params.getlist("ingredient")))
+        for name in names:
+            queryset = queryset.filter(recipe_ingredients__ingredient__name=name)
+        return queryset
+
+
+class CostFilter(BaseFilterBackend):
+    """Only keep recipes whose estimated cost is known and at most ``?max_cost=``."""
+
+    def filter_queryset(self, request, queryset, view):
+        value = request.query_params.get("max_cost")
+        if value is None:
+            return queryset
+        try:
+            max_cost = Decimal(value)
+        except InvalidOperation:
+            max_cost = None
+        if max_cost is None or not max_cost.is_finite():
+            raise ValidationError({"max_cost": ["A valid number is required."]})
+        return queryset.filter(cost__lte=max_cost)
+
+
+class NutritionFilter(BaseFilterBackend):
+    """Bounds on the nutrient totals: ``?min_protein=20&max_calories=800``.
+
+    Recipes whose total for a bounded nutrient is unknown are left out.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        for nutrient in NUTRIENTS:
+            for bound, lookup in (("min", "gte"), ("max", "lte")):
+                param = f"{bound}_{nutrient}"
+                value = request.query_params.get(param)
+                if value is None:
+                    continue
+                try:
+                    value = float(value)
+                except ValueError:
+                    value = None
+                if value is None or value != value or abs(value) == float("inf"):
+                    raise ValidationError({param: ["A valid number is required."]})
+                queryset = queryset.filter(**{f"{nutrient}__{lookup}": value})
+        return queryset
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    """``?ordering=cost``, ``?ordering=-protein``..., ties broken by id.
+
+    The cursor paginator picks this ordering up. Recipes without a value
+    for a nullable ordering field are left out: they have no place in the
+    order and a null can't be encoded in a cursor position.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = list(super().get_ordering(request, queryset, view) or [])
+        if not any(field.lstrip("-") == "id" for field in ordering):
+            ordering.append("id")
+        return ordering
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.get_ordering(request, queryset, view)
+        for field in ordering:
+            name = field.lstrip("-")
+            if queryset.model._meta.get_field(name).null:
+                queryset = queryset.exclude(**{name: None})
+        return queryset.order_by(*ordering)
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    """Ranked full-text search on the recipe list: ``?q=tomato soup``.
+
+    The result is a capped, relevance-ordered slice, so it must run after
+    every other filter and is not cursor-paginated.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get("q", "").strip()
+        if not text or getattr(view, "action", None) != "list":
+            return queryset
+        return search_recipes(queryset, text)
@@ -0,0 +1,105 @@
+import re
+
+# recipes are written with both ASCII and full-width separators,
+# e.g. "Flour, cheese, tomato sauce" and "米饭，鸡蛋，火腿，青豆"
+SEPARATORS = re.compile(r"[,，、;；\n]+")
+
+NAME_MAX_LENGTH = 50
+
+# unit alias -> (base unit, factor), None counts pieces
+UNITS = {
+    **dict.fromkeys(["g", "gram", "grams", "克"], ("g", 1)),
+    **dict.fromkeys(["kg", "kilogram", "kilograms", "千克", "公斤"], ("g", 1000)),
+    "斤": ("g", 500),
+    "两": ("g", 50),
+    **dict.fromkeys(["lb", "lbs", "pound", "pounds"], ("g", 453.6)),
+    **dict.fromkeys(["oz", "ounce", "ounces"], ("g", 28.35)),
+    **dict.fromkeys(["ml", "millilitre", "milliliter", "毫升"], ("ml", 1)),
+    **dict.fromkeys(["l", "litre", "liter", "litres", "liters", "升"], ("ml", 1000)),
+    **dict.fromkeys(["cup", "cups", "杯"], ("ml", 240)),
+    **dict.fromkeys(["tbsp", "tablespoon", "tablespoons", "汤匙", "大勺"], ("ml", 15)),
+    **dict.fromkeys(["tsp", "teaspoon", "teaspoons", "茶匙", "小勺"], ("ml", 5)),
+    **dict.fromkeys(
+        ["pc", "pcs", "piece", "pieces", "个", "只", "颗", "根", "瓣", "块", "片"],
+        (None, 1),
+    ),
+}
+
+_QUANTITY = r"\d+/\d+|\d+(?:\.\d+)?(?:\s+\d+/\d+)?"
+# longest first, so "kg" wins over "g"; Latin units must end a word
+_UNIT = "|".join(
+    re.escape(unit) + (r"(?![a-z])" if unit.isascii() else "")
+    for unit in sorted(UNITS, key=len, reverse=True)
+)
+# a quantity without a unit must be spaced from the name: "7up", "vitamin b12"
+LEADING = re.compile(
+    rf"^(?P<quantity>{_QUANTITY})(?:\s*(?P<unit>{_UNIT})\.?\s*|\s+)(?:of\s+)?(?P<name>.+)$"
+)
+TRAILING = re.compile(
+    rf"^(?P<name>.+?)(?:\s*(?P<quantity>{_QUANTITY})\s*(?P<unit>{_UNIT})|\s+(?P<count>{_QUANTITY}))$"
+)
+
+
+def normalize_ingredient(name):
+    """Canonical form of an ingredient name, as stored in ``Ingredient.name``."""
+    return " ".join(name.split()).casefold()[:NAME_MAX_LENGTH]
+
+
+def parse_quantity(text):
+    total = 0.0
+    for part in text.split():
+        if "/" in part:
+            numerator, denominator = part.split("/")
+            if int(denominator) == 0:
+                return None
+            total += int(numerator) / int(denominator)
+        else:
+            total += float(part)
+    return total
+
+
+def parse_item(item):
+    """``(name, amount, unit)`` of one ingredient item.
+
+    Items may carry a quantity, before or after the name: "200g flour",
+    "1 1/2 cups milk", "eggs 2", "面粉200克", "鸡蛋2个". ``amount`` is in the
+    base ``unit`` ("g", "ml", None for pieces), both are None when the item
+    has no quantity.
+    """
+    item = normalize_ingredient(item)
+    match = LEADING.match(item) or TRAILING.match(item)
+    if match:
+        amount = parse_quantity(match["quantity"] or match["count"])
+        name = normalize_ingredient(match["name"])
+        if amount is not None and name:
+            unit, factor = UNITS[match["unit"]] if match["unit"] else (None, 1)
+            return name, amount * factor, unit
+    return item, None, None
+
+
+def parse_ingredient_items(text):
+    """Split a free-text ``Recipe.ingredient`` string into ``parse_item`` triples.
+
+    One per name, in the original order; empty items are dropped. Repeated
+    names add up when both give an amount in the same unit, otherwise the
+    first one is kept.
+    """
+    items = {}
+    for item in SEPARATORS.split(text or ""):
+        name, amount, unit = parse_item(item)
+        if not name:
+            continue
+        if name not in items:
+            items[name] = (name, amount, unit)
+        elif None not in (amount, items[name][1]) and unit == items[name][2]:
+            items[name] = (name, items[name][1] + amount, unit)
+    return list(items.values())
+
+
+def parse_ingredients(text):
+    """Split a free-text ``Recipe.ingredient`` string into normalized names.
+
+    Quantities are left out ("200g flour" is "flour"), duplicates and empty
+    items are dropped, the original order is kept.
+    """
+    return [name for name, _, _ in parse_ingredient_items(text)]
@@ -0,0 +1,159 @@
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+# local servers the load tests can start, see spawn_server()
+SPAWN_TARGETS = {
+    'runserver': [
+        sys.executable,
+        'manage.py',
+        'runserver',
+        '--noreload',
+        '127.0.0.1:{port}',
+    ],
+    'asgi': [
+        sys.executable,
+        '-m',
+        'gunicorn',
+        'backend.asgi:application',
+        '-c',
+        'gunicorn.conf.py',
+        '--bind',
+        '127.0.0.1:{port}',
+        '--access-logfile',
+        '/dev/null',
+    ],
+}
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an unsorted list, 0 for an empty one."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(latencies, errors, elapsed):
+    """Throughput and latency percentiles (in milliseconds) of a run."""
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def run_http_load(
+    url, requests, concurrency, headers=None, method='GET', body=None, plan=None
+):
+    """Fire ``requests`` requests at ``url`` from ``concurrency`` threads.
+
+    Every thread keeps its own keep-alive connection, like a pool of real
+    clients would. Responses with a status >= 400 count as errors. ``plan``,
+    if given, maps the index of each request to its ``(method, path, body)``
+    on the host of ``url``.
+    """
+    parts = urlsplit(url)
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+    latencies, lock = [], threading.Lock()
+    errors = 0
+
+    def connect():
+        return http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+
+    def worker(indexes):
+        nonlocal errors
+        conn, local, failed = connect(), [], 0
+        for index in indexes:
+            request = plan(index) if plan else (method, path, body)
+            start = time.perf_counter()
+            try:
+                conn.request(*request, headers=headers or {})
+                response = conn.getresponse()
+                response.read()
+                failed += response.status >= 400
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = connect()
+                failed += 1
+            local.append(time.perf_counter() - start)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors += failed
+
+    threads = [
+        threading.Thread(target=worker, args=(range(i, requests, concurrency),))
+        for i in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def wait_for_port(host, port, timeout=30.0):
+    """Block until something accepts TCP connections on ``host:port``."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def spawn_server(name, port, cwd):
+    """Start one of ``SPAWN_TARGETS`` on ``127.0.0.1:port``, return the process.
+
+    Rate limits are off, the load comes from a single client. On caches
+    local to each process (the default locmem) gunicorn runs one worker,
+    it refuses to start more (see gunicorn.conf.py). What the server
+    writes to stderr is kept for ``server_output()``.
+    """
+    from backend.startup import process_local_caches
+
+    env = {**os.environ, 'RECIPE_THROTTLE_DISABLED': '1'}
+    if process_local_caches():
+        env['WEB_CONCURRENCY'] = '1'
+    log = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        [part.format(port=port) for part in SPAWN_TARGETS[name]],
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=log,
+    )
+    process.log = log
+    return process
+
+
+def wait_for_server(process, host, port, timeout=30.0):
+    """``wait_for_port()`` for a spawned server, False as soon as it exits."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        if wait_for_port(host, port, timeout=1.0):
+            return True
+    return False
+
+
+def server_output(process, limit=4000):
+    """The last ``limit`` characters a spawned server wrote to stderr."""
+    process.log.seek(0)
+    return process.log.read().decode(errors='replace')[-limit:]
@@ -0,0 +1,176 @@
+import json
+import platform
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from recipe.benchmark import (
+    SCENARIOS,
+    BenchmarkRun,
+    compare_results,
+    seed,
+    seed_username,
+)
+from recipe.loadtest import (
+    SPAWN_TARGETS,
+    run_http_load,
+    server_output,
+    spawn_server,
+    wait_for_port,
+    wait_for_server,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the list/detail/create/update/delete scenarios as a seeded user "
+        "and report req/s, p50/p95/p99 latency and queries per request. Runs "
+        "in process through the test client by default, or against a real "
+        "server with --server/--url. Exits with an error when the results "
+        "regress from --baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=SCENARIOS,
+            default=[],
+            help="Scenario to run (repeatable), default all of them.",
+        )
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--server',
+            choices=sorted(SPAWN_TARGETS),
+            help="Start this server locally and benchmark it over HTTP.",
+        )
+        parser.add_argument(
+            '--url',
+            help="Benchmark a running server sharing this database instead; "
+            "start it with RECIPE_THROTTLE_DISABLED=1.",
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=10,
+            help="Users to seed when the benchmark user does not exist yet.",
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=1000, help="Recipes per seeded user."
+        )
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', type=Path, help="Write the results as JSON.")
+        parser.add_argument(
+            '--baseline', type=Path, help="JSON results of an earlier run."
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.25,
+            help="Share by which latency and throughput may be worse than the "
+            "baseline, default 0.25.",
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        username = seed_username(options['prefix'], 0)
+        if not User.objects.filter(username=username).exists():
+            seed(
+                options['users'],
+                options['recipes'],
+                prefix=options['prefix'],
+                seed=options['seed'],
+            )
+        user = User.objects.get(username=username)
+        run = BenchmarkRun(user, options['requests'], seed=options['seed'])
+
+        base_url, process = options['url'], None
+        if options['server']:
+            process = spawn_server(options['server'], 8201, settings.BASE_DIR)
+            base_url = 'http://127.0.0.1:8201'
+        mode = options['server'] or ('url' if base_url else 'client')
+
+        results = {
+            'meta': {
+                'mode': mode,
+                'requests': options['requests'],
+                'concurrency': options['concurrency'] if base_url else 1,
+                'recipes': len(run.recipe_ids),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'date': timezone.now().isoformat(),
+            },
+            'scenarios': {},
+        }
+        self.stdout.write(
+            f"{'scenario':<12}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+            f"{'p99 ms':>10}{'queries':>10}{'errors':>8}"
+        )
+        try:
+            if process is not None:
+                if not wait_for_server(process, '127.0.0.1', 8201):
+                    raise CommandError(
+                        f"{options['server']} did not start:\n{server_output(process)}"
+                    )
+            elif base_url:
+                host, port = base_url.split('://', 1)[1].split(':')
+                if not wait_for_port(host, int(port.rstrip('/'))):
+                    raise CommandError(f"{base_url} is not accepting connections.")
+            for scenario in options['scenario'] or SCENARIOS:
+                result = self.run_scenario(run, scenario, base_url, options)
+                results['scenarios'][scenario] = result
+                queries = '-' if result['queries'] is None else result['queries']
+                self.stdout.write(
+                    f"{scenario:<12}{result['rps']:>10}{result['p50_ms']:>10}"
+                    f"{result['p95_ms']:>10}{result['p99_ms']:>10}{queries:>10}"
+                    f"{result['errors']:>8}"
+                )
+        finally:
+            run.created().delete()
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+        if options['output']:
+            options['output'].write_text(json.dumps(results, indent=2) + '\n')
+        if options['baseline']:
+            baseline = json.loads(options['baseline'].read_text())
+            if baseline['meta']['mode'] != mode:
+                raise CommandError(
+                    f"The baseline was measured in {baseline['meta']['mode']} "
+                    f"mode, not {mode}."
+                )
+            regressions = compare_results(results, baseline, options['tolerance'])
+            if regressions:
+                raise CommandError(
+                    "Regressed from the baseline:\n" + '\n'.join(regressions)
+                )
+            self.stdout.write("No regression from the baseline.")
+
+    def run_scenario(self, run, scenario, base_url, options):
+        plan = run.plan(scenario)
+        if not base_url:
+            # the test client talks to 'testserver'; one user sending every
+            # request would run into the rate limits
+            with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                RECIPE_THROTTLE_RATES={},
+            ):
+                return run.run_client(plan)
+        result = run_http_load(
+            base_url,
+            len(plan),
+            options['concurrency'],
+            headers={**run.headers, 'Content-Type': 'application/json'},
+            plan=plan.__getitem__,
+        )
+        # queries happen in the server process
+        result['queries'] = None
+        return result
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from recipe.similar import similarity_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the recipe similarity index (RECIPE_SIMILARITY_DIR) from the "
+        "database, e.g. after restoring a backup. The index is otherwise "
+        "built by the background worker, queued by the first query, and kept "
+        "current by it."
+    )
+
+    def handle(self, *args, **options):
+        similarity_index.rebuild()
+        self.stdout.write(
+            f"{len(similarity_index.rows)} recipes indexed in "
+            f"{similarity_index.directory}."
+        )
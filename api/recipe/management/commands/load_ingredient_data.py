@@ -0,0 +1,118 @@
+import csv
+import json
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipe.ingredients import normalize_ingredient
+from recipe.models import Ingredient
+from recipe.nutrition import NUTRIENTS, nutrient_matrix, recompute_nutrition
+from recipe.pricing import price_table, recipes_using, recompute_costs
+
+DEFAULT_PATH = Path(__file__).resolve().parents[2] / 'data' / 'ingredients.csv'
+
+
+def data_fields():
+    """Ingredient columns a data file may set, besides ``name``."""
+    return {
+        field.name: field
+        for field in Ingredient._meta.concrete_fields
+        if field.editable and field.name not in ('id', 'name')
+    }
+
+
+def read_rows(path):
+    if path.suffix == '.json':
+        with path.open(encoding='utf-8') as f:
+            rows = json.load(f)
+        if not isinstance(rows, list):
+            raise CommandError(f"{path}: expected a JSON array of objects.")
+        return rows
+    with path.open(encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+class Command(BaseCommand):
+    help = (
+        "Load ingredient data (prices, nutrients, store sections) from a "
+        "local CSV or JSON file. Rows are matched by ingredient name; columns "
+        "named after Ingredient fields are updated, others are ignored. Recipe "
+        "costs and nutrition totals are recomputed for the ingredients that "
+        "changed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            type=Path,
+            default=DEFAULT_PATH,
+            help=f"CSV or JSON file, defaults to {DEFAULT_PATH.name} shipped with the app.",
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not path.exists():
+            raise CommandError(f"{path} does not exist.")
+
+        fields = data_fields()
+        data = {}
+        for line, row in enumerate(read_rows(path), start=1):
+            if not isinstance(row, dict):
+                raise CommandError(f"{path}, row {line}: expected an object.")
+            name = normalize_ingredient(str(row.get('name') or ''))
+            if not name:
+                raise CommandError(f"{path}, row {line}: missing name.")
+            values = {}
+            for column, value in row.items():
+                if column not in fields:
+                    continue
+                if value == '':
+                    value = None if fields[column].null else ''
+                try:
+                    values[column] = fields[column].clean(value, None)
+                except ValidationError as e:
+                    raise CommandError(
+                        f"{path}, row {line}, {column}: {'; '.join(e.messages)}"
+                    )
+            data[name] = values
+        columns = sorted({column for values in data.values() for column in values})
+
+        with transaction.atomic():
+            Ingredient.objects.bulk_create(
+                [Ingredient(name=name) for name in data], ignore_conflicts=True
+            )
+            changed, repriced, renourished = [], [], []
+            for ingredient in Ingredient.objects.filter(name__in=data):
+                values = data[ingredient.name]
+                updated = {k for k, v in values.items() if getattr(ingredient, k) != v}
+                if not updated:
+                    continue
+                if 'price' in updated:
+                    repriced.append(ingredient.pk)
+                if updated.intersection(NUTRIENTS):
+                    renourished.append(ingredient.pk)
+                for column, value in values.items():
+                    setattr(ingredient, column, value)
+                changed.append(ingredient)
+            if changed and columns:
+                Ingredient.objects.bulk_update(changed, columns, batch_size=1000)
+
+            recosted = 0
+            if repriced:
+                price_table.invalidate()
+                recosted = recompute_costs(recipes_using(repriced))
+            renourished_recipes = 0
+            if renourished:
+                nutrient_matrix.invalidate()
+                renourished_recipes = recompute_nutrition(recipes_using(renourished))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(data)} ingredients read, {len(changed)} updated, "
+                f"{recosted} recipe costs changed, "
+                f"{renourished_recipes} recipe nutrition totals changed."
+            )
+        )
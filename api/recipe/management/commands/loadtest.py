@@ -0,0 +1,112 @@
+from django.conf import settings
+from django.contrib.auth import (
+    BACKEND_SESSION_KEY,
+    HASH_SESSION_KEY,
+    SESSION_KEY,
+    get_user_model,
+)
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe.loadtest import (
+    SPAWN_TARGETS,
+    run_http_load,
+    server_output,
+    spawn_server,
+    wait_for_port,
+    wait_for_server,
+)
+
+# the sync view and its async twin, see recipe/async_views.py
+DEFAULT_PATHS = ['/recipes/', '/async/recipes/']
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure req/s and p50/p95/p99 latency of recipe endpoints, e.g. "
+        "runserver against the gunicorn/uvicorn ASGI setup."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target',
+            action='append',
+            default=[],
+            metavar='NAME=URL',
+            help="Running server to test, e.g. asgi=http://127.0.0.1:8000.",
+        )
+        parser.add_argument(
+            '--spawn',
+            action='store_true',
+            help="Start runserver and the ASGI server locally and compare them.",
+        )
+        parser.add_argument(
+            '--path',
+            action='append',
+            default=[],
+            help="Endpoint path to hit (repeatable), default /recipes/ and "
+            "/async/recipes/.",
+        )
+        parser.add_argument('--user', help="Username to authenticate as.")
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=16)
+
+    def handle(self, *args, **options):
+        targets = dict(target.split('=', 1) for target in options['target'])
+        processes = {}
+        if options['spawn']:
+            for port, name in enumerate(SPAWN_TARGETS, 8101):
+                processes[name] = spawn_server(name, port, settings.BASE_DIR)
+                targets[name] = f'http://127.0.0.1:{port}'
+        if not targets:
+            raise CommandError("Give at least one --target or use --spawn.")
+
+        headers = {}
+        if options['user']:
+            headers[
+                'Cookie'
+            ] = f'{settings.SESSION_COOKIE_NAME}={self.login(options["user"])}'
+
+        try:
+            self.stdout.write(
+                f"{'target':<12}{'path':<24}{'req/s':>10}{'p50 ms':>10}"
+                f"{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}"
+            )
+            for name, base_url in targets.items():
+                host, port = base_url.split('://', 1)[1].split(':')
+                port = int(port.rstrip('/'))
+                if name in processes:
+                    if not wait_for_server(processes[name], host, port):
+                        raise CommandError(
+                            f"{name} did not start:\n{server_output(processes[name])}"
+                        )
+                elif not wait_for_port(host, port):
+                    raise CommandError(f"{name} is not accepting connections.")
+                for path in options['path'] or DEFAULT_PATHS:
+                    result = run_http_load(
+                        base_url.rstrip('/') + path,
+                        options['requests'],
+                        options['concurrency'],
+                        headers=headers,
+                    )
+                    self.stdout.write(
+                        f"{name:<12}{path:<24}{result['rps']:>10}{result['p50_ms']:>10}"
+                        f"{result['p95_ms']:>10}{result['p99_ms']:>10}{result['errors']:>8}"
+                    )
+        finally:
+            for process in processes.values():
+                process.terminate()
+                process.wait()
+
+    def login(self, username):
+        """Create a session for ``username`` the way the login view would."""
+        try:
+            user = get_user_model().objects.get(username=username)
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User {username!r} does not exist.")
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        return session.session_key
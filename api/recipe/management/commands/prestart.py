@@ -0,0 +1,62 @@
+import time
+
+from django.core.management import call_command
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from backend.startup import pending_migrations, require_shared_cache, wait_for_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Wait for the database with exponential backoff, then check for "
+        "unapplied migrations: apply them (--migrate), wait for another "
+        "container to apply them (--wait-for-migrations) or fail. Never "
+        "generates migrations, those are committed with the code. With "
+        "--require-shared-cache, fail if a cache is local to the process."
+    )
+
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument('--migrate', action='store_true')
+        group.add_argument('--wait-for-migrations', action='store_true')
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=60.0,
+            help="Seconds to wait for the database (and migrations), default 60.",
+        )
+        parser.add_argument('--require-shared-cache', action='store_true')
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        if options['require_shared_cache']:
+            try:
+                require_shared_cache()
+            except ImproperlyConfigured as e:
+                raise CommandError(e)
+        try:
+            failures = wait_for_database(timeout=options['timeout'])
+        except DatabaseError as e:
+            raise CommandError(f"Database unreachable: {e}")
+        self.stdout.write(
+            f"Database ready after {failures} retries "
+            f"({time.monotonic() - start:.2f}s)."
+        )
+
+        pending = pending_migrations()
+        delay = 0.5
+        while pending and options['wait_for_migrations']:
+            if time.monotonic() + delay > start + options['timeout']:
+                break
+            time.sleep(delay)
+            delay = min(delay * 2, 5.0)
+            pending = pending_migrations()
+        if pending and options['migrate']:
+            call_command('migrate', interactive=False, verbosity=options['verbosity'])
+        elif pending:
+            raise CommandError(f"Unapplied migrations: {', '.join(pending)}.")
+        else:
+            self.stdout.write("No unapplied migrations.")
+        self.stdout.write(f"Ready in {time.monotonic() - start:.2f}s.")
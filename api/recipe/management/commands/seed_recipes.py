@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe.benchmark import seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Create N users with M synthetic recipes each for benchmarks, "
+        "written with bulk_create. Existing users are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--recipes', type=int, default=1000, help="Per user.")
+        parser.add_argument(
+            '--prefix',
+            default='bench',
+            help="Username prefix, and password of every user (5 characters at most).",
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if len(options['prefix']) > 5:
+            raise CommandError("--prefix must be 5 characters at most.")
+        start = time.perf_counter()
+        users, recipes = seed(
+            options['users'],
+            options['recipes'],
+            prefix=options['prefix'],
+            seed=options['seed'],
+        )
+        self.stdout.write(
+            f"{users} users and {recipes} recipes created "
+            f"in {time.perf_counter() - start:.1f}s."
+        )
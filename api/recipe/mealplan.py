@@ -0,0 +1,293 @@
+"""
+Weekly meal-plan optimizer.
+
+A plan is ``meals`` distinct recipes minimizing
+
+    cost of the non-pantry ingredients
+    + SHOPPING_WEIGHT * number of distinct ingredients left to buy
+    + NUTRITION_WEIGHT * sum of the relative misses of the nutrient targets
+
+Picking the best combination exactly is a knapsack-like integer program,
+so the planner works in three bounded steps on per-recipe feature vectors
+(stored cost and nutrient totals, ingredient incidence):
+
+1. a vectorized pass over every recipe keeps the ``candidates`` most
+   promising ones on their own,
+2. a greedy pass builds a plan meal by meal against prorated targets,
+3. best-improvement swap search, restarted from random perturbations of
+   the best plan until restarts stop paying off or the time budget is
+   spent.
+
+Every step scores all candidates at once with NumPy, so the work per step
+is bounded by ``candidates`` whatever the size of the recipe book. The
+feature vectors themselves are loaded once per version of the book, not
+per request (see ``BookCache``).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.apps import apps
+
+from .cache import get_version, user_scope
+from .nutrition import NUTRIENTS
+from .pricing import PRICE_SCOPE
+
+SHOPPING_WEIGHT = 0.5
+NUTRITION_WEIGHT = 50.0
+# perturbed restarts in a row that may fail to improve before giving up
+RESTART_PATIENCE = 20
+
+
+class RecipeFeatures:
+    """Feature vectors of a set of recipes.
+
+    ``links`` pairs recipe rows with ingredient columns, ``pantry`` flags
+    the ingredient columns the user already has.
+    """
+
+    def __init__(self, ids, cost, nutrients, links, ingredient_ids, pantry, prices):
+        self.ids = ids
+        self.nutrients = nutrients
+        self.links = links
+        self.ingredient_ids = ingredient_ids
+        self.pantry = pantry
+        # what the pantry already covers is not paid for
+        pantry_links = links[pantry[links[:, 1]]]
+        self.cost = cost - np.bincount(
+            pantry_links[:, 0].astype(np.intp),
+            weights=prices[pantry_links[:, 1]],
+            minlength=len(ids),
+        )
+
+    @classmethod
+    def from_book(cls, book, pantry_names=()):
+        """Features of a ``load_book()`` result, for a given pantry."""
+        pantry_names = set(pantry_names)
+        pantry = np.array([name in pantry_names for name in book['names']], dtype=bool)
+        return cls(
+            book['ids'],
+            book['cost'],
+            book['nutrients'],
+            book['links'],
+            book['ingredient_ids'],
+            pantry,
+            book['prices'],
+        )
+
+
+def load_book(queryset):
+    """Arrays of the recipes in ``queryset`` with a known cost and nutrients.
+
+    Everything ``RecipeFeatures`` needs but the pantry, so one load serves
+    every plan request of a user (see ``BookCache``).
+    """
+    RecipeIngredient = apps.get_model('recipe', 'RecipeIngredient')
+    Ingredient = apps.get_model('recipe', 'Ingredient')
+    queryset = queryset.exclude(cost=None)
+    for name in NUTRIENTS:
+        queryset = queryset.exclude(**{name: None})
+    rows = np.array(
+        queryset.order_by('id').values_list('id', 'cost', *NUTRIENTS),
+        dtype=float,
+    ).reshape(-1, 2 + len(NUTRIENTS))
+    ids = rows[:, 0].astype(np.int64)
+
+    links = np.array(
+        RecipeIngredient.objects.filter(recipe__in=queryset).values_list(
+            'recipe_id', 'ingredient_id'
+        ),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    ingredient_ids, columns = np.unique(links[:, 1], return_inverse=True)
+    links = np.column_stack([np.searchsorted(ids, links[:, 0]), columns])
+
+    data = {
+        pk: (name, price)
+        for pk, name, price in Ingredient.objects.filter(
+            id__in=ingredient_ids.tolist()
+        ).values_list('id', 'name', 'price')
+    }
+    ingredients = [data[pk] for pk in ingredient_ids.tolist()]
+    return {
+        'ids': ids,
+        'cost': rows[:, 1],
+        'nutrients': rows[:, 2:],
+        'links': links,
+        'ingredient_ids': ingredient_ids,
+        'names': [name for name, _ in ingredients],
+        'prices': np.array([float(price or 0) for _, price in ingredients]),
+    }
+
+
+class BookCache:
+    """``load_book()`` of each user's recipes, reused until they change.
+
+    An entry is valid while the user's cache version and the ingredient
+    price version are the ones it was loaded under. Kept in the process,
+    like the price table: the arrays of a large book are bigger than a
+    shared cache entry may be. The least recently used books are dropped
+    past ``max_users``.
+    """
+
+    def __init__(self, max_users=64):
+        self.max_users = max_users
+        self.books = OrderedDict()  # user id -> (versions, book)
+        self._lock = threading.Lock()
+
+    def get(self, user_id, queryset):
+        versions = (get_version(user_scope(user_id)), get_version(PRICE_SCOPE))
+        with self._lock:
+            entry = self.books.get(user_id)
+            if entry is not None and entry[0] == versions:
+                self.books.move_to_end(user_id)
+                return entry[1]
+        # versions were read first: a change while loading only makes the
+        # next request load again
+        book = load_book(queryset)
+        with self._lock:
+            self.books[user_id] = (versions, book)
+            self.books.move_to_end(user_id)
+            while len(self.books) > self.max_users:
+                self.books.popitem(last=False)
+        return book
+
+
+book_cache = BookCache()
+
+
+class MealPlanner:
+    def __init__(self, features, targets, candidates=300, time_budget=0.5, seed=0):
+        """``targets`` maps nutrient names to weekly totals to aim for."""
+        self.features = features
+        self.columns = [NUTRIENTS.index(name) for name in targets]
+        self.targets = np.array([targets[name] for name in targets], dtype=float)
+        self.candidates = candidates
+        self.time_budget = time_budget
+        self.rng = np.random.default_rng(seed)
+
+    def score(self, cost, totals, to_buy, targets=None):
+        """Objective of one plan, or of many plans along the first axis."""
+        targets = self.targets if targets is None else targets
+        miss = np.abs(totals - targets) / np.maximum(targets, 1e-9)
+        return cost + SHOPPING_WEIGHT * to_buy + NUTRITION_WEIGHT * miss.sum(axis=-1)
+
+    def shortlist(self, meals):
+        """Rows of the recipes worth searching, ranked on their own merits."""
+        features = self.features
+        count = len(features.ids)
+        if count <= self.candidates:
+            return np.arange(count)
+        shopping = features.links[~features.pantry[features.links[:, 1]]]
+        to_buy = np.bincount(shopping[:, 0], minlength=count)
+        totals = features.nutrients[:, self.columns]
+        scores = self.score(features.cost, totals, to_buy, self.targets / meals)
+        return np.sort(np.argpartition(scores, self.candidates)[: self.candidates])
+
+    def solve(self, meals):
+        """Rows (in ``features``) of the recipes of the best plan found."""
+        deadline = time.perf_counter() + self.time_budget
+        features = self.features
+        rows = self.shortlist(meals)
+        if len(rows) < meals:
+            raise ValueError(f"Only {len(rows)} recipes can be planned.")
+
+        self.cost = features.cost[rows]
+        self.totals = features.nutrients[rows][:, self.columns]
+        # candidate x ingredient-to-buy incidence, dense but bounded
+        self.incidence = np.zeros((len(rows), len(features.ingredient_ids)), dtype=bool)
+        local = np.full(len(features.ids), -1)
+        local[rows] = np.arange(len(rows))
+        links = features.links[local[features.links[:, 0]] >= 0]
+        self.incidence[local[links[:, 0]], links[:, 1]] = True
+        self.incidence[:, features.pantry] = False
+
+        plan = self.improve(self.greedy(meals), deadline)
+        best, best_score = plan, self.plan_score(plan)
+        stale = 0
+        while stale < RESTART_PATIENCE and len(rows) > meals:
+            if time.perf_counter() >= deadline:
+                break
+            plan = self.improve(self.perturb(best), deadline)
+            plan_score = self.plan_score(plan)
+            if plan_score < best_score - 1e-9:
+                best, best_score, stale = plan, plan_score, 0
+            else:
+                stale += 1
+        return rows[best]
+
+    def plan_score(self, plan):
+        to_buy = self.incidence[plan].any(axis=0).sum()
+        return self.score(self.cost[plan].sum(), self.totals[plan].sum(axis=0), to_buy)
+
+    def greedy(self, meals):
+        plan = []
+        cost, totals = 0.0, np.zeros(len(self.targets))
+        needed = np.zeros(self.incidence.shape[1], dtype=bool)
+        for step in range(1, meals + 1):
+            to_buy = needed.sum() + self.incidence[:, ~needed].sum(axis=1)
+            scores = self.score(
+                cost + self.cost,
+                totals + self.totals,
+                to_buy,
+                self.targets * step / meals,
+            )
+            scores[plan] = np.inf
+            best = int(np.argmin(scores))
+            plan.append(best)
+            cost += self.cost[best]
+            totals = totals + self.totals[best]
+            needed |= self.incidence[best]
+        return plan
+
+    def improve(self, plan, deadline):
+        """Apply the best single swap until none improves the plan."""
+        plan = list(plan)
+        current = self.plan_score(plan)
+        while time.perf_counter() < deadline:
+            cost = self.cost[plan].sum()
+            totals = self.totals[plan].sum(axis=0)
+            counts = self.incidence[plan].sum(axis=0)
+            best_move, best_score = None, current - 1e-9
+            for position, row in enumerate(plan):
+                remaining = counts - self.incidence[row]
+                missing = remaining == 0
+                scores = self.score(
+                    cost - self.cost[row] + self.cost,
+                    totals - self.totals[row] + self.totals,
+                    (~missing).sum() + self.incidence[:, missing].sum(axis=1),
+                )
+                scores[plan] = np.inf
+                candidate = int(np.argmin(scores))
+                if scores[candidate] < best_score:
+                    best_move, best_score = (position, candidate), scores[candidate]
+            if best_move is None:
+                break
+            plan[best_move[0]] = best_move[1]
+            current = best_score
+        return plan
+
+    def perturb(self, plan, swaps=2):
+        plan = list(plan)
+        unused = np.setdiff1d(np.arange(len(self.cost)), plan)
+        count = min(swaps, len(unused), len(plan))
+        positions = self.rng.choice(len(plan), size=count, replace=False)
+        for position, row in zip(
+            positions, self.rng.choice(unused, count, replace=False)
+        ):
+            plan[position] = int(row)
+        return plan
+
+
+def plan_meals(user, meals, pantry_names, targets, **options):
+    """Recipes (in plan order) of the best plan found among ``user``'s."""
+    Recipe = apps.get_model('recipe', 'Recipe')
+    queryset = Recipe.objects.filter(user=user)
+    book = book_cache.get(user.pk, queryset)
+    features = RecipeFeatures.from_book(book, pantry_names)
+    rows = MealPlanner(features, targets, **options).solve(meals)
+    ids = features.ids[rows].tolist()
+    recipes = queryset.in_bulk(ids)
+    return [recipes[pk] for pk in ids]
@@ -0,0 +1,74 @@
+import re
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+# the ingredient parser as of this migration, see recipe/ingredients.py;
+# copied so later changes to it don't change what this migration does
+SEPARATORS = re.compile(r'[,，、;；\n]+')
+
+
+def normalize(name):
+    return ' '.join(name.split()).casefold()[:50]
+
+
+def parse_ingredients(text):
+    names = []
+    for item in SEPARATORS.split(text or ''):
+        name = normalize(item)
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def link_batch(Ingredient, RecipeIngredient, batch):
+    parsed = {recipe_id: parse_ingredients(text) for recipe_id, text in batch}
+    names = {name for recipe_names in parsed.values() for name in recipe_names}
+    if not names:
+        return
+    Ingredient.objects.bulk_create(
+        [Ingredient(name=name) for name in names], ignore_conflicts=True
+    )
+    ids = dict(Ingredient.objects.filter(name__in=names).values_list('name', 'id'))
+    RecipeIngredient.objects.bulk_create(
+        [
+            RecipeIngredient(
+                recipe_id=recipe_id, ingredient_id=ids[name], position=position
+            )
+            for recipe_id, recipe_names in parsed.items()
+            for position, name in enumerate(recipe_names)
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def link_recipe_ingredients(apps, schema_editor):
+    Recipe = apps.get_model('recipe', 'Recipe')
+    Ingredient = apps.get_model('recipe', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipe', 'RecipeIngredient')
+
+    batch = []
+    rows = (
+        Recipe.objects.order_by('id')
+        .values_list('id', 'ingredient')
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            link_batch(Ingredient, RecipeIngredient, batch)
+            batch = []
+    if batch:
+        link_batch(Ingredient, RecipeIngredient, batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0005_ingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_recipe_ingredients, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 3.2 on 2026-10-18 15:20
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# keep the weights and text search config in sync with recipe/search.py
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('simple', coalesce({row}.name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce({row}.ingredient, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce({row}.step, '')), 'C')
+"""
+
+CREATE_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE FUNCTION recipe_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := {vector};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """.format(vector=SEARCH_VECTOR_SQL.format(row='NEW')),
+    """
+    CREATE TRIGGER recipe_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, ingredient, step ON recipe_recipe
+    FOR EACH ROW EXECUTE PROCEDURE recipe_search_vector_update()
+    """,
+    "UPDATE recipe_recipe SET search_vector = {vector}".format(
+        vector=SEARCH_VECTOR_SQL.format(row='recipe_recipe')
+    ),
+    "CREATE INDEX recipe_search_vector_gin ON recipe_recipe USING gin (search_vector)",
+    "CREATE INDEX recipe_name_trgm ON recipe_recipe USING gin (name gin_trgm_ops)",
+    "CREATE INDEX recipe_ingredient_trgm ON recipe_recipe "
+    "USING gin (ingredient gin_trgm_ops)",
+]
+
+DROP_SQL = [
+    "DROP INDEX IF EXISTS recipe_ingredient_trgm",
+    "DROP INDEX IF EXISTS recipe_name_trgm",
+    "DROP INDEX IF EXISTS recipe_search_vector_gin",
+    "DROP TRIGGER IF EXISTS recipe_search_vector_trigger ON recipe_recipe",
+    "DROP FUNCTION IF EXISTS recipe_search_vector_update()",
+]
+
+
+def run_on_postgresql(statements):
+    def forwards(apps, schema_editor):
+        # other backends (SQLite in tests) fall back to icontains lookups
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+
+    return forwards
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0006_link_recipe_ingredients'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(run_on_postgresql(CREATE_SQL), run_on_postgresql(DROP_SQL)),
+    ]
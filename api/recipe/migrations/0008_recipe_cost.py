@@ -0,0 +1,27 @@
+# Generated by Django 3.2 on 2026-10-18 15:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0007_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True, verbose_name='单价'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='cost',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True, verbose_name='估算成本'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'cost', 'id'], name='recipe_user_cost_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 3.2 on 2026-10-18 15:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0008_recipe_cost'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='calories',
+            field=models.FloatField(blank=True, null=True, verbose_name='热量'),
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='carbs',
+            field=models.FloatField(blank=True, null=True, verbose_name='碳水化合物'),
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='fat',
+            field=models.FloatField(blank=True, null=True, verbose_name='脂肪'),
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='protein',
+            field=models.FloatField(blank=True, null=True, verbose_name='蛋白质'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='calories',
+            field=models.FloatField(editable=False, null=True, verbose_name='热量'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='carbs',
+            field=models.FloatField(editable=False, null=True, verbose_name='碳水化合物'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='fat',
+            field=models.FloatField(editable=False, null=True, verbose_name='脂肪'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='protein',
+            field=models.FloatField(editable=False, null=True, verbose_name='蛋白质'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'calories', 'id'], name='recipe_user_calories_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'protein', 'id'], name='recipe_user_protein_idx'),
+        ),
+    ]
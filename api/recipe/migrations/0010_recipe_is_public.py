@@ -0,0 +1,22 @@
+# Generated by Django 3.2 on 2026-10-18 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0009_recipe_nutrition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='is_public',
+            field=models.BooleanField(default=False, verbose_name='公开'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(is_public=True), fields=['id'], name='recipe_public_id_idx'),
+        ),
+    ]
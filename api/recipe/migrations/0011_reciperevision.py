@@ -0,0 +1,29 @@
+# Generated by Django 3.2 on 2026-10-18 16:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0010_recipe_is_public'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField(verbose_name='版本号')),
+                ('is_snapshot', models.BooleanField(default=False, verbose_name='完整快照')),
+                ('data', models.BinaryField(verbose_name='内容')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('recipe', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='recipe.recipe', verbose_name='食谱')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='reciperevision',
+            constraint=models.UniqueConstraint(fields=('recipe', 'number'), name='recipe_revision_number_unique'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+import json
+import zlib
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+# the revision format as of this migration, see recipe/revisions.py;
+# copied so later changes to it don't change what this migration does
+FIELDS = ('name', 'ingredient', 'step')
+
+
+def encode(payload):
+    raw = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode()
+    packed = zlib.compress(raw, 9)
+    return b'z' + packed if len(packed) < len(raw) else b'j' + raw
+
+
+def snapshot_recipes(apps, schema_editor):
+    """Start the history of every existing recipe with its current text."""
+    Recipe = apps.get_model('recipe', 'Recipe')
+    RecipeRevision = apps.get_model('recipe', 'RecipeRevision')
+
+    batch = []
+    rows = (
+        Recipe.objects.order_by('id')
+        .values_list('id', *FIELDS)
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    for recipe_id, *texts in rows:
+        batch.append(
+            RecipeRevision(
+                recipe_id=recipe_id,
+                number=1,
+                is_snapshot=True,
+                data=encode(dict(zip(FIELDS, texts))),
+            )
+        )
+        if len(batch) == BATCH_SIZE:
+            RecipeRevision.objects.bulk_create(batch)
+            batch = []
+    RecipeRevision.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0011_reciperevision'),
+    ]
+
+    operations = [
+        migrations.RunPython(snapshot_recipes, migrations.RunPython.noop),
+    ]
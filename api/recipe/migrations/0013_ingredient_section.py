@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 16:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0012_snapshot_recipes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='section',
+            field=models.CharField(blank=True, choices=[('produce', '蔬菜水果'), ('meat', '肉禽'), ('dairy', '蛋奶冷藏'), ('grains', '米面粮油'), ('condiments', '调味品'), ('other', '其他')], max_length=20, verbose_name='货架分区'),
+        ),
+    ]
@@ -0,0 +1,203 @@
+# Generated by Django 3.2 on 2026-10-18 16:51
+
+import re
+from decimal import Decimal
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+NUTRIENTS = ('calories', 'protein', 'fat', 'carbs')
+
+# the ingredient parser as of this migration, see recipe/ingredients.py;
+# copied so later changes to it don't change what this migration does
+SEPARATORS = re.compile(r'[,，、;；\n]+')
+UNITS = {
+    **dict.fromkeys(['g', 'gram', 'grams', '克'], ('g', 1)),
+    **dict.fromkeys(['kg', 'kilogram', 'kilograms', '千克', '公斤'], ('g', 1000)),
+    '斤': ('g', 500),
+    '两': ('g', 50),
+    **dict.fromkeys(['lb', 'lbs', 'pound', 'pounds'], ('g', 453.6)),
+    **dict.fromkeys(['oz', 'ounce', 'ounces'], ('g', 28.35)),
+    **dict.fromkeys(['ml', 'millilitre', 'milliliter', '毫升'], ('ml', 1)),
+    **dict.fromkeys(['l', 'litre', 'liter', 'litres', 'liters', '升'], ('ml', 1000)),
+    **dict.fromkeys(['cup', 'cups', '杯'], ('ml', 240)),
+    **dict.fromkeys(['tbsp', 'tablespoon', 'tablespoons', '汤匙', '大勺'], ('ml', 15)),
+    **dict.fromkeys(['tsp', 'teaspoon', 'teaspoons', '茶匙', '小勺'], ('ml', 5)),
+    **dict.fromkeys(
+        ['pc', 'pcs', 'piece', 'pieces', '个', '只', '颗', '根', '瓣', '块', '片'],
+        (None, 1),
+    ),
+}
+QUANTITY = r'\d+/\d+|\d+(?:\.\d+)?(?:\s+\d+/\d+)?'
+UNIT = '|'.join(
+    re.escape(unit) + (r'(?![a-z])' if unit.isascii() else '')
+    for unit in sorted(UNITS, key=len, reverse=True)
+)
+LEADING = re.compile(
+    rf'^(?P<quantity>{QUANTITY})(?:\s*(?P<unit>{UNIT})\.?\s*|\s+)(?:of\s+)?(?P<name>.+)$'
+)
+TRAILING = re.compile(
+    rf'^(?P<name>.+?)(?:\s*(?P<quantity>{QUANTITY})\s*(?P<unit>{UNIT})|\s+(?P<count>{QUANTITY}))$'
+)
+
+
+def normalize(name):
+    return ' '.join(name.split()).casefold()[:50]
+
+
+def parse_quantity(text):
+    total = 0.0
+    for part in text.split():
+        if '/' in part:
+            numerator, denominator = part.split('/')
+            if int(denominator) == 0:
+                return None
+            total += int(numerator) / int(denominator)
+        else:
+            total += float(part)
+    return total
+
+
+def parse_item(item):
+    item = normalize(item)
+    match = LEADING.match(item) or TRAILING.match(item)
+    if match:
+        amount = parse_quantity(match['quantity'] or match['count'])
+        name = normalize(match['name'])
+        if amount is not None and name:
+            unit, factor = UNITS[match['unit']] if match['unit'] else (None, 1)
+            return name, amount * factor, unit
+    return item, None, None
+
+
+def parse_items(text):
+    items = {}
+    for item in SEPARATORS.split(text or ''):
+        name, amount, unit = parse_item(item)
+        if not name:
+            continue
+        if name not in items:
+            items[name] = (name, amount, unit)
+        elif None not in (amount, items[name][1]) and unit == items[name][2]:
+            items[name] = (name, items[name][1] + amount, unit)
+    return list(items.values())
+
+
+def derived_values(rows):
+    """``cost`` and nutrient totals of a recipe from its ingredients' rows.
+
+    As recipe/pricing.py and recipe/nutrition.py compute them: null while
+    any ingredient lacks the value, or without ingredients.
+    """
+    values = {}
+    for column, field in enumerate(('cost', *NUTRIENTS)):
+        parts = [row[column] for row in rows]
+        if not parts or None in parts:
+            values[field] = None
+        elif field == 'cost':
+            values[field] = sum(parts, Decimal(0))
+        else:
+            values[field] = round(sum(parts), 1)
+    return values
+
+
+def relink_batch(Recipe, Ingredient, RecipeIngredient, batch):
+    parsed = {recipe_id: parse_items(text) for recipe_id, text in batch}
+    RecipeIngredient.objects.filter(recipe_id__in=list(parsed)).delete()
+    names = {name for items in parsed.values() for name, _, _ in items}
+    data = {}
+    if names:
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name) for name in names], ignore_conflicts=True
+        )
+        data = {
+            name: (pk, values)
+            for name, pk, *values in Ingredient.objects.filter(
+                name__in=names
+            ).values_list('name', 'id', 'price', *NUTRIENTS)
+        }
+        RecipeIngredient.objects.bulk_create(
+            [
+                RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=data[name][0],
+                    position=position,
+                    quantity=amount,
+                    unit=unit or '',
+                )
+                for recipe_id, items in parsed.items()
+                for position, (name, amount, unit) in enumerate(items)
+            ]
+        )
+    # the names changed ("200g flour" is "flour"), so may the derived values
+    Recipe.objects.bulk_update(
+        [
+            Recipe(
+                id=recipe_id,
+                **derived_values([data[name][1] for name, _, _ in items]),
+            )
+            for recipe_id, items in parsed.items()
+        ],
+        ['cost', *NUTRIENTS],
+    )
+
+
+def relink_recipe_ingredients(apps, schema_editor):
+    """Link recipes to their ingredients without the quantities in the names.
+
+    Their cost and nutrient totals are computed again from the new links,
+    and the ingredients named after an item with its quantity, which no
+    recipe uses anymore, are deleted.
+    """
+    Recipe = apps.get_model('recipe', 'Recipe')
+    Ingredient = apps.get_model('recipe', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipe', 'RecipeIngredient')
+
+    batch = []
+    rows = (
+        Recipe.objects.order_by('id')
+        .values_list('id', 'ingredient')
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            relink_batch(Recipe, Ingredient, RecipeIngredient, batch)
+            batch = []
+    if batch:
+        relink_batch(Recipe, Ingredient, RecipeIngredient, batch)
+
+    orphans = [
+        pk
+        for pk, name in Ingredient.objects.filter(recipe_ingredients=None).values_list(
+            'id', 'name'
+        )
+        if parse_item(name)[1] is not None
+    ]
+    for start in range(0, len(orphans), BATCH_SIZE):
+        Ingredient.objects.filter(id__in=orphans[start : start + BATCH_SIZE]).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('recipe', '0013_ingredient_section'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipeingredient',
+            name='quantity',
+            field=models.FloatField(blank=True, null=True, verbose_name='数量'),
+        ),
+        migrations.AddField(
+            model_name='recipeingredient',
+            name='unit',
+            field=models.CharField(
+                blank=True,
+                choices=[('g', '克'), ('ml', '毫升')],
+                max_length=2,
+                verbose_name='单位',
+            ),
+        ),
+        migrations.RunPython(relink_recipe_ingredients, migrations.RunPython.noop),
+    ]
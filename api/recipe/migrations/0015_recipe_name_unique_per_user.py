@@ -0,0 +1,22 @@
+# Generated by Django 3.2 on 2026-10-18 17:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0014_recipeingredient_quantity'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='name',
+            field=models.CharField(max_length=20, verbose_name='食谱名'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipe',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='recipe_user_name_unique'),
+        ),
+    ]
@@ -1,12 +1,18 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
+
+from .ingredients import NAME_MAX_LENGTH, parse_ingredient_items
+from .nutrition import NUTRIENTS, set_nutrition
+from .pricing import set_costs
+from .shopping import SECTIONS
 
 User = get_user_model()
 
 
 # Create your models here.
 class Recipe(models.Model):
-    name = models.CharField(max_length=20, unique=True, verbose_name="食谱名")
+    name = models.CharField(max_length=20, verbose_name="食谱名")
     ingredient = models.CharField(max_length=200, verbose_name="食材")
     step = models.TextField(max_length=1000, verbose_name="步骤")
     user = models.ForeignKey(
@@ -15,10 +21,215 @@ class Recipe(models.Model):
         related_name="recipes",
         verbose_name="用户",
     )
+    ingredients = models.ManyToManyField(
+        "Ingredient",
+        through="RecipeIngredient",
+        related_name="recipes",
+        blank=True,
+        verbose_name="食材列表",
+    )
+    # maintained by a database trigger on PostgreSQL, unused elsewhere
+    search_vector = SearchVectorField(null=True, editable=False)
+    # sum of the ingredient prices, null while any of them has no price;
+    # kept up to date by save(), the bulk writers and price changes
+    cost = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        editable=False,
+        verbose_name="估算成本",
+    )
 
-    def save(self, *args, **kwargs):
+    # nutrient totals of the ingredients, null while any of them lacks data;
+    # kept up to date like cost, see recipe/nutrition.py
+    calories = models.FloatField(null=True, editable=False, verbose_name="热量")
+    protein = models.FloatField(null=True, editable=False, verbose_name="蛋白质")
+    fat = models.FloatField(null=True, editable=False, verbose_name="脂肪")
+    carbs = models.FloatField(null=True, editable=False, verbose_name="碳水化合物")
+
+    # listed in the anonymous /catalog/, set through /recipes/{id}/publish/
+    is_public = models.BooleanField(default=False, verbose_name="公开")
+
+    class Meta:
+        constraints = [
+            # names only need to tell apart the recipes of one user
+            models.UniqueConstraint(
+                fields=["user", "name"], name="recipe_user_name_unique"
+            ),
+        ]
+        indexes = [
+            # backs keyset pagination of a user's recipes
+            models.Index(fields=["user", "id"], name="recipe_user_id_idx"),
+            # backs ?ordering=cost and ?max_cost=
+            models.Index(fields=["user", "cost", "id"], name="recipe_user_cost_idx"),
+            # the most common nutrition filters and orderings
+            models.Index(
+                fields=["user", "calories", "id"], name="recipe_user_calories_idx"
+            ),
+            models.Index(
+                fields=["user", "protein", "id"], name="recipe_user_protein_idx"
+            ),
+            # backs keyset pagination of the catalog
+            models.Index(
+                fields=["id"],
+                condition=models.Q(is_public=True),
+                name="recipe_public_id_idx",
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored string so save() only re-links ingredients on change
+        instance._loaded_ingredient = instance.__dict__.get("ingredient")
+        # and so the catalog cache is only invalidated for (once) public recipes
+        instance._loaded_is_public = instance.__dict__.get("is_public")
+        return instance
+
+    def check_required_fields(self):
+        """Reject empty strings, which the database itself would accept.
+
+        Called by ``save()`` and by the bulk writers, which skip ``save()``.
+        """
         # check if the name field is a empty string
         if self.name == "" or self.ingredient == "" or self.step == "":
             raise ValueError("Name cannot be empty.")
 
+    def save(self, *args, **kwargs):
+        self.check_required_fields()
+
+        relink = self._state.adding or self.ingredient != getattr(
+            self, "_loaded_ingredient", None
+        )
+        if relink:
+            set_costs([self])
+            set_nutrition([self])
         super().save(*args, **kwargs)
+        if relink:
+            RecipeIngredient.sync([self])
+            self._loaded_ingredient = self.ingredient
+        self._loaded_is_public = self.is_public
+
+
+class RecipeRevision(models.Model):
+    """One version of a recipe's text, see recipe/revisions.py."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="revisions",
+        db_index=False,
+        verbose_name="食谱",
+    )
+    number = models.PositiveIntegerField(verbose_name="版本号")
+    # full content, or a delta against the previous revision
+    is_snapshot = models.BooleanField(default=False, verbose_name="完整快照")
+    data = models.BinaryField(verbose_name="内容")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+
+    class Meta:
+        constraints = [
+            # also the index every history read goes through
+            models.UniqueConstraint(
+                fields=["recipe", "number"], name="recipe_revision_number_unique"
+            ),
+        ]
+
+
+class Ingredient(models.Model):
+    name = models.CharField(max_length=NAME_MAX_LENGTH, unique=True, verbose_name="食材名")
+    # price of the amount a recipe typically uses, see recipe/data/ingredients.csv
+    price = models.DecimalField(
+        max_digits=8, decimal_places=2, null=True, blank=True, verbose_name="单价"
+    )
+    # nutrients of that same amount: kcal, then grams
+    calories = models.FloatField(null=True, blank=True, verbose_name="热量")
+    protein = models.FloatField(null=True, blank=True, verbose_name="蛋白质")
+    fat = models.FloatField(null=True, blank=True, verbose_name="脂肪")
+    carbs = models.FloatField(null=True, blank=True, verbose_name="碳水化合物")
+    # where /shopping-list/ files it, blank for "other"
+    section = models.CharField(
+        max_length=20, choices=SECTIONS, blank=True, verbose_name="货架分区"
+    )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored data so only real changes update recipes
+        instance._loaded_price = instance.__dict__.get("price")
+        instance._loaded_nutrients = instance.nutrients()
+        return instance
+
+    def nutrients(self):
+        return tuple(self.__dict__.get(name) for name in NUTRIENTS)
+
+    def __str__(self):
+        return self.name
+
+
+class RecipeIngredient(models.Model):
+    """Normalized link between a recipe and the ingredients parsed from it."""
+
+    # both foreign keys are covered by the composite indexes below
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="recipe_ingredients",
+        db_index=False,
+        verbose_name="食谱",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name="recipe_ingredients",
+        db_index=False,
+        verbose_name="食材",
+    )
+    position = models.PositiveSmallIntegerField(default=0, verbose_name="顺序")
+    # parsed from the item, in the base unit of recipe/ingredients.py UNITS;
+    # None when the recipe doesn't say how much, "" unit counts pieces
+    quantity = models.FloatField(null=True, blank=True, verbose_name="数量")
+    unit = models.CharField(
+        max_length=2,
+        blank=True,
+        choices=[("g", "克"), ("ml", "毫升")],
+        verbose_name="单位",
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["recipe", "ingredient"], name="recipe_ingredient_unique"
+            ),
+        ]
+        indexes = [
+            # "recipes containing X" is an index join from this side
+            models.Index(fields=["ingredient", "recipe"], name="ingredient_recipe_idx"),
+        ]
+
+    @classmethod
+    def sync(cls, recipes):
+        """Rebuild the ingredient links of saved ``recipes`` from their strings."""
+        parsed = {
+            recipe.pk: parse_ingredient_items(recipe.ingredient) for recipe in recipes
+        }
+        names = {name for items in parsed.values() for name, _, _ in items}
+
+        cls.objects.filter(recipe_id__in=parsed).delete()
+        if not names:
+            return
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name) for name in names], ignore_conflicts=True
+        )
+        ids = dict(Ingredient.objects.filter(name__in=names).values_list("name", "id"))
+        cls.objects.bulk_create(
+            cls(
+                recipe_id=recipe_id,
+                ingredient_id=ids[name],
+                position=position,
+                quantity=amount,
+                unit=unit or "",
+            )
+            for recipe_id, items in parsed.items()
+            for position, (name, amount, unit) in enumerate(items)
+        )
@@ -0,0 +1,190 @@
+"""
+Per-recipe nutrition totals, computed in batches with NumPy.
+
+Ingredient nutrient values form a dense ingredient x nutrient matrix. A
+batch of recipes is a list of (recipe, ingredient row) pairs, i.e. a sparse
+recipe x ingredient incidence matrix, and the totals are its product with
+the nutrient matrix, computed as one scatter-add per nutrient instead of a
+Python loop per recipe. Totals are stored on ``Recipe``; a total is null
+while any ingredient of the recipe lacks that nutrient.
+
+The models import this module at startup, NumPy is only imported once
+totals are computed.
+"""
+
+import threading
+
+from django.apps import apps
+
+from .cache import bump_version, get_version, user_scope
+from .ingredients import parse_ingredients
+
+NUTRIENTS = ('calories', 'protein', 'fat', 'carbs')
+NUTRIENT_SCOPE = 'nutrients'
+
+
+class NutrientTable:
+    """Nutrient values of every ingredient, as loaded at one time.
+
+    Row ``i`` of ``matrix`` holds the nutrients of ingredient ``names[i]``,
+    NaN where unknown; one extra all-NaN row, ``unknown``, stands for
+    ingredients not in the table. Never changed once built, so a request
+    holding one reads a consistent table while a newer one is loaded.
+    """
+
+    def __init__(self, matrix, rows_by_name, rows_by_id):
+        self.matrix = matrix
+        self.rows_by_name = rows_by_name
+        self.rows_by_id = rows_by_id
+        self.unknown = len(matrix) - 1
+
+    @classmethod
+    def load(cls):
+        import numpy as np
+
+        Ingredient = apps.get_model('recipe', 'Ingredient')
+        data = list(Ingredient.objects.values_list('id', 'name', *NUTRIENTS))
+        matrix = np.array(
+            [row[2:] for row in data] + [(None,) * len(NUTRIENTS)], dtype=float
+        ).reshape(-1, len(NUTRIENTS))
+        # read-only: the table is shared by the threads of the process
+        matrix.flags.writeable = False
+        return cls(
+            matrix,
+            {row[1]: i for i, row in enumerate(data)},
+            {row[0]: i for i, row in enumerate(data)},
+        )
+
+
+class NutrientMatrix:
+    """The current ``NutrientTable``, shared by the process.
+
+    Reloaded whenever the ``nutrients`` cache version changes; the new table
+    replaces the old one in a single assignment.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self.table = None  # loaded by get()
+
+    def get(self):
+        version = get_version(NUTRIENT_SCOPE)
+        if version != self.version:
+            with self._lock:
+                self.table = NutrientTable.load()
+                self.version = version
+        return self.table
+
+    def invalidate(self):
+        bump_version(NUTRIENT_SCOPE)
+
+
+nutrient_matrix = NutrientMatrix()
+
+
+def nutrient_totals(matrix, groups, rows, count):
+    """Totals of ``count`` recipes as a ``count`` x nutrient array.
+
+    ``groups[k]`` is the recipe (0..count-1) that uses matrix row
+    ``rows[k]``. Recipes without any ingredient get NaN totals.
+    """
+    import numpy as np
+
+    totals = np.empty((count, matrix.shape[1]))
+    for column in range(matrix.shape[1]):
+        totals[:, column] = np.bincount(
+            groups, weights=matrix[rows, column], minlength=count
+        )
+    totals[np.bincount(groups, minlength=count) == 0] = np.nan
+    return totals
+
+
+def apply_totals(recipes, totals):
+    """Set the nutrient fields of ``recipes``; returns those that changed."""
+    changed = []
+    for recipe, values in zip(recipes, totals.tolist()):
+        values = [None if value != value else round(value, 1) for value in values]
+        if [getattr(recipe, name) for name in NUTRIENTS] != values:
+            for name, value in zip(NUTRIENTS, values):
+                setattr(recipe, name, value)
+            changed.append(recipe)
+    return changed
+
+
+def set_nutrition(recipes):
+    """Compute the nutrient totals of unsaved or changed recipes in place."""
+    import numpy as np
+
+    table = nutrient_matrix.get()
+    groups, rows = [], []
+    for index, recipe in enumerate(recipes):
+        for name in parse_ingredients(recipe.ingredient):
+            groups.append(index)
+            rows.append(table.rows_by_name.get(name, table.unknown))
+    totals = nutrient_totals(
+        table.matrix,
+        np.array(groups, dtype=np.intp),
+        np.array(rows, dtype=np.intp),
+        len(recipes),
+    )
+    apply_totals(recipes, totals)
+
+
+def recompute_nutrition(recipe_ids=None, batch_size=10000):
+    """Re-derive stored totals from the ingredient links, in batches.
+
+    ``recipe_ids=None`` recomputes every recipe, ``batch_size`` at a time;
+    given ids are read 1000 at a time, as in ``recompute_costs``. Returns
+    the number of recipes whose totals actually changed.
+    """
+    import numpy as np
+
+    Recipe = apps.get_model('recipe', 'Recipe')
+    RecipeIngredient = apps.get_model('recipe', 'RecipeIngredient')
+    table = nutrient_matrix.get()
+    # ingredient id -> matrix row, as an array for vectorized lookups
+    ids = np.array(list(table.rows_by_id), dtype=np.int64)
+    lookup = np.full(int(ids.max(initial=0)) + 1, table.unknown, dtype=np.intp)
+    lookup[ids] = list(table.rows_by_id.values())
+
+    queryset = Recipe.objects.order_by('id').only('id', 'user_id', *NUTRIENTS)
+
+    def batches():
+        if recipe_ids is None:
+            last_id = 0
+            while True:
+                recipes = list(queryset.filter(id__gt=last_id)[:batch_size])
+                if not recipes:
+                    return
+                last_id = recipes[-1].pk
+                yield recipes
+        # an id__in list per batch, not the whole set in every query
+        pks = sorted(set(recipe_ids))
+        for start in range(0, len(pks), 1000):
+            yield list(queryset.filter(id__in=pks[start : start + 1000]))
+
+    changed = 0
+    for recipes in batches():
+        if not recipes:
+            continue
+        index = {recipe.pk: i for i, recipe in enumerate(recipes)}
+        links = np.array(
+            RecipeIngredient.objects.filter(recipe_id__in=list(index)).values_list(
+                'recipe_id', 'ingredient_id'
+            ),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        groups = np.array([index[pk] for pk in links[:, 0].tolist()], dtype=np.intp)
+        known = links[:, 1] < len(lookup)
+        rows = np.full(len(links), table.unknown, dtype=np.intp)
+        rows[known] = lookup[links[known, 1]]
+
+        updated = apply_totals(
+            recipes, nutrient_totals(table.matrix, groups, rows, len(recipes))
+        )
+        Recipe.objects.bulk_update(updated, NUTRIENTS, batch_size=1000)
+        for user_id in {recipe.user_id for recipe in updated}:
+            bump_version(user_scope(user_id))
+        changed += len(updated)
+    return changed
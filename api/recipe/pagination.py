@@ -0,0 +1,49 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+def positive_int(value, cutoff):
+    """``value`` as an int of at least 1 and at most ``cutoff``.
+
+    Raises ``ValueError`` for anything else, including 0.
+    """
+    number = int(value)
+    if number <= 0:
+        raise ValueError(value)
+    return min(number, cutoff)
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Keyset pagination over a user's recipes.
+
+    Pages seek on ``id`` inside the ``user`` filter applied by the view, so
+    every page is an index range scan on ``(user_id, id)`` no matter how deep
+    the cursor is. Paging is opt-in: requests without ``cursor`` or
+    ``page_size`` keep getting the full, unpaginated list.
+    """
+
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        params = request.query_params
+        if (
+            self.page_size_query_param not in params
+            and self.cursor_query_param not in params
+        ):
+            return None
+
+        max_page_size = settings.RECIPE_MAX_PAGE_SIZE
+        try:
+            return positive_int(params[self.page_size_query_param], max_page_size)
+        except (KeyError, ValueError):
+            return min(settings.RECIPE_PAGE_SIZE, max_page_size)
+
+
+class CatalogCursorPagination(RecipeCursorPagination):
+    """Keyset pagination of ``/catalog/``, which is always paged."""
+
+    def get_page_size(self, request):
+        return super().get_page_size(request) or min(
+            settings.RECIPE_PAGE_SIZE, settings.RECIPE_MAX_PAGE_SIZE
+        )
@@ -0,0 +1,27 @@
+import json
+
+from django.conf import settings
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """Newline-delimited JSON, one recipe object per line.
+
+    Lines are decoded lazily so the bulk endpoint can write a large upload
+    chunk by chunk. A line that isn't valid JSON is yielded as ``None`` and
+    reported as an error for that item.
+    """
+
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        return (self.load_line(line, encoding) for line in stream if line.strip())
+
+    @staticmethod
+    def load_line(line, encoding):
+        try:
+            return json.loads(line.decode(encoding))
+        except ValueError:
+            return None
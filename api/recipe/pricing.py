@@ -0,0 +1,102 @@
+"""
+Recipe cost estimation from the ingredient price table.
+
+A recipe costs the sum of the prices of its parsed ingredients. The cost is
+stored on ``Recipe.cost`` when a recipe is written and recomputed only for
+the recipes using an ingredient whose price changed, so listing or sorting
+by cost never recomputes anything.
+"""
+
+import threading
+from decimal import Decimal
+
+from django.apps import apps
+
+from .cache import bump_version, get_version, user_scope
+from .ingredients import parse_ingredients
+
+PRICE_SCOPE = 'prices'
+
+
+class PriceTable:
+    """Ingredient name -> price, shared by the process.
+
+    Reloaded from the database whenever the ``prices`` cache version
+    changes, i.e. after any price change made by any process sharing the
+    cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self.prices = {}
+
+    def get(self):
+        version = get_version(PRICE_SCOPE)
+        if version != self.version:
+            with self._lock:
+                Ingredient = apps.get_model('recipe', 'Ingredient')
+                self.prices = dict(
+                    Ingredient.objects.exclude(price=None).values_list('name', 'price')
+                )
+                self.version = version
+        return self.prices
+
+    def invalidate(self):
+        bump_version(PRICE_SCOPE)
+
+
+price_table = PriceTable()
+
+
+def estimate_cost(names, prices):
+    """Total price of ``names``, None unless every one of them has a price."""
+    if not names:
+        return None
+    total = Decimal(0)
+    for name in names:
+        price = prices.get(name)
+        if price is None:
+            return None
+        total += price
+    return total
+
+
+def set_costs(recipes):
+    """Compute ``cost`` of unsaved or changed recipes in place."""
+    prices = price_table.get()
+    for recipe in recipes:
+        recipe.cost = estimate_cost(parse_ingredients(recipe.ingredient), prices)
+
+
+def recompute_costs(recipe_ids, batch_size=1000):
+    """Re-estimate stored costs, e.g. after ingredient prices changed.
+
+    Returns the number of recipes whose cost actually changed.
+    """
+    Recipe = apps.get_model('recipe', 'Recipe')
+    recipe_ids = list(recipe_ids)
+    changed = 0
+    for start in range(0, len(recipe_ids), batch_size):
+        recipes = list(
+            Recipe.objects.filter(id__in=recipe_ids[start : start + batch_size]).only(
+                'id', 'ingredient', 'user_id', 'cost'
+            )
+        )
+        previous = {recipe.pk: recipe.cost for recipe in recipes}
+        set_costs(recipes)
+        recipes = [recipe for recipe in recipes if recipe.cost != previous[recipe.pk]]
+        Recipe.objects.bulk_update(recipes, ['cost'])
+        for user_id in {recipe.user_id for recipe in recipes}:
+            bump_version(user_scope(user_id))
+        changed += len(recipes)
+    return changed
+
+
+def recipes_using(ingredient_ids):
+    RecipeIngredient = apps.get_model('recipe', 'RecipeIngredient')
+    return (
+        RecipeIngredient.objects.filter(ingredient_id__in=ingredient_ids)
+        .values_list('recipe_id', flat=True)
+        .distinct()
+    )
@@ -0,0 +1,57 @@
+from django.shortcuts import get_object_or_404
+from rest_framework.response import Response
+
+from backend.routers import read_from_replicas
+
+from .cache import user_scope
+
+
+class ReplicaReadMixin:
+    """Run ``list``/``retrieve`` on a read replica.
+
+    Users who just changed their recipes are pinned to the primary for
+    ``DATABASE_REPLICA_STICKY_SECONDS`` so they read their own writes.
+    """
+
+    def replica_reads(self):
+        return read_from_replicas(user_scope(self.request.user.pk))
+
+    def list(self, request, *args, **kwargs):
+        with self.replica_reads():
+            return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        with self.replica_reads():
+            return super().retrieve(request, *args, **kwargs)
+
+
+class ValuesReadMixin:
+    """Serve ``list``/``retrieve`` from ``.values()`` rows.
+
+    Fetches only the columns ``read_serializer_class`` needs and skips model
+    instances and ``ModelSerializer`` field machinery entirely. Filters,
+    pagination and permissions run exactly as on the regular path.
+    """
+
+    read_serializer_class = None
+
+    def get_read_serializer(self):
+        return self.read_serializer_class()
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_read_serializer()
+        queryset = serializer.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.many(page))
+        return Response(serializer.many(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        serializer = self.get_read_serializer()
+        queryset = serializer.values(self.filter_queryset(self.get_queryset()))
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(
+            queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        self.check_object_permissions(request, row)
+        return Response(serializer.to_representation(row))
@@ -0,0 +1,244 @@
+"""
+Revision history of recipes, stored as compressed deltas.
+
+Every save that changes ``FIELDS`` appends a ``RecipeRevision``. Most are
+deltas against the previous revision: per changed field, a list of edit
+operations (an int > 0 copies that many characters of the old text, an int
+< 0 skips them, a string is inserted). Every
+``RECIPE_REVISION_SNAPSHOT_INTERVAL``-th revision stores the full content
+instead, so rebuilding any version reads one snapshot and applies fewer
+than that many deltas. Payloads are JSON, zlib-compressed when it helps.
+
+A history of small edits takes under a tenth of the space of full copies
+(see RevisionStorageBenchmark).
+"""
+
+import json
+import re
+import zlib
+from difflib import SequenceMatcher
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+
+FIELDS = ('name', 'ingredient', 'step')
+
+# diffed by words rather than characters, an order of magnitude faster;
+# Chinese, written without spaces, character by character
+TOKEN = re.compile(r'[\u3400-\u9fff]|\w+|\s+|.', re.S)
+
+
+def encode(payload):
+    raw = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode()
+    packed = zlib.compress(raw, 9)
+    # tiny deltas don't compress, zlib would only add its header
+    return b'z' + packed if len(packed) < len(raw) else b'j' + raw
+
+
+def decode(data):
+    data = bytes(data)
+    raw = zlib.decompress(data[1:]) if data[:1] == b'z' else data[1:]
+    return json.loads(raw)
+
+
+def diff(old, new):
+    """Edit operations turning ``old`` into ``new``."""
+    a, b = TOKEN.findall(old), TOKEN.findall(new)
+    # edits are mostly local: match only what lies between the common ends
+    start, end = 0, 0
+    while start < min(len(a), len(b)) and a[start] == b[start]:
+        start += 1
+    while end < min(len(a), len(b)) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    offsets = [0]
+    for token in a:
+        offsets.append(offsets[-1] + len(token))
+
+    ops = [offsets[start]] if start else []
+    matcher = SequenceMatcher(
+        None, a[start : len(a) - end], b[start : len(b) - end], autojunk=False
+    )
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        length = offsets[start + i2] - offsets[start + i1]
+        if tag == 'equal':
+            ops.append(length)
+            continue
+        if length:
+            ops.append(-length)
+        if j2 > j1:
+            ops.append(''.join(b[start + j1 : start + j2]))
+    if end:
+        ops.append(offsets[-1] - offsets[len(a) - end])
+    return ops
+
+
+def patch(old, ops):
+    parts, position = [], 0
+    for op in ops:
+        if isinstance(op, str):
+            parts.append(op)
+        elif op > 0:
+            parts.append(old[position : position + op])
+            position += op
+        else:
+            position -= op
+    return ''.join(parts)
+
+
+def content_of(recipe):
+    return {field: getattr(recipe, field) for field in FIELDS}
+
+
+def next_revision(previous, content, number, interval):
+    """``(is_snapshot, data)`` of revision ``number``, or None if unchanged.
+
+    ``previous`` is the content of revision ``number - 1`` (None for the
+    first one).
+    """
+    if previous == content:
+        return None
+    if previous is None or (number - 1) % interval == 0:
+        return True, encode(content)
+    delta = {
+        field: diff(previous[field], content[field])
+        for field in FIELDS
+        if previous[field] != content[field]
+    }
+    return False, encode(delta)
+
+
+def apply(content, revision):
+    """Content of ``revision``, given the content of the one before."""
+    payload = decode(revision.data)
+    if revision.is_snapshot:
+        return payload
+    content = dict(content)
+    for field, ops in payload.items():
+        content[field] = patch(content[field], ops)
+    return content
+
+
+def rebuild(revisions):
+    """Content of the last of ``revisions``, which start with a snapshot."""
+    content = None
+    for revision in revisions:
+        content = apply(content, revision)
+    return content
+
+
+def chain(recipe_id, number=None):
+    """Revisions needed to rebuild version ``number`` (default the latest)."""
+    RecipeRevision = apps.get_model('recipe', 'RecipeRevision')
+    revisions = RecipeRevision.objects.filter(recipe_id=recipe_id)
+    if number is not None:
+        revisions = revisions.filter(number__lte=number)
+    snapshot = (
+        revisions.filter(is_snapshot=True)
+        .order_by('-number')
+        .values_list('number', flat=True)
+        .first()
+    )
+    if snapshot is None:
+        return []
+    return list(revisions.filter(number__gte=snapshot).order_by('number'))
+
+
+def get_version(recipe_id, number):
+    """Content of version ``number`` of a recipe, None if there is none."""
+    revisions = chain(recipe_id, number)
+    if not revisions or revisions[-1].number != number:
+        return None
+    return rebuild(revisions)
+
+
+def recent_versions(recipe_id, limit, before=None):
+    """The ``limit`` latest versions older than ``before``, newest first.
+
+    Returns ``[(revision, content), ...]``. Versions are rebuilt in one pass
+    from the snapshot preceding the oldest of them, one delta each.
+    """
+    RecipeRevision = apps.get_model('recipe', 'RecipeRevision')
+    revisions = RecipeRevision.objects.filter(recipe_id=recipe_id)
+    if before is not None:
+        revisions = revisions.filter(number__lt=before)
+    numbers = list(
+        revisions.order_by('-number').values_list('number', flat=True)[:limit]
+    )
+    if not numbers:
+        return []
+    newest, oldest = numbers[0], numbers[-1]
+    snapshot = (
+        revisions.filter(is_snapshot=True, number__lte=oldest)
+        .order_by('-number')
+        .values_list('number', flat=True)
+        .first()
+    )
+    versions, content = [], None
+    for revision in revisions.filter(number__gte=snapshot, number__lte=newest).order_by(
+        'number'
+    ):
+        content = apply(content, revision)
+        if revision.number >= oldest:
+            versions.append((revision, content))
+    return versions[::-1]
+
+
+def record_revisions(recipes):
+    """Append a revision to each of ``recipes`` whose content changed.
+
+    The recipe rows are locked first, so concurrent saves of a recipe number
+    their revisions one after the other. Then two queries for the whole
+    batch to find and read the current chains, one to insert the new
+    revisions.
+    """
+    Recipe = apps.get_model('recipe', 'Recipe')
+    RecipeRevision = apps.get_model('recipe', 'RecipeRevision')
+    recipes = {recipe.pk: recipe for recipe in recipes}
+    if not recipes:
+        return []
+    with transaction.atomic():
+        # in id order, so two batches sharing recipes can't deadlock
+        list(
+            Recipe.objects.select_for_update()
+            .filter(pk__in=list(recipes))
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        heads = (
+            RecipeRevision.objects.filter(recipe_id__in=list(recipes))
+            .values('recipe_id')
+            .annotate(
+                last=Max('number'),
+                snapshot=Max('number', filter=Q(is_snapshot=True)),
+            )
+        )
+        chains = {}
+        condition = Q()
+        for head in heads:
+            chains[head['recipe_id']] = head['last']
+            condition |= Q(recipe_id=head['recipe_id'], number__gte=head['snapshot'])
+        current = {}
+        if chains:
+            revisions = {}
+            for revision in RecipeRevision.objects.filter(condition).order_by('number'):
+                revisions.setdefault(revision.recipe_id, []).append(revision)
+            current = {pk: rebuild(rows) for pk, rows in revisions.items()}
+
+        interval = settings.RECIPE_REVISION_SNAPSHOT_INTERVAL
+        created = []
+        for pk, recipe in recipes.items():
+            number = chains.get(pk, 0) + 1
+            revision = next_revision(
+                current.get(pk), content_of(recipe), number, interval
+            )
+            if revision is not None:
+                is_snapshot, data = revision
+                created.append(
+                    RecipeRevision(
+                        recipe_id=pk, number=number, is_snapshot=is_snapshot, data=data
+                    )
+                )
+        RecipeRevision.objects.bulk_create(created)
+    return created
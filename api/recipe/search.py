@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramSimilarity,
+)
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+
+# must match the config used by the trigger in migration 0007; "simple" does
+# no stemming, which suits the mix of Chinese and English recipe text
+SEARCH_CONFIG = "simple"
+
+
+def search_recipes(queryset, text):
+    """Filter ``queryset`` down to the best matches for ``text``, best first.
+
+    On PostgreSQL this is a ranked full-text match on the stored
+    ``search_vector`` (GIN index), falling back to trigram similarity on
+    ``name``/``ingredient`` when nothing matches, which tolerates typos.
+    Other backends get a plain ``icontains`` scan so tests run on SQLite.
+    The result is sliced to ``RECIPE_SEARCH_LIMIT`` rows.
+    """
+    limit = settings.RECIPE_SEARCH_LIMIT
+    if connections[queryset.db].vendor != "postgresql":
+        return queryset.filter(
+            Q(name__icontains=text)
+            | Q(ingredient__icontains=text)
+            | Q(step__icontains=text)
+        ).order_by("id")[:limit]
+
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+    ranked = queryset.filter(search_vector=query)
+    if ranked.exists():
+        return ranked.annotate(rank=SearchRank(F("search_vector"), query)).order_by(
+            "-rank", "id"
+        )[:limit]
+
+    return (
+        queryset.filter(
+            Q(name__trigram_similar=text) | Q(ingredient__trigram_similar=text)
+        )
+        .annotate(
+            similarity=Greatest(
+                TrigramSimilarity("name", text), TrigramSimilarity("ingredient", text)
+            )
+        )
+        .order_by("-similarity", "id")[:limit]
+    )
@@ -1,5 +1,8 @@
 from rest_framework import serializers
 from .models import Recipe
+from .nutrition import NUTRIENTS
+
+NAME_TAKEN = 'You already have a recipe with this name.'
 
 
 class RecipeSerializer(serializers.ModelSerializer):
@@ -8,3 +11,217 @@ class RecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = ['name', 'ingredient', 'step', 'user']
+
+    def validate_name(self, value):
+        # unique per user (see Recipe.Meta), which DRF doesn't check by itself;
+        # BulkWriter checks a whole chunk in one query instead
+        if self.context.get('names_checked'):
+            return value
+        if self.instance is not None:
+            user_id = self.instance.user_id
+        elif 'request' in self.context:
+            user_id = self.context['request'].user.pk
+        else:
+            # no owner to compare with, the constraint still holds on save
+            return value
+        taken = Recipe.objects.filter(user_id=user_id, name=value)
+        if self.instance is not None:
+            taken = taken.exclude(pk=self.instance.pk)
+        if taken.exists():
+            raise serializers.ValidationError(NAME_TAKEN)
+        return value
+
+
+class RecipeRowSerializer:
+    """Read-only twin of ``RecipeSerializer`` working on ``.values()`` rows.
+
+    Keep ``columns`` in sync with ``RecipeSerializer.Meta.fields``, output
+    field name -> model column. ``keys`` are the fields the cursor paginator
+    may order by; they are fetched but, like in ``RecipeSerializer``, not
+    returned.
+    """
+
+    keys = ['id', 'cost', *NUTRIENTS]
+
+    columns = {
+        'name': 'name',
+        'ingredient': 'ingredient',
+        'step': 'step',
+        'user': 'user_id',
+    }
+
+    def values(self, queryset):
+        return queryset.values(*self.keys, *self.columns.values())
+
+    def to_representation(self, row):
+        return {field: row[column] for field, column in self.columns.items()}
+
+    def many(self, rows):
+        to_representation = self.to_representation
+        return [to_representation(row) for row in rows]
+
+
+class CatalogRowSerializer(RecipeRowSerializer):
+    """Recipes of ``/catalog/``: with their id and author's name, no user id."""
+
+    keys = []
+
+    columns = {
+        'id': 'id',
+        'name': 'name',
+        'ingredient': 'ingredient',
+        'step': 'step',
+        'author': 'user__username',
+    }
+
+
+class AdminRecipeRowSerializer(RecipeRowSerializer):
+    """Recipes exported from the admin: any user's, so with ids and owner."""
+
+    keys = []
+
+    columns = {
+        'id': 'id',
+        'name': 'name',
+        'ingredient': 'ingredient',
+        'step': 'step',
+        'user': 'user_id',
+        'username': 'user__username',
+        'is_public': 'is_public',
+    }
+
+
+class IngredientPriceSerializer(serializers.Serializer):
+    name = serializers.CharField()
+    price = serializers.DecimalField(max_digits=8, decimal_places=2, allow_null=True)
+
+
+class RecipeCostSerializer(serializers.Serializer):
+    """Cost estimate of a recipe, ingredient by ingredient."""
+
+    cost = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+    ingredients = IngredientPriceSerializer(many=True)
+    # ingredients without a price, which leave the cost unknown
+    missing = serializers.ListField(child=serializers.CharField())
+
+
+class NutrientsSerializer(serializers.Serializer):
+    calories = serializers.FloatField(allow_null=True)
+    protein = serializers.FloatField(allow_null=True)
+    fat = serializers.FloatField(allow_null=True)
+    carbs = serializers.FloatField(allow_null=True)
+
+
+class IngredientNutrientsSerializer(NutrientsSerializer):
+    name = serializers.CharField()
+
+
+class RecipeNutritionSerializer(serializers.Serializer):
+    """Nutrient totals of a recipe, ingredient by ingredient."""
+
+    total = NutrientsSerializer()
+    ingredients = IngredientNutrientsSerializer(many=True)
+
+
+class MealPlanQuerySerializer(serializers.Serializer):
+    """Query parameters of ``/mealplan/``, nutrient targets are weekly totals."""
+
+    meals = serializers.IntegerField(min_value=1, max_value=28, default=7)
+    pantry = serializers.CharField(required=False, allow_blank=True, default='')
+    calories = serializers.FloatField(min_value=1, required=False)
+    protein = serializers.FloatField(min_value=1, required=False)
+    fat = serializers.FloatField(min_value=1, required=False)
+    carbs = serializers.FloatField(min_value=1, required=False)
+
+
+class MealSerializer(RecipeSerializer):
+    class Meta(RecipeSerializer.Meta):
+        fields = ['id', *RecipeSerializer.Meta.fields, 'cost', *NUTRIENTS]
+
+
+class PlanTotalSerializer(NutrientsSerializer):
+    cost = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class MealPlanSerializer(serializers.Serializer):
+    meals = MealSerializer(many=True)
+    total = PlanTotalSerializer()
+    # ingredients of the plan not covered by the pantry
+    shopping_list = serializers.ListField(child=serializers.CharField())
+
+
+class ShoppingListQuerySerializer(serializers.Serializer):
+    """Query parameters of ``/shopping-list/``."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), min_length=1, max_length=100
+    )
+    pantry = serializers.CharField(required=False, allow_blank=True, default='')
+
+
+class ShoppingQuantitySerializer(serializers.Serializer):
+    amount = serializers.FloatField()
+    # "g", "ml", or null for a number of pieces
+    unit = serializers.CharField(allow_null=True)
+
+
+class ShoppingItemSerializer(serializers.Serializer):
+    name = serializers.CharField()
+    quantities = ShoppingQuantitySerializer(many=True)
+    recipes = serializers.ListField(child=serializers.IntegerField())
+
+
+class ShoppingSectionSerializer(serializers.Serializer):
+    section = serializers.CharField()
+    label = serializers.CharField()
+    items = ShoppingItemSerializer(many=True)
+
+
+class ShoppingListSerializer(serializers.Serializer):
+    sections = ShoppingSectionSerializer(many=True)
+    # requested ids that are not recipes of the user
+    missing = serializers.ListField(child=serializers.IntegerField())
+
+
+class SuggestQuerySerializer(serializers.Serializer):
+    """Query parameters of ``/recipes/suggest/``."""
+
+    pantry = serializers.CharField()
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+    min_coverage = serializers.FloatField(min_value=0, max_value=1, default=0)
+
+
+class SimilarQuerySerializer(serializers.Serializer):
+    """Query parameters of ``/recipes/{id}/similar/``."""
+
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+    min_similarity = serializers.FloatField(min_value=0, max_value=1, default=0)
+
+
+class HistoryQuerySerializer(serializers.Serializer):
+    """Query parameters of ``/recipes/{id}/history/``."""
+
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+    # only versions older than this one, to page through long histories
+    before = serializers.IntegerField(min_value=1, required=False)
+
+
+class RevisionSerializer(serializers.Serializer):
+    version = serializers.IntegerField()
+    created_at = serializers.DateTimeField()
+    name = serializers.CharField()
+    ingredient = serializers.CharField()
+    step = serializers.CharField()
+
+
+class RevertSerializer(serializers.Serializer):
+    version = serializers.IntegerField(min_value=1)
+
+
+class TokenObtainSerializer(serializers.Serializer):
+    username = serializers.CharField()
+    password = serializers.CharField(style={'input_type': 'password'})
+
+
+class TokenRefreshSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
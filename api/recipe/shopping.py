@@ -0,0 +1,121 @@
+"""
+Shopping lists: the ingredients of several recipes, merged and grouped.
+
+Ingredients are read from the ``RecipeIngredient`` rows, which store the
+name, quantity and unit parsed from ``Recipe.ingredient`` when a recipe is
+saved (see ``parse_item`` in recipe/ingredients.py). Quantities are in a
+base unit per dimension (grams, millilitres, or a count) so that "1kg
+flour" and "200g flour" add up, and pantry items are subtracted the same
+way ("flour 500g" leaves 700g to buy, "flour" alone covers any amount).
+"""
+
+from django.apps import apps
+
+from .ingredients import SEPARATORS, parse_item
+
+# store sections in the order of a walk through the store
+SECTIONS = [
+    ("produce", "蔬菜水果"),
+    ("meat", "肉禽"),
+    ("dairy", "蛋奶冷藏"),
+    ("grains", "米面粮油"),
+    ("condiments", "调味品"),
+    ("other", "其他"),
+]
+
+
+class Need:
+    """Amounts of one ingredient per base unit, and the recipes using it.
+
+    ``unquantified`` is set when some recipe doesn't say how much.
+    """
+
+    def __init__(self):
+        self.amounts = {}
+        self.unquantified = False
+        self.recipes = []
+
+    def add(self, amount, unit):
+        if amount is None:
+            self.unquantified = True
+        else:
+            self.amounts[unit] = self.amounts.get(unit, 0) + amount
+
+    def subtract(self, stock):
+        """Take what ``stock`` (another ``Need``) covers; True if nothing is left."""
+        if stock.unquantified:
+            return True
+        # any amount in stock does for recipes that don't say how much
+        self.unquantified = False
+        for unit, amount in stock.amounts.items():
+            if unit in self.amounts:
+                self.amounts[unit] -= amount
+                if self.amounts[unit] <= 1e-9:
+                    del self.amounts[unit]
+        return not self.amounts and not self.unquantified
+
+
+def merge(rows, pantry_text=""):
+    """Ingredient name -> ``Need`` of ``(recipe id, name, amount, unit)`` rows.
+
+    Names are kept in order of first use; what the pantry covers is left out.
+    """
+    needs = {}
+    for recipe_id, name, amount, unit in rows:
+        need = needs.setdefault(name, Need())
+        need.add(amount, unit)
+        if recipe_id not in need.recipes:
+            need.recipes.append(recipe_id)
+
+    pantry = {}
+    for item in SEPARATORS.split(pantry_text or ""):
+        name, amount, unit = parse_item(item)
+        if name:
+            pantry.setdefault(name, Need()).add(amount, unit)
+    for name, stock in pantry.items():
+        if name in needs and needs[name].subtract(stock):
+            del needs[name]
+    return needs
+
+
+def shopping_list(recipe_ids, pantry_text=""):
+    """Sections of the shopping list for the recipes ``recipe_ids``, in order.
+
+    One query for their ingredient rows and the store section of each
+    ingredient; those without one are filed under "other".
+    """
+    RecipeIngredient = apps.get_model("recipe", "RecipeIngredient")
+    order = {recipe_id: index for index, recipe_id in enumerate(recipe_ids)}
+    rows = sorted(
+        RecipeIngredient.objects.filter(recipe_id__in=list(order))
+        .order_by("position")
+        .values_list(
+            "recipe_id", "ingredient__name", "ingredient__section", "quantity", "unit"
+        ),
+        key=lambda row: order[row[0]],
+    )
+    needs = merge(
+        (
+            (recipe_id, name, quantity, unit or None)
+            for recipe_id, name, _, quantity, unit in rows
+        ),
+        pantry_text,
+    )
+    sections = {name: section for _, name, section, _, _ in rows if section}
+    grouped = {key: [] for key, _ in SECTIONS}
+    for name, need in needs.items():
+        grouped[sections.get(name, "other")].append(
+            {
+                "name": name,
+                "quantities": [
+                    {"amount": round(amount, 2), "unit": unit}
+                    for unit, amount in need.amounts.items()
+                ],
+                "recipes": need.recipes,
+            }
+        )
+    return [
+        {"section": key, "label": label, "items": grouped[key]}
+        for key, label in SECTIONS
+        if grouped[key]
+    ]
@@ -0,0 +1,118 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from backend.routers import pin_to_primary
+
+from .cache import CATALOG_SCOPE, bump_version, user_scope
+from .models import Ingredient, Recipe
+from .nutrition import nutrient_matrix
+from .pricing import price_table, recipes_using
+from .revisions import FIELDS, record_revisions
+from .suggest import pantry_index
+from .tasks import index_similar_recipes, refresh_ingredient_recipes, relink_recipes
+
+# sent by the bulk writers, which bypass save() and therefore post_save;
+# provides ``instances`` (saved recipes) and ``created``
+recipes_bulk_saved = Signal()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def record_pantry_change(sender, instance, **kwargs):
+    pantry_index.record([instance.pk])
+
+
+@receiver(recipes_bulk_saved, sender=Recipe)
+def record_bulk_pantry_changes(sender, instances, **kwargs):
+    pantry_index.record(recipe.pk for recipe in instances)
+
+
+@receiver(post_save, sender=Recipe)
+def record_recipe_revision(sender, instance, update_fields=None, **kwargs):
+    # e.g. publish: no text saved, nothing to compare
+    if update_fields is not None and not set(update_fields) & set(FIELDS):
+        return
+    record_revisions([instance])
+
+
+@receiver(recipes_bulk_saved, sender=Recipe)
+def record_bulk_saved_recipe_revisions(sender, instances, **kwargs):
+    record_revisions(instances)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def index_similar_recipe_later(sender, instance, **kwargs):
+    index_similar_recipes.enqueue(
+        [instance.pk], dedup_key=f"{index_similar_recipes.name}:{instance.pk}"
+    )
+
+
+@receiver(recipes_bulk_saved, sender=Recipe)
+def index_similar_bulk_saved_recipes_later(sender, instances, **kwargs):
+    index_similar_recipes.enqueue([recipe.pk for recipe in instances])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_user_cache(sender, instance, **kwargs):
+    bump_version(user_scope(instance.user_id))
+    # let the user read their own write until the replicas catch up
+    pin_to_primary(user_scope(instance.user_id))
+
+
+@receiver(recipes_bulk_saved, sender=Recipe)
+def invalidate_bulk_user_cache(sender, instances, **kwargs):
+    for user_id in {recipe.user_id for recipe in instances}:
+        bump_version(user_scope(user_id))
+        pin_to_primary(user_scope(user_id))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    # Recipe.save() updates _loaded_is_public once the signals are sent
+    if instance.is_public or getattr(instance, "_loaded_is_public", False):
+        bump_version(CATALOG_SCOPE)
+
+
+@receiver(recipes_bulk_saved, sender=Recipe)
+def invalidate_bulk_catalog_cache(sender, instances, **kwargs):
+    if any(recipe.is_public for recipe in instances):
+        bump_version(CATALOG_SCOPE)
+
+
+@receiver(post_save, sender=Ingredient)
+def refresh_ingredient_recipes_later(sender, instance, **kwargs):
+    repriced = instance.price != getattr(instance, "_loaded_price", None)
+    nutrients = instance.nutrients()
+    renourished = nutrients != getattr(
+        instance, "_loaded_nutrients", (None,) * len(nutrients)
+    )
+    if not (repriced or renourished):
+        return
+    instance._loaded_price, instance._loaded_nutrients = instance.price, nutrients
+    if repriced:
+        price_table.invalidate()
+    if renourished:
+        nutrient_matrix.invalidate()
+    # may touch many recipes, leave it to the worker
+    refresh_ingredient_recipes.enqueue(
+        instance.pk, dedup_key=f"{refresh_ingredient_recipes.name}:{instance.pk}"
+    )
+
+
+@receiver(pre_delete, sender=Ingredient)
+def collect_ingredient_recipes(sender, instance, **kwargs):
+    # the links are gone by post_delete
+    instance._recipe_ids = list(recipes_using([instance.pk]))
+
+
+@receiver(post_delete, sender=Ingredient)
+def relink_ingredient_recipes_later(sender, instance, **kwargs):
+    price_table.invalidate()
+    nutrient_matrix.invalidate()
+    # the recipes still list the ingredient: link them to a fresh, empty row
+    recipe_ids = getattr(instance, "_recipe_ids", [])
+    if recipe_ids:
+        relink_recipes.enqueue(recipe_ids)
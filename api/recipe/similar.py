@@ -0,0 +1,358 @@
+"""
+"More like this": MinHash signatures of recipes, bucketed with LSH.
+
+A recipe is reduced to a set of shingles (its ingredient names and the words
+of its name and steps) and the set to ``NUM_PERM`` MinHash values: the share
+of equal values between two signatures estimates the Jaccard similarity of
+the two sets. Signatures are cut into ``BANDS`` bands of ``ROWS`` values and
+recipes sharing a band with the query are the only candidates scored, so a
+query touches a handful of buckets instead of every recipe of the user.
+With 16 bands of 2 rows, pairs at 0.3 similarity meet in a bucket ~80% of
+the time and pairs at 0.5 ~99%.
+
+Target: under 10ms per query for 100k recipes (see SimilarBenchmark).
+
+The index is shared by the web processes and the worker through
+``RECIPE_SIMILARITY_DIR``:
+
+- ``snapshot.npz`` holds every signature; it is built from the database by
+  the ``recipe.build_similarity_index`` task, queued by the first query
+  (or by ``manage.py build_similarity_index``), never in a request,
+- ``journal-<generation>.bin`` is an append-only log of fixed-size records
+  written by the ``recipe.index_similar_recipes`` task on every save, that
+  each process replays before answering a query,
+- once the journal grows large, the writer folds it into a new snapshot
+  (generation) and the other processes reload on their next query.
+
+Writers serialize on an ``flock`` of ``lock`` in the same directory.
+"""
+
+import fcntl
+import os
+import re
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from django.apps import apps
+from django.conf import settings
+
+from .ingredients import parse_ingredients
+
+NUM_PERM = 32
+BANDS, ROWS = 16, 2
+# journal records folded into a new snapshot at least
+COMPACT_AFTER = 10000
+
+_PRIME = (1 << 31) - 1
+# fixed seed: signatures are persisted and compared across processes
+_rng = np.random.RandomState(20240601)
+_A = _rng.randint(1, _PRIME, NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, _PRIME, NUM_PERM).astype(np.uint64)
+# signature of a recipe without any shingle, never bucketed
+EMPTY = np.full(NUM_PERM, _PRIME, dtype=np.uint32)
+
+# one journal entry, a negative user removes the recipe
+RECORD = np.dtype([("id", "<i8"), ("user", "<i8"), ("signature", "<u4", NUM_PERM)])
+
+WORD = re.compile(r"\w+")
+CJK = re.compile(r"[\u3400-\u9fff]")
+
+
+def words(text):
+    for word in WORD.findall((text or "").casefold()):
+        if CJK.search(word):
+            # Chinese is written without spaces, use character bigrams
+            yield from (word[i : i + 2] for i in range(max(len(word) - 1, 1)))
+        elif len(word) > 1 and not word.isdigit():
+            yield word
+
+
+def shingles(name, ingredient, step):
+    return {
+        *(f"i:{item}" for item in parse_ingredients(ingredient)),
+        *(f"w:{word}" for word in words(name)),
+        *(f"w:{word}" for word in words(step)),
+    }
+
+
+def minhash(tokens):
+    """MinHash signature of a set of strings, ``NUM_PERM`` uint32 values."""
+    if not tokens:
+        return EMPTY.copy()
+    # crc32 rather than hash(): the latter is salted per process
+    hashes = np.fromiter(
+        (zlib.crc32(token.encode()) & _PRIME for token in tokens),
+        dtype=np.uint64,
+        count=len(tokens),
+    )
+    # a * x + b < 2 ** 63, no overflow
+    return ((np.outer(hashes, _A) + _B) % _PRIME).min(axis=0).astype(np.uint32)
+
+
+def recipe_signature(recipe):
+    return minhash(shingles(recipe.name, recipe.ingredient, recipe.step))
+
+
+def band_keys(signatures):
+    """One exact uint64 key per band (ROWS == 2 values of 31 bits)."""
+    bands = signatures.reshape(-1, BANDS, ROWS).astype(np.uint64)
+    return bands[..., 0] << np.uint64(32) | bands[..., 1]
+
+
+class SimilarityIndex:
+    """Recipe signatures in process memory, kept in sync with the files.
+
+    Signatures live in one growable array (a row per recipe) so that
+    scoring the candidates of a query is a single vectorized comparison;
+    ``buckets`` maps ``(user id, band, band key)`` to recipe ids.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.snapshot = None  # (inode, mtime) of the loaded snapshot
+            self.generation = None
+            self.offset = 0  # bytes of the journal replayed
+            self.rows = {}  # recipe id -> row
+            self.free = []
+            self.ids = np.empty(0, dtype=np.int64)
+            self.users = np.empty(0, dtype=np.int64)
+            self.signatures = np.empty((0, NUM_PERM), dtype=np.uint32)
+            self.buckets = {}
+
+    @property
+    def directory(self):
+        return Path(settings.RECIPE_SIMILARITY_DIR)
+
+    @property
+    def snapshot_path(self):
+        return self.directory / "snapshot.npz"
+
+    def journal_path(self, generation):
+        return self.directory / f"journal-{generation}.bin"
+
+    @contextmanager
+    def file_lock(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / "lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def refresh(self):
+        """Catch up with the files; False while they are not built yet."""
+        with self._lock:
+            self.sync()
+            return self.generation is not None
+
+    def ensure_built(self):
+        """Build the files, unless another process did meanwhile."""
+        with self._lock:
+            if not self.snapshot_path.exists():
+                with self.file_lock():
+                    if not self.snapshot_path.exists():
+                        self.build()
+            self.sync()
+
+    def sync(self):
+        try:
+            stat = self.snapshot_path.stat()
+        except FileNotFoundError:
+            return
+        if (stat.st_ino, stat.st_mtime_ns) != self.snapshot:
+            self.load()
+        self.replay()
+
+    def load(self):
+        with open(self.snapshot_path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            with np.load(f) as data:
+                ids, users = data["ids"], data["users"]
+                signatures, generation = data["signatures"], int(data["generation"])
+        self.reset()
+        self.snapshot = (stat.st_ino, stat.st_mtime_ns)
+        self.generation = generation
+        self.grow(len(ids))
+        for recipe_id, user_id, signature in zip(
+            ids.tolist(), users.tolist(), signatures
+        ):
+            self._put(recipe_id, user_id, signature)
+
+    def replay(self):
+        try:
+            with open(self.journal_path(self.generation), "rb") as f:
+                f.seek(self.offset)
+                data = f.read()
+        except FileNotFoundError:
+            # compacted meanwhile, the next sync loads the new snapshot
+            return
+        # a record still being written is left for the next replay
+        count = len(data) // RECORD.itemsize
+        records = np.frombuffer(data, dtype=RECORD, count=count)
+        for recipe_id, user_id, signature in zip(
+            records["id"].tolist(), records["user"].tolist(), records["signature"]
+        ):
+            self._remove(recipe_id)
+            if user_id >= 0:
+                self._put(recipe_id, user_id, signature)
+        self.offset += count * RECORD.itemsize
+
+    def grow(self, size):
+        capacity = len(self.ids)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity, 1024)
+        extra = capacity - len(self.ids)
+        self.free.extend(range(capacity - 1, len(self.ids) - 1, -1))
+        self.ids = np.concatenate([self.ids, np.full(extra, -1, dtype=np.int64)])
+        self.users = np.concatenate([self.users, np.zeros(extra, dtype=np.int64)])
+        self.signatures = np.concatenate(
+            [self.signatures, np.zeros((extra, NUM_PERM), dtype=np.uint32)]
+        )
+
+    def _put(self, recipe_id, user_id, signature):
+        if not self.free:
+            self.grow(len(self.ids) + 1)
+        row = self.free.pop()
+        self.rows[recipe_id] = row
+        self.ids[row], self.users[row], self.signatures[row] = (
+            recipe_id,
+            user_id,
+            signature,
+        )
+        if (signature == EMPTY).all():
+            return
+        for band, key in enumerate(band_keys(signature)[0].tolist()):
+            self.buckets.setdefault((user_id, band, key), set()).add(recipe_id)
+
+    def _remove(self, recipe_id):
+        row = self.rows.pop(recipe_id, None)
+        if row is None:
+            return
+        user_id = int(self.users[row])
+        for band, key in enumerate(band_keys(self.signatures[row])[0].tolist()):
+            bucket = self.buckets.get((user_id, band, key))
+            if bucket is not None:
+                bucket.discard(recipe_id)
+                if not bucket:
+                    del self.buckets[(user_id, band, key)]
+        self.ids[row] = -1
+        self.free.append(row)
+
+    def build(self):
+        """Write a snapshot of every recipe, the caller holds the file lock."""
+        Recipe = apps.get_model("recipe", "Recipe")
+        ids, users, signatures = [], [], []
+        rows = Recipe.objects.values_list("id", "user_id", "name", "ingredient", "step")
+        for recipe_id, user_id, *texts in rows.iterator(chunk_size=2000):
+            ids.append(recipe_id)
+            users.append(user_id)
+            signatures.append(minhash(shingles(*texts)))
+        self.write_snapshot(
+            np.array(ids, dtype=np.int64),
+            np.array(users, dtype=np.int64),
+            np.array(signatures, dtype=np.uint32).reshape(-1, NUM_PERM),
+        )
+
+    def write_snapshot(self, ids, users, signatures):
+        # time based, so a rebuilt directory never reuses an old journal
+        generation = time.time_ns()
+        self.journal_path(generation).touch()
+        temporary = self.directory / f"snapshot.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            np.savez(
+                f, ids=ids, users=users, signatures=signatures, generation=generation
+            )
+        os.replace(temporary, self.snapshot_path)
+        for journal in self.directory.glob("journal-*.bin"):
+            if journal != self.journal_path(generation):
+                journal.unlink()
+        return generation
+
+    def rebuild(self):
+        with self._lock:
+            with self.file_lock():
+                self.build()
+            self.sync()
+
+    def update(self, recipe_ids):
+        """Re-index recipes from the database, dropping the deleted ones.
+
+        Does nothing until the index was first built: the build reads the
+        database anyway.
+        """
+        if not self.snapshot_path.exists():
+            return
+        Recipe = apps.get_model("recipe", "Recipe")
+        found = {
+            recipe_id: (user_id, minhash(shingles(*texts)))
+            for recipe_id, user_id, *texts in Recipe.objects.filter(
+                id__in=recipe_ids
+            ).values_list("id", "user_id", "name", "ingredient", "step")
+        }
+        records = np.zeros(len(recipe_ids), dtype=RECORD)
+        records["id"] = recipe_ids
+        records["user"] = -1
+        for i, recipe_id in enumerate(recipe_ids):
+            if recipe_id in found:
+                records["user"][i], records["signature"][i] = found[recipe_id]
+
+        with self._lock, self.file_lock():
+            self.sync()
+            if self.generation is None:
+                return
+            with open(self.journal_path(self.generation), "ab") as f:
+                f.write(records.tobytes())
+            self.replay()
+            if self.offset > max(COMPACT_AFTER, len(self.rows)) * RECORD.itemsize:
+                self.compact()
+
+    def compact(self):
+        """Fold the journal into a new snapshot, with both locks held."""
+        used = self.ids >= 0
+        self.write_snapshot(self.ids[used], self.users[used], self.signatures[used])
+        # same content as in memory, but take the new generation from disk
+        self.sync()
+
+    def similar(self, recipe_id, user_id, signature, limit=10, min_similarity=0.0):
+        """The user's recipes closest to ``signature``, best first.
+
+        Returns ``[(recipe_id, similarity), ...]``, ``recipe_id`` itself
+        excluded; similarity is the estimated Jaccard index of the shingles.
+        Empty until the index is built.
+        """
+        self.refresh()
+        return self.nearest(recipe_id, user_id, signature, limit, min_similarity)
+
+    def nearest(self, recipe_id, user_id, signature, limit, min_similarity):
+        if (signature == EMPTY).all():
+            return []
+        with self._lock:
+            candidates = set()
+            for band, key in enumerate(band_keys(signature)[0].tolist()):
+                candidates.update(self.buckets.get((user_id, band, key), ()))
+            candidates.discard(recipe_id)
+            if not candidates:
+                return []
+            ids = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            rows = [self.rows[candidate] for candidate in candidates]
+            scores = (self.signatures[rows] == signature).mean(axis=1)
+
+        ranked = np.lexsort((ids, -scores))[:limit]
+        return [
+            (int(ids[i]), float(scores[i]))
+            for i in ranked
+            if scores[i] >= min_similarity
+        ]
+
+
+similarity_index = SimilarityIndex()
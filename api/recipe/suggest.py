@@ -0,0 +1,235 @@
+import heapq
+import re
+import threading
+import time
+from collections import Counter
+from itertools import groupby
+from operator import itemgetter
+
+from django.apps import apps
+from django.db import transaction
+
+from .cache import bump_version, get_cache, get_version
+
+PANTRY_SCOPE = "pantry"
+# journal entries kept, and an index further behind is built again
+JOURNAL_TIMEOUT = 24 * 3600
+JOURNAL_REPLAY_LIMIT = 1000
+# seconds a missing entry may be a write in progress before it counts as evicted
+JOURNAL_GAP_TIMEOUT = 5
+
+# non-zero bytes of a bitset, located by the C regex engine instead of a loop
+_NON_ZERO = re.compile(rb"[^\x00]")
+_BYTE_BITS = [
+    tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)
+]
+
+
+def iter_bits(bitset):
+    """Yield the positions of the set bits of a non-negative int."""
+    data = bitset.to_bytes((bitset.bit_length() + 7) // 8, "little")
+    for match in _NON_ZERO.finditer(data):
+        base = match.start() * 8
+        for bit in _BYTE_BITS[data[match.start()]]:
+            yield base + bit
+
+
+class PantryIndex:
+    """Inverted index from ingredient name to the set of recipes using it.
+
+    Sets are Python ints used as bitsets over dense recipe positions (their
+    order in the index, not their ids), so intersecting a pantry item with a
+    user's recipes is a single ``&`` of as many bits as there are recipes,
+    and ranking only ever touches recipes that share at least one ingredient
+    with the pantry. Names come from the ``RecipeIngredient`` links, already
+    parsed when the recipes were saved.
+
+    The index lives in process memory and follows the writes of every
+    process through a journal in the shared cache: each committed write
+    appends the ids of the recipes it touched (``record``), and before
+    answering, an index re-reads the links of the recipes journaled since
+    it last looked and swaps them in. It is only built from scratch on
+    first use, or when the journal can't tell what changed (the ``pantry``
+    cache version changed, entries were evicted, or it fell more than
+    ``JOURNAL_REPLAY_LIMIT`` entries behind).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # one refresh at a time, the others wait and find it done
+        self._refresh_lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.epoch = None  # pantry cache version the journal belongs to
+            self.head = 0  # journal entries applied
+            self.gap = None  # (missing entry, since), see catch_up()
+            self.postings = {}  # ingredient name -> position bitset
+            self.owners = {}  # user id -> position bitset
+            self.recipes = []  # position -> (recipe id, user id, names) or None
+            self.positions = {}  # recipe id -> position
+            self.holes = 0
+
+    def build(self, rows):
+        """Replace the index with ``(recipe id, user id, names)`` rows."""
+        postings, owners, recipes, positions = {}, {}, [], {}
+        for recipe_id, user_id, names in rows:
+            bit = 1 << len(recipes)
+            for name in names:
+                postings[name] = postings.get(name, 0) | bit
+            owners[user_id] = owners.get(user_id, 0) | bit
+            positions[recipe_id] = len(recipes)
+            recipes.append((recipe_id, user_id, tuple(names)))
+        with self._lock:
+            self.postings, self.owners = postings, owners
+            self.recipes, self.positions, self.holes = recipes, positions, 0
+
+    def apply(self, rows, recipe_ids):
+        """Re-index ``recipe_ids`` as the ``(recipe id, user id, names)`` rows.
+
+        Recipes without a row were deleted (or have no ingredients left).
+        """
+        with self._lock:
+            for recipe_id in recipe_ids:
+                self._remove(recipe_id)
+            for recipe_id, user_id, names in rows:
+                self._add(recipe_id, user_id, names)
+            if self.holes <= max(1024, len(self.recipes) // 2):
+                return
+            # mostly holes: bitsets as long as ever for fewer recipes
+            live = [recipe for recipe in self.recipes if recipe is not None]
+        self.build(live)
+
+    def _add(self, recipe_id, user_id, names):
+        position = len(self.recipes)
+        bit = 1 << position
+        for name in names:
+            self.postings[name] = self.postings.get(name, 0) | bit
+        self.owners[user_id] = self.owners.get(user_id, 0) | bit
+        self.positions[recipe_id] = position
+        self.recipes.append((recipe_id, user_id, tuple(names)))
+
+    def _remove(self, recipe_id):
+        position = self.positions.pop(recipe_id, None)
+        if position is None:
+            return
+        _, user_id, names = self.recipes[position]
+        mask = ~(1 << position)
+        for name in names:
+            self.postings[name] &= mask
+            if not self.postings[name]:
+                del self.postings[name]
+        self.owners[user_id] &= mask
+        self.recipes[position] = None
+        self.holes += 1
+
+    def record(self, recipe_ids):
+        """Journal a write to ``recipe_ids`` once the transaction commits."""
+        recipe_ids = list(recipe_ids)
+        transaction.on_commit(lambda: self._append(recipe_ids))
+
+    def _append(self, recipe_ids):
+        cache = get_cache()
+        epoch = get_version(PANTRY_SCOPE)
+        head = f"pantry:{epoch}:head"
+        cache.add(head, 0, timeout=None)
+        try:
+            number = cache.incr(head)
+        except ValueError:
+            # the head was evicted: nobody can tell what changed anymore
+            bump_version(PANTRY_SCOPE)
+            return
+        cache.set(f"pantry:{epoch}:{number}", recipe_ids, timeout=JOURNAL_TIMEOUT)
+
+    def refresh(self):
+        """Catch up with the journal, or build the index if it can't."""
+        epoch = get_version(PANTRY_SCOPE)
+        head = get_cache().get(f"pantry:{epoch}:head", 0)
+        if (epoch, head) == (self.epoch, self.head):
+            return
+        with self._refresh_lock:
+            # read first: entries added meanwhile are applied next time
+            epoch = get_version(PANTRY_SCOPE)
+            head = get_cache().get(f"pantry:{epoch}:head", 0)
+            if epoch != self.epoch or not 0 <= head - self.head <= JOURNAL_REPLAY_LIMIT:
+                self.rebuild(epoch, head)
+            elif head != self.head:
+                self.catch_up(head)
+
+    def rebuild(self, epoch, head):
+        self.build(self.read(None))
+        self.epoch, self.head, self.gap = epoch, head, None
+
+    def catch_up(self, head):
+        numbers = range(self.head + 1, head + 1)
+        keys = [f"pantry:{self.epoch}:{number}" for number in numbers]
+        entries = get_cache().get_many(keys)
+        recipe_ids = set()
+        applied = self.head
+        for number, key in zip(numbers, keys):
+            if key not in entries:
+                break
+            recipe_ids.update(entries[key])
+            applied = number
+        if applied < head:
+            # a writer between incr() and set(), or an evicted entry
+            missing = applied + 1
+            if self.gap is None or self.gap[0] != missing:
+                self.gap = (missing, time.monotonic())
+            elif time.monotonic() - self.gap[1] > JOURNAL_GAP_TIMEOUT:
+                self.rebuild(self.epoch, head)
+                return
+        if recipe_ids:
+            self.apply(self.read(recipe_ids), recipe_ids)
+        self.head = applied
+
+    def read(self, recipe_ids):
+        """``(recipe id, user id, names)`` of ``recipe_ids`` (None: all), by id."""
+        RecipeIngredient = apps.get_model("recipe", "RecipeIngredient")
+        links = RecipeIngredient.objects.order_by("recipe_id", "position")
+        if recipe_ids is not None:
+            links = links.filter(recipe_id__in=list(recipe_ids))
+        rows = links.values_list("recipe_id", "recipe__user_id", "ingredient__name")
+        for (recipe_id, user_id), group in groupby(
+            rows.iterator(chunk_size=2000), key=itemgetter(0, 1)
+        ):
+            yield recipe_id, user_id, [name for _, _, name in group]
+
+    def suggest(self, user_id, pantry, limit=20, min_coverage=0.0):
+        """Rank a user's recipes by the share of their ingredients in ``pantry``.
+
+        Returns ``[(recipe_id, coverage, missing_names), ...]``, best first.
+        """
+        self.refresh()
+        with self._lock:
+            mask = self.owners.get(user_id, 0)
+            hits = Counter()
+            for name in set(pantry):
+                hits.update(iter_bits(self.postings.get(name, 0) & mask))
+
+            ranked = heapq.nlargest(
+                limit,
+                (
+                    (
+                        count / len(self.recipes[position][2]),
+                        count,
+                        -self.recipes[position][0],
+                        position,
+                    )
+                    for position, count in hits.items()
+                ),
+            )
+            pantry = set(pantry)
+            return [
+                (
+                    -neg_id,
+                    coverage,
+                    [name for name in self.recipes[position][2] if name not in pantry],
+                )
+                for coverage, _, neg_id, position in ranked
+                if coverage >= min_coverage
+            ]
+
+
+pantry_index = PantryIndex()
@@ -0,0 +1,50 @@
+"""Background tasks of the recipe app, run by ``manage.py run_worker``."""
+
+from jobs.queue import task
+
+from .models import Recipe, RecipeIngredient
+from .nutrition import nutrient_matrix, recompute_nutrition
+from .pricing import price_table, recipes_using, recompute_costs
+from .suggest import pantry_index
+
+
+def refresh_derived_data(recipe_ids):
+    # the new prices and nutrients were saved by a web process, reload both
+    # tables here; the version bumps reach the web processes through the
+    # shared cache (see prestart --require-shared-cache)
+    price_table.invalidate()
+    nutrient_matrix.invalidate()
+    recompute_costs(recipe_ids)
+    recompute_nutrition(recipe_ids)
+
+
+@task('recipe.refresh_ingredient_recipes')
+def refresh_ingredient_recipes(ingredient_id):
+    """Recompute cost and nutrition of the recipes using an ingredient."""
+    refresh_derived_data(list(recipes_using([ingredient_id])))
+
+
+@task('recipe.relink_recipes')
+def relink_recipes(recipe_ids):
+    """Rebuild the ingredient links of recipes, then their cost and nutrition."""
+    RecipeIngredient.sync(Recipe.objects.filter(id__in=recipe_ids).only('ingredient'))
+    # the pantry index reads the links
+    pantry_index.record(recipe_ids)
+    refresh_derived_data(recipe_ids)
+
+
+@task('recipe.index_similar_recipes')
+def index_similar_recipes(recipe_ids):
+    """Refresh the similarity signatures of saved or deleted recipes."""
+    # imports NumPy, keep it off the startup path
+    from .similar import similarity_index
+
+    similarity_index.update(recipe_ids)
+
+
+@task('recipe.build_similarity_index')
+def build_similarity_index():
+    """Build the similarity index files, unless they exist already."""
+    from .similar import similarity_index
+
+    similarity_index.ensure_built()
@@ -1,13 +1,70 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import random
+import statistics
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+import tracemalloc
+import zlib
+from unittest import mock, skipUnless
+
+from asgiref.sync import SyncToAsync, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import (
+    IntegrityError,
+    OperationalError,
+    connection,
+    connections,
+    transaction,
+)
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.loader import MigrationLoader
+from django.test import (
+    AsyncClient,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework import status
+from rest_framework.pagination import Cursor
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIRequestFactory, force_authenticate, APIClient
 
 
-from .models import Recipe
+from backend.startup import pending_migrations, wait_for_database
+
+from .admin import EstimatedCountPaginator
+from .benchmark import compare_results
+from .cache import user_scope
+from .loadtest import server_output, spawn_server, wait_for_server
+from .models import Ingredient, Recipe
+from .ingredients import parse_ingredients, parse_item
+from .suggest import PantryIndex, pantry_index
+from .throttling import (
+    CacheBucketStore,
+    LocalBucketStore,
+    TokenBucketThrottle,
+    get_store,
+)
+from .nutrition import nutrient_matrix, nutrient_totals, recompute_nutrition
+from .mealplan import MealPlanner, RecipeFeatures
+from .pricing import price_table, recompute_costs
+from .similar import SimilarityIndex, minhash, recipe_signature, similarity_index
 from .views import RecipeViewSet
-from .serializers import RecipeSerializer
+from .serializers import RecipeRowSerializer, RecipeSerializer
+from .renderers import FastJSONRenderer
+from .pagination import RecipeCursorPagination
+from .revisions import diff, next_revision, patch, rebuild
 
 User = get_user_model()
 
@@ -281,7 +338,28 @@ class RecipeModelTest(TestCase):
     def test_recipe_name_is_unique(self):
         with self.assertRaises(Exception):
             # attempt to create a recipe with the same name
-            Recipe.objects.create(name="炒饭", ingredient="米饭，鸡蛋，胡萝卜", step="...")
+            Recipe.objects.create(
+                name="炒饭", ingredient="米饭，鸡蛋，胡萝卜", step="...", user=self.test_user
+            )
+
+    def test_recipe_name_is_unique_per_user(self):
+        other_user = User.objects.create(username='other', password='other')
+        Recipe.objects.create(
+            name="炒饭", ingredient="米饭，鸡蛋，胡萝卜", step="...", user=other_user
+        )
+        self.assertEqual(Recipe.objects.filter(name="炒饭").count(), 2)
+
+    def test_serializer_checks_names_of_the_owner(self):
+        # no request in the context: no owner to compare with yet
+        serializer = RecipeSerializer(data={**self.recipe_data})
+        self.assertTrue(serializer.is_valid())
+        other = Recipe.objects.create(
+            name="蛋炒饭", ingredient="米饭，鸡蛋", step="...", user=self.test_user
+        )
+        serializer = RecipeSerializer(other, data={'name': "炒饭"}, partial=True)
+        self.assertFalse(serializer.is_valid())
+        serializer = RecipeSerializer(self.recipe, data={**self.recipe_data})
+        self.assertTrue(serializer.is_valid())
 
     def test_recipe_name_is_not_empty(self):
         with self.assertRaises(Exception):
@@ -320,3 +398,3056 @@ class RecipeModelTest(TestCase):
     def test_recipe_can_be_queried(self):
         queried_recipe = Recipe.objects.get(name=self.recipe.name)
         self.assertEqual(queried_recipe.name, self.recipe.name)
+
+
+class RecipePaginationTest(TestCase):
+    """Cursor pagination on the recipe list"""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.test_user = User.objects.create_user(username='test', password='test')
+        self.other_user = User.objects.create_user(username='other', password='other')
+        Recipe.objects.bulk_create(
+            Recipe(name=f"食谱{i}", ingredient="...", step="...", user=self.test_user)
+            for i in range(25)
+        )
+        Recipe.objects.create(
+            name="其他人的食谱", ingredient="...", step="...", user=self.other_user
+        )
+        self.client.login(username='test', password='test')
+
+    def test_list_is_unpaginated_by_default(self):
+        response = self.client.get(reverse('recipe-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 25)
+
+    def test_walk_all_pages_with_cursor(self):
+        names = []
+        url = reverse('recipe-list') + '?page_size=10'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 10)
+            names.extend(recipe['name'] for recipe in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(names, [f"食谱{i}" for i in range(25)])
+
+    def test_page_size_is_capped(self):
+        with self.settings(RECIPE_MAX_PAGE_SIZE=5):
+            response = self.client.get(reverse('recipe-list') + '?page_size=100')
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_invalid_page_size_falls_back_to_default(self):
+        with self.settings(RECIPE_PAGE_SIZE=7):
+            for value in ('0', '-3', 'ten'):
+                response = self.client.get(
+                    reverse('recipe-list') + f'?page_size={value}'
+                )
+                self.assertEqual(len(response.data['results']), 7)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('recipe-list') + '?cursor=garbage')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_deep_page_seeks_instead_of_offsetting(self):
+        first = self.client.get(reverse('recipe-list') + '?page_size=10')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(first.data['next'])
+        sql = [q['sql'] for q in ctx.captured_queries if 'recipe_recipe' in q['sql']]
+        self.assertEqual(len(sql), 1)
+        self.assertNotIn('OFFSET', sql[0])
+
+
+class RecipePaginationBenchmark(TestCase):
+    """Page latency must stay flat as the cursor moves deeper"""
+
+    ROWS = 5000
+    PAGE_SIZE = 50
+    REPEAT = 20
+
+    def setUp(self) -> None:
+        self.test_user = User.objects.create_user(username='test', password='test')
+        Recipe.objects.bulk_create(
+            (
+                Recipe(name=f"r{i}", ingredient="...", step="...", user=self.test_user)
+                for i in range(self.ROWS)
+            ),
+            batch_size=1000,
+        )
+        self.factory = APIRequestFactory()
+        self.view = RecipeViewSet.as_view({'get': 'list'})
+
+    def _page_latency(self, url):
+        timings = []
+        for _ in range(self.REPEAT):
+            # measure the database path, not the response cache
+            caches[settings.RECIPE_CACHE_ALIAS].clear()
+            request = self.factory.get(url)
+            force_authenticate(request, user=self.test_user)
+            start = time.perf_counter()
+            response = self.view(request)
+            response.render()
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings)
+
+    def _cursor_at(self, depth):
+        paginator = RecipeCursorPagination()
+        position = Recipe.objects.filter(user=self.test_user).order_by('id')[depth].id
+        paginator.base_url = '/recipes/'
+        return paginator.encode_cursor(
+            Cursor(offset=0, reverse=False, position=position)
+        )
+
+    def test_page_latency_is_flat(self):
+        url = f'/recipes/?page_size={self.PAGE_SIZE}'
+        first = self._page_latency(url)
+        deep = self._page_latency(self._cursor_at(self.ROWS - self.PAGE_SIZE - 1))
+        print(
+            f"\ncursor page latency: first {first * 1000:.2f}ms, "
+            f"depth {self.ROWS} {deep * 1000:.2f}ms"
+        )
+        # generous bound, the point is deep pages don't scale with depth
+        self.assertLess(deep, first * 3 + 0.005)
+
+
+class IngredientTest(TestCase):
+    """Normalized ingredient links and the ?ingredient= filter"""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.test_user = User.objects.create_user(username='test', password='test')
+        self.pizza = Recipe.objects.create(
+            name="Pizza",
+            ingredient="Flour, cheese, tomato sauce",
+            step="...",
+            user=self.test_user,
+        )
+        self.cake = Recipe.objects.create(
+            name="Cake",
+            ingredient="Flour, sugar, eggs",
+            step="...",
+            user=self.test_user,
+        )
+        Recipe.objects.create(
+            name="其他人的蛋糕",
+            ingredient="flour, sugar",
+            step="...",
+            user=User.objects.create_user(username='other', password='other'),
+        )
+        self.client.login(username='test', password='test')
+
+    def test_parse_ingredients(self):
+        self.assertEqual(
+            parse_ingredients("Flour,  cheese ,tomato  sauce, flour,"),
+            ["flour", "cheese", "tomato sauce"],
+        )
+        self.assertEqual(parse_ingredients("米饭，鸡蛋、火腿"), ["米饭", "鸡蛋", "火腿"])
+
+    def test_links_follow_ingredient_string(self):
+        self.assertEqual(
+            list(
+                self.pizza.ingredients.order_by(
+                    'recipe_ingredients__position'
+                ).values_list('name', flat=True)
+            ),
+            ["flour", "cheese", "tomato sauce"],
+        )
+        self.pizza.ingredient = "Flour, basil"
+        self.pizza.save()
+        self.assertEqual(
+            set(self.pizza.ingredients.values_list('name', flat=True)),
+            {"flour", "basil"},
+        )
+        # shared ingredients are stored once
+        self.assertEqual(Ingredient.objects.filter(name="flour").count(), 1)
+
+    def test_filter_by_ingredient(self):
+        response = self.client.get(reverse('recipe-list') + '?ingredient=FLOUR')
+        self.assertEqual([r['name'] for r in response.data], ["Pizza", "Cake"])
+
+        response = self.client.get(reverse('recipe-list') + '?ingredient=flour,eggs')
+        self.assertEqual([r['name'] for r in response.data], ["Cake"])
+
+        response = self.client.get(reverse('recipe-list') + '?ingredient=basil')
+        self.assertEqual(response.data, [])
+
+    def test_serializer_keeps_string_form(self):
+        response = self.client.get(
+            reverse('recipe-detail', kwargs={'pk': self.pizza.pk})
+        )
+        self.assertEqual(response.data['ingredient'], "Flour, cheese, tomato sauce")
+
+
+class IngredientMigrationTest(TransactionTestCase):
+    """0006 links recipes that existed before the Ingredient table"""
+
+    migrate_from = [('recipe', '0005_ingredient')]
+    migrate_to = [('recipe', '0006_link_recipe_ingredients')]
+
+    def test_existing_recipes_are_linked(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        apps = executor.loader.project_state(self.migrate_from).apps
+        OldUser = apps.get_model('auth', 'User')
+        OldRecipe = apps.get_model('recipe', 'Recipe')
+        user = OldUser.objects.create(username='old')
+        OldRecipe.objects.create(
+            name="Salad", ingredient="Lettuce, tomato", step="...", user=user
+        )
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.migrate_to)
+        apps = executor.loader.project_state(self.migrate_to).apps
+        RecipeIngredient = apps.get_model('recipe', 'RecipeIngredient')
+        self.assertEqual(
+            list(
+                RecipeIngredient.objects.order_by('position').values_list(
+                    'ingredient__name', flat=True
+                )
+            ),
+            ["lettuce", "tomato"],
+        )
+
+        # leave the schema at the latest state for the following tests
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+
+class QuantityMigrationTest(TransactionTestCase):
+    """0014 relinks recipes to ingredients named without quantities"""
+
+    migrate_from = [('recipe', '0013_ingredient_section')]
+    migrate_to = [('recipe', '0014_recipeingredient_quantity')]
+
+    def test_derived_values_follow_the_new_links(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        apps = executor.loader.project_state(self.migrate_from).apps
+        OldUser = apps.get_model('auth', 'User')
+        OldRecipe = apps.get_model('recipe', 'Recipe')
+        OldIngredient = apps.get_model('recipe', 'Ingredient')
+        OldRecipeIngredient = apps.get_model('recipe', 'RecipeIngredient')
+        user = OldUser.objects.create(username='old')
+        recipe = OldRecipe.objects.create(
+            name="Cake", ingredient="200g flour, sugar", step="...", user=user
+        )
+        OldIngredient.objects.create(
+            name="flour",
+            price=Decimal('1.50'),
+            calories=700,
+            protein=20,
+            fat=2,
+            carbs=150,
+        )
+        sugar = OldIngredient.objects.create(
+            name="sugar",
+            price=Decimal('0.50'),
+            calories=400,
+            protein=0,
+            fat=0,
+            carbs=100,
+        )
+        for position, ingredient in enumerate(
+            [OldIngredient.objects.create(name="200g flour"), sugar]
+        ):
+            OldRecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, position=position
+            )
+        OldIngredient.objects.create(name="rice")
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.migrate_to)
+        apps = executor.loader.project_state(self.migrate_to).apps
+        Recipe = apps.get_model('recipe', 'Recipe')
+        Ingredient = apps.get_model('recipe', 'Ingredient')
+        recipe = Recipe.objects.get(pk=recipe.pk)
+        self.assertEqual(recipe.cost, Decimal('2.00'))
+        self.assertEqual(
+            [recipe.calories, recipe.protein, recipe.fat, recipe.carbs],
+            [1100, 20, 2, 250],
+        )
+        # "200g flour" is no one's ingredient anymore, "rice" never had one
+        self.assertEqual(
+            sorted(Ingredient.objects.values_list('name', flat=True)),
+            ["flour", "rice", "sugar"],
+        )
+
+        # leave the schema at the latest state for the following tests
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+
+class SuggestTest(TestCase):
+    """Pantry matching on /recipes/suggest/"""
+
+    def setUp(self) -> None:
+        pantry_index.reset()
+        self.client = APIClient()
+        self.test_user = User.objects.create_user(username='test', password='test')
+        self.pizza = Recipe.objects.create(
+            name="Pizza",
+            ingredient="Flour, cheese, tomato sauce",
+            step="...",
+            user=self.test_user,
+        )
+        self.cake = Recipe.objects.create(
+            name="Cake",
+            ingredient="Flour, sugar, eggs",
+            step="...",
+            user=self.test_user,
+        )
+        Recipe.objects.create(
+            name="Salad", ingredient="Lettuce, tomato", step="...", user=self.test_user
+        )
+        Recipe.objects.create(
+            name="其他人的蛋糕",
+            ingredient="flour, sugar, eggs",
+            step="...",
+            user=User.objects.create_user(username='other', password='other'),
+        )
+        self.client.login(username='test', password='test')
+
+    def tearDown(self) -> None:
+        pantry_index.reset()
+
+    def suggest(self, query):
+        response = self.client.get(reverse('recipe-suggest') + query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_ranked_by_coverage(self):
+        data = self.suggest('?pantry=flour,sugar,eggs,cheese')
+        self.assertEqual([r['name'] for r in data], ["Cake", "Pizza"])
+        self.assertEqual(data[0]['coverage'], 1.0)
+        self.assertEqual(data[0]['missing'], [])
+        self.assertEqual(data[1]['missing'], ["tomato sauce"])
+        self.assertEqual(data[1]['id'], self.pizza.pk)
+
+    def test_min_coverage_and_limit(self):
+        data = self.suggest('?pantry=flour&pantry=sugar&min_coverage=0.5')
+        self.assertEqual([r['name'] for r in data], ["Cake"])
+        data = self.suggest('?pantry=flour&limit=1')
+        self.assertEqual(len(data), 1)
+
+    def test_pantry_is_required(self):
+        response = self.client.get(reverse('recipe-suggest'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_index_follows_saves_and_deletes(self):
+        # another process's index, built before the writes
+        index = PantryIndex()
+        self.assertEqual(len(index.suggest(self.test_user.pk, ["flour"])), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pizza.ingredient = "Rice, cheese"
+            self.pizza.save()
+            self.cake.delete()
+            Recipe.objects.create(
+                name="Bread", ingredient="flour, water", step="...", user=self.test_user
+            )
+        # the journaled recipes are read again, not every recipe
+        with mock.patch.object(index, 'rebuild', side_effect=AssertionError):
+            ranked = index.suggest(self.test_user.pk, ["flour", "rice"])
+        self.assertEqual([recipe_id for recipe_id, _, _ in ranked][0], self.pizza.pk)
+        data = self.suggest('?pantry=flour,rice')
+        self.assertEqual([r['name'] for r in data], ["Pizza", "Bread"])
+
+    def test_bitsets_use_dense_positions(self):
+        Recipe.objects.create(
+            id=10**6,
+            name="Bun",
+            ingredient="Flour, yeast",
+            step="...",
+            user=self.test_user,
+        )
+        data = self.suggest('?pantry=flour,yeast')
+        self.assertEqual(data[0]['id'], 10**6)
+        self.assertLess(pantry_index.owners[self.test_user.pk].bit_length(), 10)
+
+
+class SyntheticPantryIndex(PantryIndex):
+    """``PantryIndex`` over ``recipes`` generated recipes instead of the database"""
+
+    def __init__(self, recipes, vocabulary):
+        super().__init__()
+        self.count = recipes
+        self.vocabulary = vocabulary
+        self.edits = {}
+
+    def names(self, recipe_id):
+        rng = random.Random(recipe_id * 31 + self.edits.get(recipe_id, 0))
+        return rng.sample(self.vocabulary, 6)
+
+    def read(self, recipe_ids):
+        if recipe_ids is None:
+            recipe_ids = range(1, self.count + 1)
+        for recipe_id in sorted(recipe_ids):
+            if recipe_id <= self.count:
+                yield recipe_id, recipe_id % 10, self.names(recipe_id)
+
+
+class SuggestBenchmark(SimpleTestCase):
+    """Ranking 100k recipes should stay in the low milliseconds"""
+
+    RECIPES = 100_000
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.rng = random.Random(42)
+        cls.vocabulary = [f"ingredient {i}" for i in range(2000)]
+        cls.index = SyntheticPantryIndex(cls.RECIPES, cls.vocabulary)
+        start = time.perf_counter()
+        cls.index.refresh()
+        print(f"\nbuild of {cls.RECIPES} recipes: {time.perf_counter() - start:.2f}s")
+        cls.pantry = cls.rng.sample(cls.vocabulary, 30)
+
+    def test_suggest_latency(self):
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            ranked = self.index.suggest(1, self.pantry, limit=20)
+            timings.append(time.perf_counter() - start)
+        latency = statistics.median(timings)
+        print(f"suggest over {self.RECIPES} recipes: {latency * 1000:.2f}ms")
+        self.assertEqual(len(ranked), 20)
+        self.assertLess(latency, 0.05)
+
+    def test_suggest_after_a_write(self):
+        timings = []
+        for edit in range(1, 21):
+            # another process saves a recipe, then deletes one
+            changed = self.rng.randrange(1, self.RECIPES - 20)
+            self.index.edits[changed] = edit
+            self.index.count -= 1
+            self.index._append([changed, self.RECIPES - edit + 1])
+            start = time.perf_counter()
+            self.index.suggest(1, self.pantry, limit=20)
+            timings.append(time.perf_counter() - start)
+        latency = statistics.median(timings)
+        print(f"suggest right after a write: {latency * 1000:.2f}ms")
+        self.assertLess(latency, 0.05)
+        self.assertEqual(len(self.index.positions), self.RECIPES - 20)
+        self.assertEqual(
+            list(self.index.names(changed)),
+            [*self.index.recipes[self.index.positions[changed]][2]],
+        )
+
+
+class RecipeSearchTest(TestCase):
+    """?q= search on the recipe list"""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.test_user = User.objects.create_user(username='test', password='test')
+        Recipe.objects.create(
+            name="Tomato soup",
+            ingredient="Tomato, water, salt",
+            step="Boil the tomatoes.",
+            user=self.test_user,
+        )
+        Recipe.objects.create(
+            name="Salad",
+            ingredient="Lettuce, tomato, cucumber",
+            step="Mix everything.",
+            user=self.test_user,
+        )
+        Recipe.objects.create(
+            name="Cake",
+            ingredient="Flour, sugar, eggs",
+            step="Bake for 30 minutes.",
+            user=self.test_user,
+        )
+        Recipe.objects.create(
+            name="Other tomato",
+            ingredient="Tomato",
+            step="...",
+            user=User.objects.create_user(username='other', password='other'),
+        )
+        self.client.login(username='test', password='test')
+
+    def search(self, text, **params):
+        params['q'] = text
+        response = self.client.get(reverse('recipe-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [recipe['name'] for recipe in response.data]
+
+    def test_search_name_ingredient_and_step(self):
+        self.assertEqual(sorted(self.search("tomato")), ["Salad", "Tomato soup"])
+        self.assertEqual(self.search("bake"), ["Cake"])
+        self.assertEqual(self.search("nothing like this"), [])
+
+    def test_search_results_are_capped(self):
+        with self.settings(RECIPE_SEARCH_LIMIT=1):
+            self.assertEqual(len(self.search("tomato", page_size=10)), 1)
+
+    def test_search_combines_with_ingredient_filter(self):
+        self.assertEqual(self.search("tomato", ingredient="lettuce"), ["Salad"])
+
+    @skipUnless(connection.vendor == 'postgresql', "needs PostgreSQL")
+    def test_ranked_full_text_and_trigram_fallback(self):
+        # name matches weigh more than ingredient matches
+        self.assertEqual(self.search("tomato"), ["Tomato soup", "Salad"])
+        # typo tolerance
+        self.assertEqual(self.search("tomatto soup")[0], "Tomato soup")
+
+
+class RecipeBulkTest(TestCase):
+    """/recipes/bulk/ create, update and delete"""
+
+    def setUp(self) -> None:
+        # user pks repeat across tests, their rate limit buckets must not
+        get_store.cache_clear()
+        self.client = APIClient()
+        self.test_user = User.objects.create_user(username='test', password='test')
+        self.other_recipe = Recipe.objects.create(
+            name="其他人的菜谱",
+            ingredient="...",
+            step="...",
+            user=User.objects.create_user(username='other', password='other'),
+        )
+        self.client.login(username='test', password='test')
+
+    def test_bulk_create(self):
+        items = [
+            {'name': f"Soup {i}", 'ingredient': "Water, salt", 'step': "..."}
+            for i in range(5)
+        ]
+        with self.settings(RECIPE_BULK_CHUNK_SIZE=2):
+            response = self.client.post(reverse('recipe-bulk'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 5)
+        recipes = Recipe.objects.filter(user=self.test_user)
+        self.assertEqual(sorted(response.data['ids']), sorted(r.pk for r in recipes))
+        self.assertEqual(
+            set(recipes[0].ingredients.values_list('name', flat=True)),
+            {"water", "salt"},
+        )
+
+    def test_bulk_create_reports_errors_per_item(self):
+        items = [
+            {'name': "Soup", 'ingredient': "Water", 'step': "..."},
+            {'name': "", 'ingredient': "Water", 'step': "..."},
+            {'name': "Soup", 'ingredient': "Water", 'step': "..."},
+            {'name': "Tea", 'ingredient': "Water", 'step': "..."},
+            "not an object",
+            # names are only unique per user
+            {'name': self.other_recipe.name, 'ingredient': "Water", 'step': "..."},
+        ]
+        Recipe.objects.create(
+            name="Tea", ingredient="Water", step="...", user=self.test_user
+        )
+        response = self.client.post(reverse('recipe-bulk'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([e['index'] for e in response.data['errors']], [1, 2, 3, 4])
+        self.assertIn('name', response.data['errors'][0]['errors'])
+        self.assertIn('name', response.data['errors'][2]['errors'])
+
+    def test_bulk_create_all_invalid(self):
+        response = self.client.post(
+            reverse('recipe-bulk'), [{'name': "Soup"}], format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(
+            reverse('recipe-bulk'), {'name': "x"}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_name_checks_do_not_grow_with_items(self):
+        def queries(method, items):
+            with CaptureQueriesContext(connection) as ctx:
+                getattr(self.client, method)(
+                    reverse('recipe-bulk'), items, format='json'
+                )
+            return len(ctx.captured_queries)
+
+        counts = [
+            queries(
+                'post',
+                [
+                    {'name': f"{prefix} {i}", 'ingredient': "Water", 'step': "..."}
+                    for i in range(size)
+                ],
+            )
+            # within one INSERT on SQLite, which splits them at ~90 rows
+            for prefix, size in (("Soup", 10), ("Tea", 50))
+        ]
+        self.assertEqual(counts[0], counts[1])
+
+        recipes = Recipe.objects.filter(user=self.test_user).order_by('id')
+        counts = [
+            queries(
+                'patch',
+                [{'id': recipe.pk, 'name': f"New {recipe.name}"} for recipe in part],
+            )
+            for part in (recipes[:10], recipes[10:60])
+        ]
+        self.assertEqual(counts[0], counts[1])
+
+    def test_bulk_update_to_a_taken_name(self):
+        soup = Recipe.objects.create(
+            name="Soup", ingredient="Water", step="...", user=self.test_user
+        )
+        tea = Recipe.objects.create(
+            name="Tea", ingredient="Water", step="...", user=self.test_user
+        )
+        items = [
+            {'id': soup.pk, 'name': "Tea"},
+            {'id': tea.pk, 'name': "Tea", 'step': "Steep."},
+        ]
+        response = self.client.patch(reverse('recipe-bulk'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['ids'], [tea.pk])
+        self.assertEqual(response.data['errors'][0]['index'], 0)
+        self.assertIn('name', response.data['errors'][0]['errors'])
+
+    def test_bulk_create_reports_what_broke_a_constraint(self):
+        Recipe.objects.create(
+            name="Tea", ingredient="Water", step="...", user=self.test_user
+        )
+        items = [
+            {'name': "Soup", 'ingredient': "Water", 'step': "..."},
+            {'name': "Tea", 'ingredient': "Water", 'step': "..."},
+        ]
+        # as if "Tea" was saved by another request since the names were checked
+        with mock.patch(
+            'recipe.bulk.BulkWriter.free_names',
+            side_effect=lambda items, queryset: items,
+        ):
+            response = self.client.post(reverse('recipe-bulk'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'][0]['index'], 1)
+        self.assertIn('name', response.data['errors'][0]['errors'])
+
+        items = [{'name': "Coffee", 'ingredient': "Water", 'step': "..."}]
+        with mock.patch('recipe.signals.record_revisions', side_effect=IntegrityError):
+            response = self.client.post(reverse('recipe-bulk'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data['errors'][0]['errors'],
+            {'non_field_errors': ['Could not be saved, please try again.']},
+        )
+
+    def test_bulk_update_reports_duplicated_ids(self):
+        soup = Recipe.objects.create(
+            name="Soup", ingredient="Water", step="...", user=self.test_user
+        )
+        items = [
+            {'id': soup.pk, 'step': "Boil."},
+            {'id': soup.pk, 'step': "Simmer."},
+        ]
+        with self.settings(RECIPE_BULK_CHUNK_SIZE=1):
+            response = self.client.patch(reverse('recipe-bulk'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['ids'], [soup.pk])
+        self.assertEqual(
+            response.data['errors'],
+            [{'index': 1, 'errors': {'id': ['Duplicated in this request.']}}],
+        )
+        soup.refresh_from_db()
+        self.assertEqual(soup.step, "Boil.")
+
+    def test_bulk_create_ndjson(self):
+        body = (
+            '{"name": "Soup", "ingredient": "Water", "step": "..."}\n'
+            '{broken\n'
+            '\n'
+            '{"name": "Tea", "ingredient": "Water, tea", "step": "..."}\n'
+        )
+        response = self.client.post(
+            reverse('recipe-bulk'), body, content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['errors'][0]['index'], 1)
+
+    def test_bulk_update(self):
+        soup = Recipe.objects.create(
+            name="Soup", ingredient="Water", step="...", user=self.test_user
+        )
+        tea = Recipe.objects.create(
+            name="Tea", ingredient="Water", step="...", user=self.test_user
+        )
+        items = [
+            {'id': soup.pk, 'ingredient': "Water, salt"},
+            {'id': tea.pk, 'step': "Steep."},
+            {'id': self.other_recipe.pk, 'step': "Stolen."},
+        ]
+        response = self.client.patch(reverse('recipe-bulk'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(sorted(response.data['ids']), [soup.pk, tea.pk])
+        self.assertEqual(response.data['errors'][0]['index'], 2)
+        soup.refresh_from_db()
+        tea.refresh_from_db()
+        self.other_recipe.refresh_from_db()
+        self.assertEqual(soup.ingredient, "Water, salt")
+        self.assertEqual(
+            set(soup.ingredients.values_list('name', flat=True)), {"water", "salt"}
+        )
+        self.assertEqual(tea.step, "Steep.")
+        self.assertEqual(self.other_recipe.step, "...")
+
+        response = self.client.put(
+            reverse('recipe-bulk'), [{'id': soup.pk, 'name': "Soup"}], format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_delete(self):
+        soup = Recipe.objects.create(
+            name="Soup", ingredient="Water", step="...", user=self.test_user
+        )
+        response = self.client.delete(
+            reverse('recipe-bulk'), [soup.pk, self.other_recipe.pk], format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['deleted'], 1)
+        self.assertFalse(Recipe.objects.filter(pk=soup.pk).exists())
+        self.assertTrue(Recipe.objects.filter(pk=self.other_recipe.pk).exists())
+
+    def test_bulk_writer_enforces_required_fields(self):
+        recipe = Recipe(name="Soup", ingredient="", step="...", user=self.test_user)
+        with self.assertRaises(ValueError):
+            recipe.check_required_fields()
+
+        # blank in the database already, the serializer only sees the name
+        soup = Recipe.objects.create(
+            name="Soup", ingredient="Water", step="...", user=self.test_user
+        )
+        tea = Recipe.objects.create(
+            name="Tea", ingredient="Water", step="...", user=self.test_user
+        )
+        Recipe.objects.filter(pk=soup.pk).update(step="")
+        items = [{'id': soup.pk, 'name': "Soup 2"}, {'id': tea.pk, 'name': "Tea 2"}]
+        response = self.client.patch(reverse('recipe-bulk'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['ids'], [tea.pk])
+        self.assertEqual(response.data['errors'][0]['index'], 0)
+
+    def test_constraint_failure_only_fails_its_item(self):
+        from . import bulk
+
+        def set_costs(recipes):
+            # another request takes a name between validation and the write
+            if not Recipe.objects.filter(name="Soup 1").exists():
+                Recipe.objects.bulk_create(
+                    [
+                        Recipe(
+                            name="Soup 1", ingredient="-", step="-", user=self.test_user
+                        )
+                    ]
+                )
+            bulk_set_costs(recipes)
+
+        bulk_set_costs = bulk.set_costs
+        items = [
+            {'name': f"Soup {i}", 'ingredient': "Water, salt", 'step': "..."}
+            for i in range(3)
+        ]
+        with mock.patch.object(bulk, 'set_costs', set_costs):
+            response = self.client.post(reverse('recipe-bulk'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([e['index'] for e in response.data['errors']], [1])
+        self.assertEqual(
+            set(
+                Recipe.objects.filter(pk__in=response.data['ids']).values_list(
+                    'name', flat=True
+                )
+            ),
+            {"Soup 0", "Soup 2"},
+        )
+
+    def test_body_must_be_a_list(self):
+        for body in ("Soup", 1, {'name': "Soup"}):
+            response = self.client.post(reverse('recipe-bulk'), body, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data['detail'], 'Expected a list of items.')
+
+
+class RecipeCacheTest(TestCase):
+    """Per-user response cache and conditional GETs"""
+
+    def setUp(self) -> None:
+        get_store.cache_clear()
+        caches[settings.RECIPE_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.test_user = User.objects.create_user(username='test', password='test')
+        self.recipe = Recipe.objects.create(
+            name="Pizza", ingredient="Flour, cheese", step="...", user=self.test_user
+        )
+        self.client.login(username='test', password='test')
+
+    def recipe_queries(self, url, **headers):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, **headers)
+        queries = [q for q in ctx.captured_queries if 'recipe_recipe' in q['sql']]
+        return response, len(queries)
+
+    def test_list_and_detail_are_cached(self):
+        for url in (
+            reverse('recipe-list'),
+            reverse('recipe-detail', kwargs={'pk': self.recipe.pk}),
+        ):
+            first, queries = self.recipe_queries(url)
+            self.assertGreater(queries, 0)
+            second, queries = self.recipe_queries(url)
+            self.assertEqual(queries, 0)
+            self.assertEqual(first.data, second.data)
+            self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_not_modified(self):
+        url = reverse('recipe-list')
+        etag = self.client.get(url)['ETag']
+        response, queries = self.recipe_queries(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(queries, 0)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_writes_invalidate(self):
+        url = reverse('recipe-list')
+        etag = self.client.get(url)['ETag']
+
+        self.client.post(url, {'name': "Soup", 'ingredient': "Water", 'step': "..."})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+
+        self.client.post(
+            reverse('recipe-bulk'),
+            [{'name': "Tea", 'ingredient': "Water", 'step': "..."}],
+            format='json',
+        )
+        self.assertEqual(len(self.client.get(url).data), 3)
+
+        self.recipe.delete()
+        self.assertEqual(len(self.client.get(url).data), 2)
+
+    def test_cache_is_per_user(self):
+        url = reverse('recipe-list')
+        self.client.get(url)
+        User.objects.create_user(username='other', password='other')
+        self.client.login(username='other', password='other')
+        self.assertEqual(self.client.get(url).data, [])
+
+    def test_errors_are_not_cached(self):
+        url = reverse('recipe-detail', kwargs={'pk': self.recipe.pk + 100})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('ETag', response)
+
+
+class CatalogTest(TestCase):
+    """Public /catalog/ with shared caching and conditional GETs"""
+
+    def setUp(self) -> None:
+        get_store.cache_clear()
+        caches[settings.RECIPE_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.test_user = User.objects.create_user(username='test', password='test')
+        self.pizza = Recipe.objects.create(
+            name="Pizza",
+            ingredient="Flour, cheese",
+            step="...",
+            user=self.test_user,
+            is_public=True,
+        )
+        self.secret = Recipe.objects.create(
+            name="Secret sauce", ingredient="Tomato", step="...", user=self.test_user
+        )
+
+    def catalog_queries(self, url, **headers):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, **headers)
+        queries = [q for q in ctx.captured_queries if 'recipe_recipe' in q['sql']]
+        return response, len(queries)
+
+    def test_anonymous_list_and_detail(self):
+        response = self.client.get(reverse('catalog-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data['results'],
+            [
+                {
+                    'id': self.pizza.pk,
+                    'name': "Pizza",
+                    'ingredient': "Flour, cheese",
+                    'step': "...",
+                    'author': 'test',
+                }
+            ],
+        )
+        url = reverse('catalog-detail', kwargs={'pk': self.pizza.pk})
+        self.assertEqual(self.client.get(url).data['name'], "Pizza")
+        url = reverse('catalog-detail', kwargs={'pk': self.secret.pk})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.post(reverse('catalog-list'), {'name': "Soup"})
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    @override_settings(RECIPE_CATALOG_MAX_AGE=120)
+    def test_shared_cache_headers(self):
+        url = reverse('catalog-list')
+        first, queries = self.catalog_queries(url)
+        self.assertGreater(queries, 0)
+        self.assertIn('public', first['Cache-Control'])
+        self.assertIn('max-age=120', first['Cache-Control'])
+        self.assertNotIn('Cookie', first.get('Vary', ''))
+        self.assertIn('Last-Modified', first)
+
+        # the same cached payload for everyone, logged in or not
+        self.client.login(username='test', password='test')
+        second, queries = self.catalog_queries(url)
+        self.assertEqual(queries, 0)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(second.data, first.data)
+
+    def test_conditional_get(self):
+        url = reverse('catalog-list')
+        first = self.client.get(url)
+        response, queries = self.catalog_queries(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(queries, 0)
+        self.assertIn('public', response['Cache-Control'])
+        response, queries = self.catalog_queries(
+            url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(queries, 0)
+        # If-None-Match wins over If-Modified-Since
+        response = self.client.get(
+            url,
+            HTTP_IF_NONE_MATCH='W/"stale"',
+            HTTP_IF_MODIFIED_SINCE=first['Last-Modified'],
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_recipe_changes_invalidate(self):
+        url = reverse('catalog-list')
+        etag = self.client.get(url)['ETag']
+
+        # private recipes don't touch the catalog
+        self.secret.step = "Blend."
+        self.secret.save()
+        self.assertEqual(self.client.get(url)['ETag'], etag)
+
+        self.client.login(username='test', password='test')
+        response = self.client.post(
+            reverse('recipe-publish', kwargs={'pk': self.secret.pk})
+        )
+        self.assertEqual(response.data, {'is_public': True})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+
+        etag = response['ETag']
+        self.client.delete(reverse('recipe-publish', kwargs={'pk': self.pizza.pk}))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(
+            [r['name'] for r in response.data['results']], ["Secret sauce"]
+        )
+
+        self.client.post(
+            reverse('recipe-bulk'),
+            [{'name': "Tea", 'ingredient': "Water", 'step': "..."}],
+            format='json',
+        )
+        self.assertEqual(self.client.get(url)['ETag'], response['ETag'])
+        self.client.delete(reverse('recipe-detail', kwargs={'pk': self.secret.pk}))
+        self.assertEqual(self.client.get(url).data['results'], [])
+
+    def test_only_authors_publish(self):
+        User.objects.create_user(username='other', password='other')
+        self.client.login(username='other', password='other')
+        response = self.client.post(
+            reverse('recipe-publish', kwargs={'pk': self.secret.pk})
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.secret.refresh_from_db()
+        self.assertFalse(self.secret.is_public)
+
+    @override_settings(RECIPE_PAGE_SIZE=1)
+    def test_always_paged(self):
+        Recipe.objects.create(
+            name="Soup",
+            ingredient="Water",
+            step="...",
+            user=self.test_user,
+            is_public=True,
+        )
+        response = self.client.get(reverse('catalog-list'))
+        self.assertEqual([r['name'] for r in response.data['results']], ["Pizza"])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([r['name'] for r in response.data['results']], ["Soup"])
+
+
+class RecipeAsyncViewTest(TransactionTestCase):
+    """Async read variants served on the ASGI thread pool"""
+
+    # the views query from pool threads, which can't see a test transaction
+
+    def setUp(self) -> None:
+        caches[settings.RECIPE_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.test_user = User.objects.create_user(username='test', password='test')
+        self.recipe = Recipe.objects.create(
+            name="Pizza", ingredient="Flour, cheese", step="...", user=self.test_user
+        )
+
+    def test_async_views_match_sync_views(self):
+        self.client.login(username='test', password='test')
+        for async_name, sync_name, kwargs in (
+            ('recipe-async-list', 'recipe-list', {}),
+            ('recipe-async-detail', 'recipe-detail', {'pk': self.recipe.pk}),
+        ):
+            response = self.client.get(reverse(async_name, kwargs=kwargs))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                response.json(),
+                self.client.get(reverse(sync_name, kwargs=kwargs)).json(),
+            )
+
+    def test_async_views_require_auth(self):
+        response = self.client.get(reverse('recipe-async-list'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    async def test_queries_of_pool_threads_are_measured(self):
+        from django.core.handlers.asgi import ASGIHandler
+
+        from backend.metrics import registry
+
+        # the middleware stack stays on the event loop
+        chain = ASGIHandler()._middleware_chain
+        self.assertNotIsInstance(chain, SyncToAsync)
+        self.assertTrue(asyncio.iscoroutinefunction(chain))
+
+        registry.reset()
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.test_user)
+        response = await client.get(reverse('recipe-async-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        histogram = registry.histograms['db_queries_per_request'][
+            (('view', 'recipe-async-list'), ('action', ''), ('method', 'GET'))
+        ]
+        self.assertGreater(histogram.sum, 0)
+
+
+class HealthzTest(TestCase):
+    """/healthz database and pool report"""
+
+    def test_healthz(self):
+        response = self.client.get(reverse('healthz'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['status'], 'ok')
+        self.assertTrue(data['databases']['default']['reachable'])
+
+    @skipUnless(
+        connection.vendor == 'postgresql' and hasattr(connection, 'pool_stats'),
+        "needs the pooled PostgreSQL backend",
+    )
+    def test_pool_reuses_connections(self):
+        from backend.db.base import ConnectionPool
+
+        pool = ConnectionPool(
+            'test', size=1, timeout=0.1, conn_params=connection.get_connection_params()
+        )
+        first = pool.getconn()
+        self.assertEqual(pool.stats()['saturation'], 1.0)
+        with self.assertRaises(Exception):
+            pool.getconn()
+        pool.putconn(first)
+        self.assertIs(pool.getconn(health_check=True), first)
+        pool.putconn(first)
+        pool.closeall()
+        self.assertTrue(first.closed)
+
+
+class StartupTest(TestCase):
+    """prestart command and the /livez, /readyz probes"""
+
+    def setUp(self) -> None:
+        patcher = mock.patch('backend.views.migrations_applied', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def unapply(self, app_label, name):
+        from django.db.migrations.recorder import MigrationRecorder
+
+        MigrationRecorder(connection).record_unapplied(app_label, name)
+
+    def test_probes(self):
+        self.assertEqual(self.client.get(reverse('livez')).json(), {'status': 'ok'})
+        response = self.client.get(reverse('readyz'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with mock.patch.object(
+            connections['default'],
+            'ensure_connection',
+            side_effect=OperationalError("down"),
+        ):
+            response = self.client.get(reverse('readyz'))
+            self.assertEqual(response.status_code, 503)
+            # liveness doesn't depend on the database
+            self.assertEqual(self.client.get(reverse('livez')).status_code, 200)
+
+    def test_pending_migrations(self):
+        out = io.StringIO()
+        call_command('prestart', stdout=out)
+        self.assertIn("No unapplied migrations.", out.getvalue())
+
+        # the latest migration, unapplying an earlier one is inconsistent
+        app_label, name = MigrationLoader(connection).graph.leaf_nodes('recipe')[0]
+        self.unapply(app_label, name)
+        self.assertEqual(pending_migrations(), [f'recipe.{name}'])
+        response = self.client.get(reverse('readyz'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['pending_migrations'], [f'recipe.{name}'])
+        with self.assertRaisesMessage(CommandError, name):
+            call_command('prestart', stdout=io.StringIO())
+
+    def test_database_backoff(self):
+        sleeps = []
+        with mock.patch.object(
+            connections['default'],
+            'ensure_connection',
+            side_effect=[OperationalError("down")] * 3 + [None],
+        ):
+            self.assertEqual(wait_for_database(sleep=sleeps.append), 3)
+        self.assertEqual(sleeps, [0.1, 0.2, 0.4])
+
+        sleeps = []
+        with mock.patch.object(
+            connections['default'],
+            'ensure_connection',
+            side_effect=OperationalError("down"),
+        ):
+            with self.assertRaises(OperationalError):
+                wait_for_database(timeout=2, max_delay=0.5, sleep=sleeps.append)
+        self.assertEqual(sleeps[:4], [0.1, 0.2, 0.4, 0.5])
+
+    def test_shared_cache_required(self):
+        import runpy
+        from types import SimpleNamespace
+
+        from django.core.exceptions import ImproperlyConfigured
+
+        config = runpy.run_path(str(settings.BASE_DIR / 'gunicorn.conf.py'))
+        locmem = {
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+        }
+        # shared by the processes of a host
+        shared = {
+            'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': tempfile.gettempdir(),
+            }
+        }
+        with self.settings(CACHES=locmem):
+            config['on_starting'](SimpleNamespace(cfg=SimpleNamespace(workers=1)))
+            with self.assertRaisesMessage(ImproperlyConfigured, 'default'):
+                config['on_starting'](SimpleNamespace(cfg=SimpleNamespace(workers=4)))
+        with self.settings(CACHES=shared):
+            config['on_starting'](SimpleNamespace(cfg=SimpleNamespace(workers=4)))
+
+    def test_worker_requires_shared_cache(self):
+        # the job worker's invalidations must reach the web processes
+        with self.assertRaisesMessage(CommandError, 'local to each process'):
+            call_command('prestart', '--require-shared-cache', stdout=io.StringIO())
+        call_command('prestart', stdout=io.StringIO())
+
+
+class StartupBenchmark(SimpleTestCase):
+    """Time to set up Django and load the URLconf in a fresh process"""
+
+    SCRIPT = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import django\n"
+        "django.setup()\n"
+        "import backend.urls\n"
+        "print(time.perf_counter() - start, 'numpy' in sys.modules)\n"
+    )
+
+    def test_startup_time(self):
+        import os
+        import subprocess
+        import sys
+
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'backend.settings'}
+        timings = []
+        for _ in range(3):
+            output = subprocess.run(
+                [sys.executable, '-c', self.SCRIPT],
+                cwd=settings.BASE_DIR,
+                env=env,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.split()
+            timings.append(float(output[0]))
+            # NumPy is only imported by the code paths that need it
+            self.assertEqual(output[1], 'False')
+        latency = statistics.median(timings)
+        print(f"\nstartup (django.setup + URLconf): {latency * 1000:.0f}ms")
+        self.assertLess(latency, 5)
+
+
+class TokenAuthenticationTest(TestCase):
+    """Signed bearer tokens from /auth/token/"""
+
+    def setUp(self) -> None:
+        caches[settings.RECIPE_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.test_user = User.objects.create_user(username='test', password='test')
+        self.recipe = Recipe.objects.create(
+            name="Pizza", ingredient="Flour, cheese", step="...", user=self.test_user
+        )
+
+    def obtain(self, username='test', password='test'):
+        return self.client.post(
+            reverse('token-obtain'), {'username': username, 'password': password}
+        )
+
+    def test_obtain_and_use_access_token(self):
+        response = self.obtain()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('recipe-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['name'] for r in response.data], ["Pizza"])
+        # no session or user lookups
+        self.assertFalse(
+            [q for q in ctx.captured_queries if 'auth_user' in q['sql']]
+            + [q for q in ctx.captured_queries if 'django_session' in q['sql']]
+        )
+
+        response = self.client.post(
+            reverse('recipe-list'),
+            {'name': "Soup", 'ingredient': "Water", 'step': "..."},
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['user'], self.test_user.pk)
+
+    def test_wrong_password(self):
+        self.assertEqual(
+            self.obtain(password='wrong').status_code, status.HTTP_401_UNAUTHORIZED
+        )
+
+    def test_invalid_and_expired_tokens_are_rejected(self):
+        access = self.obtain().data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}x")
+        response = self.client.get(reverse('recipe-list'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        with self.settings(AUTH_TOKEN_ACCESS_TTL=-1):
+            response = self.client.get(reverse('recipe-list'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_refresh(self):
+        refresh = self.obtain().data['refresh']
+        response = self.client.post(reverse('token-refresh'), {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(
+            self.client.get(reverse('recipe-list')).status_code, status.HTTP_200_OK
+        )
+
+    def test_password_change_revokes_refresh_token(self):
+        refresh = self.obtain().data['refresh']
+        self.test_user.set_password('new')
+        self.test_user.save()
+        response = self.client.post(reverse('token-refresh'), {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_access_token_is_not_a_refresh_token(self):
+        access = self.obtain().data['access']
+        response = self.client.post(reverse('token-refresh'), {'refresh': access})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class RecipeFastReadTest(TestCase):
+    """The values() read path must match RecipeSerializer"""
+
+    def setUp(self) -> None:
+        self.test_user = User.objects.create_user(username='test', password='test')
+        self.recipes = [
+            Recipe.objects.create(
+                name="Pizza",
+                ingredient="Flour, cheese",
+                step="...",
+                user=self.test_user,
+            ),
+            Recipe.objects.create(
+                name="粥", ingredient="米，水\u2028", step="煮", user=self.test_user
+            ),
+        ]
+
+    def test_columns_match_serializer_fields(self):
+        self.assertEqual(
+            list(RecipeRowSerializer.columns), RecipeSerializer.Meta.fields
+        )
+
+    def test_same_output(self):
+        queryset = Recipe.objects.order_by('id')
+        rows = RecipeRowSerializer().many(RecipeRowSerializer().values(queryset))
+        expected = RecipeSerializer(queryset, many=True).data
+        self.assertEqual(rows, expected)
+        self.assertEqual(
+            FastJSONRenderer().render(rows), JSONRenderer().render(expected)
+        )
+
+    def test_indented_output_falls_back(self):
+        rows = [{'name': "Pizza"}]
+        self.assertEqual(
+            FastJSONRenderer().render(rows, 'application/json; indent=2'),
+            JSONRenderer().render(rows, 'application/json; indent=2'),
+        )
+
+
+class RecipeFastReadBenchmark(TestCase):
+    """Rows/sec of the values() path against RecipeSerializer"""
+
+    ROWS = 3000
+    REPEAT = 5
+
+    def setUp(self) -> None:
+        self.test_user = User.objects.create_user(username='test', password='test')
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    name=f"r{i}",
+                    ingredient="Flour, eggs, sugar, butter",
+                    step="Mix and bake. " * 10,
+                    user=self.test_user,
+                )
+                for i in range(self.ROWS)
+            ),
+            batch_size=1000,
+        )
+        self.queryset = Recipe.objects.filter(user=self.test_user).order_by('id')
+
+    def _rows_per_second(self, serialize):
+        timings = []
+        for _ in range(self.REPEAT):
+            start = time.perf_counter()
+            serialize()
+            timings.append(time.perf_counter() - start)
+        return self.ROWS / statistics.median(timings)
+
+    def test_rows_per_second(self):
+        serializer = RecipeRowSerializer()
+        model_path = self._rows_per_second(
+            lambda: JSONRenderer().render(
+                RecipeSerializer(self.queryset.all(), many=True).data
+            )
+        )
+        values_path = self._rows_per_second(
+            lambda: FastJSONRenderer().render(
+                serializer.many(serializer.values(self.queryset.all()))
+            )
+        )
+        print(
+            f"\nrecipe list serialization: RecipeSerializer {model_path:,.0f} rows/s, "
+            f"values path {values_path:,.0f} rows/s"
+        )
+        self.assertGreater(values_path, model_path)
+
+
+class RecipeExportTest(TestCase):
+    """Streaming NDJSON/CSV export"""
+
+    def setUp(self) -> None:
+        get_store.cache_clear()
+        self.client = APIClient()
+        self.test_user = User.objects.create_user(username='test', password='test')
+        self.client.force_login(self.test_user)
+        Recipe.objects.create(
+            name="Pizza", ingredient="Flour, cheese", step="...", user=self.test_user
+        )
+        Recipe.objects.create(
+            name="粥", ingredient="米，水", step='Boil, "slowly"', user=self.test_user
+        )
+        Recipe.objects.create(
+            name="Other",
+            ingredient="...",
+            step="...",
+            user=User.objects.create_user(username='other', password='other'),
+        )
+
+    def expected(self):
+        return RecipeSerializer(
+            Recipe.objects.filter(user=self.test_user).order_by('id'), many=True
+        ).data
+
+    def test_ndjson(self):
+        response = self.client.get(reverse('recipe-export'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], self.expected())
+
+    def test_csv(self):
+        response = self.client.get(reverse('recipe-export') + '?fmt=csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('recipes.csv', response['Content-Disposition'])
+        content = b''.join(response.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        expected = [
+            {key: str(value) for key, value in row.items()} for row in self.expected()
+        ]
+        self.assertEqual(rows, expected)
+
+    def test_filters_and_bad_format(self):
+        response = self.client.get(reverse('recipe-export') + '?ingredient=cheese')
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(line)['name'] for line in lines], ["Pizza"])
+
+        response = self.client.get(reverse('recipe-export') + '?fmt=xml')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_asgi_export_is_spooled(self):
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.test_user)
+        response = await client.get(reverse('recipe-export'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), 2)
+
+    def test_memory_does_not_grow_with_rows(self):
+        def peak_memory():
+            tracemalloc.start()
+            response = self.client.get(reverse('recipe-export'))
+            for _ in response.streaming_content:
+                pass
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return peak
+
+        def grow(count):
+            start = Recipe.objects.count()
+            Recipe.objects.bulk_create(
+                Recipe(name=f"r{i}", ingredient="...", step="...", user=self.test_user)
+                for i in range(start, start + count)
+            )
+
+        with self.settings(RECIPE_EXPORT_CHUNK_SIZE=100):
+            grow(1000)
+            small = peak_memory()
+            grow(9000)
+            large = peak_memory()
+        self.assertLess(large, small * 2)
+
+
+@override_settings(JOBS_EAGER=True)
+class RecipeCostTest(TestCase):
+    """Ingredient prices and precomputed recipe costs"""
+
+    def setUp(self) -> None:
+        get_store.cache_clear()
+        caches[settings.RECIPE_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.test_user = User.objects.create_user(username='test', password='test')
+        self.client.force_login(self.test_user)
+        self.load("name,price\nflour,1.50\neggs,3.00\nsugar,1\ncheese,8\n")
+
+    def load(self, content, suffix='.csv'):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / f'ingredients{suffix}'
+            path.write_text(content, encoding='utf-8')
+            out = io.StringIO()
+            call_command('load_ingredient_data', str(path), stdout=out)
+        return out.getvalue()
+
+    def create(self, name, ingredient):
+        return Recipe.objects.create(
+            name=name, ingredient=ingredient, step="...", user=self.test_user
+        )
+
+    def test_cost_on_save(self):
+        cake = self.create("Cake", "Flour, eggs, sugar")
+        self.assertEqual(cake.cost, Decimal('5.50'))
+        unknown = self.create("Soup", "Water, salt")
+        self.assertIsNone(unknown.cost)
+
+        cake.ingredient = "Flour, eggs, sugar, cheese"
+        cake.save()
+        cake.refresh_from_db()
+        self.assertEqual(cake.cost, Decimal('13.50'))
+
+    def test_bulk_writes_compute_cost(self):
+        response = self.client.post(
+            reverse('recipe-bulk'),
+            [{'name': "Cake", 'ingredient': "Flour, eggs", 'step': "..."}],
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Recipe.objects.get(name="Cake").cost, Decimal('4.50'))
+
+        pk = response.data['ids'][0]
+        self.client.patch(
+            reverse('recipe-bulk'), [{'id': pk, 'ingredient': "Cheese"}], format='json'
+        )
+        self.assertEqual(Recipe.objects.get(pk=pk).cost, Decimal('8.00'))
+
+    def test_price_changes_recompute_affected_costs(self):
+        cake = self.create("Cake", "Flour, eggs")
+        pizza = self.create("Pizza", "Flour, cheese")
+        omelette = self.create("Omelette", "Eggs")
+
+        output = self.load("name,price,unknown column\nflour,2.00,x\neggs,3.00,y\n")
+        self.assertIn("1 updated, 2 recipe costs changed", output)
+        costs = dict(Recipe.objects.values_list('name', 'cost'))
+        self.assertEqual(costs["Cake"], Decimal('5.00'))
+        self.assertEqual(costs["Pizza"], Decimal('10.00'))
+        self.assertEqual(costs["Omelette"], Decimal('3.00'))
+
+        cheese = Ingredient.objects.get(name='cheese')
+        cheese.price = None
+        cheese.save()
+        pizza.refresh_from_db()
+        self.assertIsNone(pizza.cost)
+
+        Ingredient.objects.get(name='eggs').delete()
+        cake.refresh_from_db()
+        omelette.refresh_from_db()
+        self.assertIsNone(cake.cost)
+        self.assertIsNone(omelette.cost)
+
+    def test_load_json_and_errors(self):
+        self.load('[{"name": "Butter", "price": "4.5"}]', suffix='.json')
+        self.assertEqual(Ingredient.objects.get(name='butter').price, Decimal('4.50'))
+        with self.assertRaises(CommandError):
+            self.load("name,price\nmilk,cheap\n")
+        with self.assertRaises(CommandError):
+            self.load("name,price\n,1\n")
+
+    def test_shipped_dataset_loads(self):
+        call_command('load_ingredient_data', stdout=io.StringIO())
+        self.assertTrue(Ingredient.objects.filter(name='面粉').exclude(price=None))
+
+    def test_ordering_and_max_cost(self):
+        for i in range(6):
+            self.create(f"r{i}", ", ".join(["flour", "eggs", "cheese"][: i % 3 + 1]))
+        self.create("Unknown", "Water")
+
+        response = self.client.get(reverse('recipe-list') + '?ordering=cost')
+        costs = [
+            Recipe.objects.get(name=recipe['name']).cost for recipe in response.data
+        ]
+        self.assertEqual(len(costs), 6)
+        self.assertEqual(costs, sorted(costs))
+
+        names, url = [], reverse('recipe-list') + '?ordering=-cost&page_size=4'
+        while url:
+            response = self.client.get(url)
+            names += [recipe['name'] for recipe in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(names, ["r2", "r5", "r1", "r4", "r0", "r3"])
+
+        response = self.client.get(reverse('recipe-list') + '?max_cost=4.5')
+        self.assertEqual(
+            sorted(recipe['name'] for recipe in response.data),
+            ["r0", "r1", "r3", "r4"],
+        )
+        response = self.client.get(reverse('recipe-list') + '?max_cost=cheap')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cost_endpoint(self):
+        recipe = self.create("Pizza", "Flour, cheese, basil")
+        response = self.client.get(reverse('recipe-cost', args=[recipe.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['cost'])
+        self.assertEqual(response.data['missing'], ['basil'])
+        self.assertEqual(
+            response.data['ingredients'][0], {'name': 'flour', 'price': '1.50'}
+        )
+
+
+@override_settings(JOBS_EAGER=True)
+class NutritionTest(TestCase):
+    """Nutrient totals materialized on Recipe"""
+
+    def setUp(self) -> None:
+        get_store.cache_clear()
+        caches[settings.RECIPE_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.test_user = User.objects.create_user(username='test', password='test')
+        self.client.force_login(self.test_user)
+        for name, values in (
+            ('flour', (364, 10, 1, 76)),
+            ('eggs', (155, 13, 11, 1)),
+            ('chicken', (165, 31, 3.6, 0)),
+        ):
+            Ingredient.objects.create(
+                name=name, **dict(zip(('calories', 'protein', 'fat', 'carbs'), values))
+            )
+
+    def create(self, name, ingredient):
+        return Recipe.objects.create(
+            name=name, ingredient=ingredient, step="...", user=self.test_user
+        )
+
+    def test_totals_on_save_and_bulk(self):
+        recipe = self.create("Pasta", "Flour, eggs")
+        self.assertEqual(
+            (recipe.calories, recipe.protein, recipe.fat, recipe.carbs),
+            (519, 23, 12, 77),
+        )
+        self.assertIsNone(self.create("Soup", "Chicken, water").protein)
+
+        response = self.client.post(
+            reverse('recipe-bulk'),
+            [{'name': "Roast", 'ingredient': "Chicken", 'step': "..."}],
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Recipe.objects.get(name="Roast").protein, 31)
+
+    def test_ingredient_changes_update_totals(self):
+        soup = self.create("Soup", "Chicken, water")
+        water = Ingredient.objects.get(name='water')
+        water.calories, water.protein, water.fat, water.carbs = 0, 0, 0, 0
+        water.save()
+        soup.refresh_from_db()
+        self.assertEqual(soup.protein, 31)
+
+        output = io.StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'nutrients.csv'
+            path.write_text("name,protein\nchicken,27\n", encoding='utf-8')
+            call_command('load_ingredient_data', str(path), stdout=output)
+        self.assertIn("1 recipe nutrition totals changed", output.getvalue())
+        soup.refresh_from_db()
+        self.assertEqual(soup.protein, 27)
+
+        Ingredient.objects.get(name='chicken').delete()
+        soup.refresh_from_db()
+        self.assertIsNone(soup.protein)
+
+    def test_recompute_all_matches_incremental(self):
+        for i in range(30):
+            names = ["flour", "eggs", "chicken", "water"][i % 4 :][:2]
+            self.create(f"r{i}", ", ".join(names))
+        expected = list(
+            Recipe.objects.order_by('id').values_list('calories', 'protein')
+        )
+        Recipe.objects.update(calories=None, protein=None, fat=None, carbs=None)
+        known = [row for row in expected if row[0] is not None]
+        self.assertEqual(recompute_nutrition(batch_size=7), len(known))
+        self.assertEqual(
+            list(Recipe.objects.order_by('id').values_list('calories', 'protein')),
+            expected,
+        )
+
+    def test_given_ids_are_read_in_batches(self):
+        recipe = self.create("Pasta", "Flour, eggs")
+        Recipe.objects.update(calories=None)
+        ids = [recipe.pk, *range(10**6, 10**6 + 2500)]
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(recompute_nutrition(ids), 1)
+        reads = [
+            query
+            for query in ctx.captured_queries
+            if query['sql'].startswith('SELECT "recipe_recipe"')
+        ]
+        self.assertEqual(len(reads), 3)
+
+    def test_filters_and_ordering(self):
+        self.create("Pasta", "Flour, eggs")
+        self.create("Roast", "Chicken")
+        self.create("Omelette", "Eggs")
+        self.create("Soup", "Chicken, water")
+
+        response = self.client.get(reverse('recipe-list') + '?min_protein=20')
+        self.assertEqual(
+            sorted(recipe['name'] for recipe in response.data), ["Pasta", "Roast"]
+        )
+        response = self.client.get(
+            reverse('recipe-list') + '?ordering=-protein&page_size=2'
+        )
+        self.assertEqual(
+            [recipe['name'] for recipe in response.data['results']],
+            ["Roast", "Pasta"],
+        )
+        response = self.client.get(response.data['next'])
+        self.assertEqual(
+            [recipe['name'] for recipe in response.data['results']], ["Omelette"]
+        )
+        response = self.client.get(reverse('recipe-list') + '?max_calories=nan')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_a_reload_replaces_the_whole_table(self):
+        table = nutrient_matrix.get()
+        self.assertEqual(
+            table.matrix[table.rows_by_name['chicken']].tolist(), [165, 31, 3.6, 0]
+        )
+        Ingredient.objects.create(name='rice', calories=130)
+        nutrient_matrix.invalidate()
+        current = nutrient_matrix.get()
+        self.assertIsNot(current, table)
+        self.assertIn('rice', current.rows_by_name)
+        self.assertEqual(current.unknown, len(current.matrix) - 1)
+        # a table in use by a request stays as it was loaded
+        self.assertNotIn('rice', table.rows_by_name)
+        self.assertEqual(table.unknown, len(table.matrix) - 1)
+        self.assertFalse(table.matrix.flags.writeable)
+
+    def test_nutrition_endpoint(self):
+        recipe = self.create("Soup", "Chicken, water")
+        response = self.client.get(reverse('recipe-nutrition', args=[recipe.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['total']['protein'])
+        self.assertEqual(response.data['ingredients'][0]['protein'], 31)
+        self.assertIsNone(response.data['ingredients'][1]['protein'])
+
+
+class IngredientJobsTest(TestCase):
+    """Ingredient data changes are handed to the background worker"""
+
+    def test_price_change_is_queued(self):
+        from jobs.models import Job
+        from jobs.worker import Worker
+
+        user = User.objects.create_user(username='test', password='test')
+        ingredient = Ingredient.objects.create(name='flour', price=1)
+        recipe = Recipe.objects.create(
+            name="Bread", ingredient="Flour", step="...", user=user
+        )
+        self.assertEqual(recipe.cost, 1)
+
+        for price in (2, 3):
+            ingredient.price = price
+            ingredient.save()
+        # the response doesn't wait, and both changes share one queued job
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.cost, 1)
+        queued = Job.objects.filter(
+            task='recipe.refresh_ingredient_recipes', status=Job.QUEUED
+        )
+        self.assertEqual(queued.count(), 1)
+
+        Worker().work('test')
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.cost, 3)
+
+        ingredient.delete()
+        Worker().work('test')
+        recipe.refresh_from_db()
+        self.assertIsNone(recipe.cost)
+        self.assertTrue(recipe.ingredients.filter(name='flour').exists())
+
+
+class NutritionBenchmark(SimpleTestCase):
+    """Vectorized totals against a Python loop per recipe"""
+
+    RECIPES = 100_000
+    INGREDIENTS = 2000
+
+    def test_vectorized_totals(self):
+        import numpy as np
+
+        rng = np.random.default_rng(42)
+        matrix = rng.random((self.INGREDIENTS, 4)) * 100
+        groups = np.repeat(np.arange(self.RECIPES), 6)
+        rows = rng.integers(0, self.INGREDIENTS, len(groups))
+
+        start = time.perf_counter()
+        totals = nutrient_totals(matrix, groups, rows, self.RECIPES)
+        vectorized = time.perf_counter() - start
+
+        start = time.perf_counter()
+        values = matrix.tolist()
+        looped = [[0.0] * 4 for _ in range(self.RECIPES)]
+        for group, row in zip(groups.tolist(), rows.tolist()):
+            total = looped[group]
+            for column, value in enumerate(values[row]):
+                total[column] += value
+        loop = time.perf_counter() - start
+
+        print(
+            f"\nnutrition totals of {self.RECIPES} recipes: "
+            f"numpy {vectorized * 1000:.1f}ms, python loop {loop * 1000:.1f}ms"
+        )
+        self.assertTrue(np.allclose(totals, looped))
+        self.assertLess(vectorized, loop)
+
+
+def synthetic_features(recipes, ingredients=500, seed=0):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    links = np.column_stack(
+        [
+            np.repeat(np.arange(recipes), 5),
+            rng.integers(0, ingredients, recipes * 5),
+        ]
+    )
+    pantry = np.zeros(ingredients, dtype=bool)
+    pantry[:20] = True
+    return RecipeFeatures(
+        ids=np.arange(1, recipes + 1),
+        cost=rng.uniform(5, 40, recipes),
+        nutrients=rng.uniform([200, 5, 2, 10], [900, 50, 40, 120], (recipes, 4)),
+        links=links,
+        ingredient_ids=np.arange(1, ingredients + 1),
+        pantry=pantry,
+        prices=rng.uniform(0.5, 5, ingredients),
+    )
+
+
+class MealPlanTest(TestCase):
+    """/mealplan/ optimizer"""
+
+    def setUp(self) -> None:
+        caches[settings.RECIPE_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.test_user = User.objects.create_user(username='test', password='test')
+        self.client.force_login(self.test_user)
+        for name, price, protein in (
+            ('rice', 2, 4),
+            ('eggs', 3, 13),
+            ('chicken', 12, 31),
+            ('tofu', 3, 8),
+            ('beef', 25, 26),
+        ):
+            Ingredient.objects.create(
+                name=name, price=price, calories=200, protein=protein, fat=5, carbs=20
+            )
+        for name, ingredient in (
+            ("Fried rice", "Rice, eggs"),
+            ("Chicken rice", "Rice, chicken"),
+            ("Mapo tofu", "Tofu, beef"),
+            ("Omelette", "Eggs"),
+            ("Steak", "Beef"),
+            ("Tofu rice", "Rice, tofu"),
+            ("Unknown", "Rice, water"),
+        ):
+            Recipe.objects.create(
+                name=name, ingredient=ingredient, step="...", user=self.test_user
+            )
+
+    def test_cheapest_plan_without_targets(self):
+        response = self.client.get(reverse('mealplan') + '?meals=3')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        names = {meal['name'] for meal in response.data['meals']}
+        self.assertEqual(names, {"Fried rice", "Omelette", "Tofu rice"})
+        self.assertEqual(response.data['total']['cost'], '13.00')
+        self.assertEqual(
+            sorted(response.data['shopping_list']), ['eggs', 'rice', 'tofu']
+        )
+
+    def test_targets_and_pantry(self):
+        cheapest = self.client.get(reverse('mealplan') + '?meals=2')
+        response = self.client.get(reverse('mealplan') + '?meals=2&protein=70')
+        self.assertLess(
+            abs(response.data['total']['protein'] - 70),
+            abs(cheapest.data['total']['protein'] - 70),
+        )
+
+        response = self.client.get(reverse('mealplan') + '?meals=1&pantry=beef')
+        self.assertEqual(response.data['meals'][0]['name'], "Steak")
+        self.assertEqual(response.data['shopping_list'], [])
+
+    def test_plan_is_cached_until_recipes_change(self):
+        url = reverse('mealplan') + '?meals=2'
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        self.assertFalse([q for q in ctx.captured_queries if 'recipe_' in q['sql']])
+
+        Recipe.objects.create(
+            name="Plain rice", ingredient="Rice", step="...", user=self.test_user
+        )
+        response = self.client.get(url)
+        self.assertIn("Plain rice", [meal['name'] for meal in response.data['meals']])
+
+    def test_recipes_are_loaded_once_per_version(self):
+        self.client.get(reverse('mealplan') + '?meals=2')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('mealplan') + '?meals=1&pantry=beef')
+        self.assertEqual(response.data['meals'][0]['name'], "Steak")
+        # only the planned recipes are read, not the whole book and its links
+        self.assertFalse(
+            [q for q in ctx.captured_queries if 'recipe_recipeingredient' in q['sql']]
+        )
+
+        Ingredient.objects.filter(name='beef').update(price=1)
+        price_table.invalidate()
+        recompute_costs(Recipe.objects.values_list('id', flat=True))
+        response = self.client.get(reverse('mealplan') + '?meals=1&pantry=rice')
+        self.assertEqual(response.data['meals'][0]['name'], "Steak")
+
+    def test_errors(self):
+        response = self.client.get(reverse('mealplan') + '?meals=10')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('mealplan') + '?protein=-1')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.logout()
+        response = self.client.get(reverse('mealplan'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_matches_brute_force_on_small_books(self):
+        from itertools import combinations
+
+        import numpy as np
+
+        features = synthetic_features(14, ingredients=30, seed=3)
+        targets = {'calories': 1800, 'protein': 90}
+        planner = MealPlanner(features, targets, time_budget=1)
+        plan = planner.solve(3)
+        best = min(
+            planner.plan_score(list(combo)) for combo in combinations(range(14), 3)
+        )
+        self.assertAlmostEqual(planner.plan_score(list(plan)), best)
+        self.assertEqual(len(np.unique(plan)), 3)
+
+
+class MealPlanBenchmark(SimpleTestCase):
+    """Solve time as the recipe book grows"""
+
+    SIZES = (100, 1000, 10_000, 100_000)
+    TIME_BUDGET = 0.2
+
+    def test_solve_time(self):
+        timings = []
+        for size in self.SIZES:
+            features = synthetic_features(size)
+            planner = MealPlanner(
+                features,
+                {'calories': 14000, 'protein': 400},
+                time_budget=self.TIME_BUDGET,
+            )
+            start = time.perf_counter()
+            plan = planner.solve(14)
+            timings.append(time.perf_counter() - start)
+            self.assertEqual(len(set(plan.tolist())), 14)
+        print(
+            "\nmeal plan solve time: "
+            + ", ".join(
+                f"{size} recipes {timing * 1000:.0f}ms"
+                for size, timing in zip(self.SIZES, timings)
+            )
+        )
+        # the search is bounded by the budget, only the shortlist pass scales
+        self.assertLess(max(timings), self.TIME_BUDGET + 0.5)
+
+
+class ShoppingListTest(TestCase):
+    """/shopping-list/ merging, unit normalization, pantry and sections"""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.test_user = User.objects.create_user(username='test', password='test')
+        self.client.force_login(self.test_user)
+        for name, section in (
+            ('flour', 'grains'),
+            ('eggs', 'dairy'),
+            ('milk', 'dairy'),
+            ('salt', 'condiments'),
+        ):
+            Ingredient.objects.create(name=name, section=section)
+        self.bread = Recipe.objects.create(
+            name="Bread",
+            ingredient="1kg flour, salt, 250ml milk",
+            step="...",
+            user=self.test_user,
+        )
+        self.cake = Recipe.objects.create(
+            name="Cake",
+            ingredient="200g Flour, 3 eggs, 1 cup milk, vanilla",
+            step="...",
+            user=self.test_user,
+        )
+        self.url = reverse('shopping-list')
+
+    def test_parse_item(self):
+        for item, parsed in [
+            ("200g flour", ('flour', 200, 'g')),
+            ("1 1/2 cups milk", ('milk', 360, 'ml')),
+            ("1/2 tsp salt", ('salt', 2.5, 'ml')),
+            ("2 garlic", ('garlic', 2, None)),
+            ("eggs 3", ('eggs', 3, None)),
+            ("面粉200克", ('面粉', 200, 'g')),
+            ("2个鸡蛋", ('鸡蛋', 2, None)),
+            ("猪肉 1斤", ('猪肉', 500, 'g')),
+            ("Tomato sauce", ('tomato sauce', None, None)),
+            ("7up", ('7up', None, None)),
+            ("vitamin B12", ('vitamin b12', None, None)),
+        ]:
+            self.assertEqual(parse_item(item), parsed)
+
+    def test_links_store_what_the_list_is_built_from(self):
+        # parsed once when saved, the same names price and index the recipe
+        links = self.cake.recipe_ingredients.order_by('position').values_list(
+            'ingredient__name', 'quantity', 'unit'
+        )
+        self.assertEqual(
+            list(links),
+            [
+                ('flour', 200, 'g'),
+                ('eggs', 3, ''),
+                ('milk', 240, 'ml'),
+                ('vanilla', None, ''),
+            ],
+        )
+        self.assertEqual(
+            parse_ingredients(self.cake.ingredient),
+            ['flour', 'eggs', 'milk', 'vanilla'],
+        )
+
+    def test_merged_by_section(self):
+        response = self.client.get(
+            self.url, {'recipes': f'{self.bread.pk},{self.cake.pk}'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        sections = {
+            section['section']: section['items']
+            for section in response.data['sections']
+        }
+        self.assertEqual(list(sections), ['dairy', 'grains', 'condiments', 'other'])
+        self.assertEqual(
+            sections['grains'],
+            [
+                {
+                    'name': 'flour',
+                    'quantities': [{'amount': 1200.0, 'unit': 'g'}],
+                    'recipes': [self.bread.pk, self.cake.pk],
+                }
+            ],
+        )
+        self.assertEqual(
+            sections['dairy'][0]['quantities'], [{'amount': 490.0, 'unit': 'ml'}]
+        )
+        self.assertEqual(sections['dairy'][1]['name'], 'eggs')
+        self.assertEqual(sections['condiments'][0]['quantities'], [])
+        self.assertEqual(sections['other'][0]['name'], 'vanilla')
+        self.assertEqual(response.data['missing'], [])
+
+    def test_pantry_is_subtracted(self):
+        response = self.client.get(
+            self.url,
+            {
+                'recipes': [self.bread.pk, self.cake.pk],
+                'pantry': 'flour 500g, salt, milk 1l, 1 egg',
+            },
+        )
+        items = {
+            item['name']: item['quantities']
+            for section in response.data['sections']
+            for item in section['items']
+        }
+        self.assertEqual(items['flour'], [{'amount': 700.0, 'unit': 'g'}])
+        self.assertNotIn('salt', items)
+        self.assertNotIn('milk', items)
+        # "egg" is not "eggs"
+        self.assertEqual(items['eggs'], [{'amount': 3.0, 'unit': None}])
+
+    def test_queries_do_not_grow_with_recipes(self):
+        ids = [self.bread.pk, self.cake.pk]
+        for index in range(48):
+            ids.append(
+                Recipe.objects.create(
+                    name=f"Soup {index}",
+                    ingredient=f"{index} carrots, 1l water",
+                    step="...",
+                    user=self.test_user,
+                ).pk
+            )
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, {'recipes': ids})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # the user's recipes, then their ingredient rows
+        queries = [q for q in ctx.captured_queries if 'recipe_recipe' in q['sql']]
+        self.assertEqual(len(queries), 2)
+        items = response.data['sections'][-1]['items']
+        self.assertEqual(items[-1]['quantities'], [{'amount': 48000.0, 'unit': 'ml'}])
+
+    def test_other_users_recipes_are_missing(self):
+        other = Recipe.objects.create(
+            name="Secret",
+            ingredient="100g saffron",
+            step="...",
+            user=User.objects.create_user(username='other', password='other'),
+        )
+        response = self.client.get(self.url, {'recipes': f'{self.bread.pk},{other.pk}'})
+        self.assertEqual(response.data['missing'], [other.pk])
+        names = [
+            item['name']
+            for section in response.data['sections']
+            for item in section['items']
+        ]
+        self.assertNotIn('saffron', names)
+
+    def test_invalid_query(self):
+        self.assertEqual(
+            self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST
+        )
+        response = self.client.get(self.url, {'recipes': 'one,two'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.logout()
+        response = self.client.get(self.url, {'recipes': self.bread.pk})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class RecipeAdminTest(TestCase):
+    """RecipeAdmin changelist cost and chunked bulk actions"""
+
+    def setUp(self) -> None:
+        get_store.cache_clear()
+        caches[settings.RECIPE_CACHE_ALIAS].clear()
+        self.admin = User.objects.create_superuser(username='admin', password='admin')
+        self.client.force_login(self.admin)
+        self.owners = [
+            User.objects.create_user(username=f'owner{i}', password='x')
+            for i in range(5)
+        ]
+        self.recipes = [
+            Recipe.objects.create(
+                name=f"Dish {i}",
+                ingredient="Flour, eggs",
+                step="...",
+                user=self.owners[i % 5],
+            )
+            for i in range(12)
+        ]
+        self.url = reverse('admin:recipe_recipe_changelist')
+
+    def act(self, action, recipes, **extra):
+        return self.client.post(
+            self.url,
+            {
+                'action': action,
+                '_selected_action': [recipe.pk for recipe in recipes],
+                **extra,
+            },
+        )
+
+    def test_changelist_joins_the_owner(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, "owner4")
+        # the logged in admin only, owners come with the recipes
+        user_queries = [
+            q
+            for q in ctx.captured_queries
+            if q['sql'].startswith('SELECT') and 'FROM "auth_user"' in q['sql']
+        ]
+        self.assertEqual(len(user_queries), 1)
+        self.assertNotIn('delete_selected', response.content.decode())
+
+    def test_estimated_count(self):
+        queryset = Recipe.objects.order_by('-id')
+        self.assertEqual(EstimatedCountPaginator(queryset, 10).count, 12)
+        with mock.patch.object(connection, 'vendor', 'postgresql'), mock.patch(
+            'recipe.admin.estimated_count', return_value=5_000_000
+        ):
+            self.assertEqual(EstimatedCountPaginator(queryset, 10).count, 5_000_000)
+        with mock.patch.object(connection, 'vendor', 'postgresql'), mock.patch(
+            'recipe.admin.estimated_count', return_value=10
+        ):
+            self.assertEqual(EstimatedCountPaginator(queryset, 10).count, 12)
+
+    def test_search(self):
+        response = self.client.get(self.url, {'q': str(self.recipes[3].pk)})
+        self.assertIn(self.recipes[3], response.context['cl'].result_list)
+        response = self.client.get(self.url, {'q': "Dish 1"})
+        self.assertEqual(
+            {recipe.name for recipe in response.context['cl'].result_list},
+            {"Dish 1", "Dish 10", "Dish 11"},
+        )
+
+    def test_reassign_owner_in_chunks(self):
+        new_owner = User.objects.create_user(username='new', password='x')
+        with self.settings(RECIPE_BULK_CHUNK_SIZE=5):
+            response = self.act('reassign_owner', self.recipes[:11], new_owner='new')
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(Recipe.objects.filter(user=new_owner).count(), 11)
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipes[11].pk).user_id, self.owners[1].pk
+        )
+
+        self.act('reassign_owner', self.recipes[11:], new_owner='nobody')
+        self.assertEqual(Recipe.objects.filter(user=new_owner).count(), 11)
+
+    def test_reassign_owner_keeps_names_the_owner_has(self):
+        new_owner = User.objects.create_user(username='new', password='x')
+        Recipe.objects.create(
+            name="Dish 2", ingredient="Rice", step="...", user=new_owner
+        )
+        twin = Recipe.objects.create(
+            name="Dish 3", ingredient="Rice", step="...", user=self.owners[0]
+        )
+        with mock.patch('recipe.admin.pin_to_primary') as pin:
+            response = self.act(
+                'reassign_owner', [*self.recipes[:4], twin], new_owner='new'
+            )
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(
+            sorted(
+                Recipe.objects.filter(user=new_owner).values_list('name', flat=True)
+            ),
+            ["Dish 0", "Dish 1", "Dish 2", "Dish 3"],
+        )
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipes[2].pk).user_id, self.owners[2].pk
+        )
+        self.assertEqual(
+            Recipe.objects.filter(name="Dish 3").exclude(user=new_owner).count(), 1
+        )
+        messages = [str(message) for message in response.wsgi_request._messages]
+        self.assertIn("已将 3 个食谱转给 new。", messages)
+        self.assertIn("new 已有同名食谱，未转移 2 个：Dish 2、Dish 3。", messages)
+        # the previous owners read their lists from the primary too
+        self.assertTrue(
+            {user_scope(self.owners[0].pk), user_scope(self.owners[1].pk)}
+            <= {call.args[0] for call in pin.call_args_list}
+        )
+
+    def test_export_csv(self):
+        response = self.act('export_csv', self.recipes[:2])
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(
+            csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode()))
+        )
+        self.assertEqual([row['name'] for row in rows], ["Dish 0", "Dish 1"])
+        self.assertEqual(rows[1]['username'], 'owner1')
+
+    def test_delete_in_chunks_needs_confirmation(self):
+        self.act('delete_in_chunks', self.recipes[:7])
+        self.assertEqual(Recipe.objects.count(), 12)
+        with self.settings(RECIPE_BULK_CHUNK_SIZE=3):
+            self.act('delete_in_chunks', self.recipes[:7], confirm='on')
+        self.assertEqual(Recipe.objects.count(), 5)
+
+
+class SimilarTest(TestCase):
+    """/recipes/{id}/similar/ and its on-disk index"""
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = self.settings(
+            RECIPE_SIMILARITY_DIR=directory.name, JOBS_EAGER=True
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        similarity_index.reset()
+        self.addCleanup(similarity_index.reset)
+
+        self.client = APIClient()
+        self.test_user = User.objects.create_user(username='test', password='test')
+        self.pasta = Recipe.objects.create(
+            name="Tomato pasta",
+            ingredient="pasta, tomato, garlic, olive oil, basil",
+            step="Boil the pasta, cook the tomato with garlic and olive oil.",
+            user=self.test_user,
+        )
+        self.garlic_pasta = Recipe.objects.create(
+            name="Garlic pasta",
+            ingredient="pasta, garlic, olive oil, parsley",
+            step="Boil the pasta, fry the garlic in olive oil.",
+            user=self.test_user,
+        )
+        Recipe.objects.create(
+            name="Chocolate cake",
+            ingredient="flour, sugar, eggs, chocolate",
+            step="Mix, pour into a tin and bake.",
+            user=self.test_user,
+        )
+        self.other = Recipe.objects.create(
+            name="Tomato pasta, other",
+            ingredient="pasta, tomato, garlic, olive oil, basil",
+            step="Boil the pasta, cook the tomato with garlic and olive oil.",
+            user=User.objects.create_user(username='other', password='other'),
+        )
+        self.client.login(username='test', password='test')
+
+    def similar(self, recipe, query=''):
+        response = self.client.get(reverse('recipe-similar', args=[recipe.pk]) + query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_ranked_by_similarity(self):
+        data = self.similar(self.pasta)
+        self.assertEqual([r['name'] for r in data], ["Garlic pasta"])
+        self.assertEqual(data[0]['id'], self.garlic_pasta.pk)
+        self.assertGreater(data[0]['similarity'], 0.2)
+        self.assertEqual(self.similar(self.pasta, '?min_similarity=0.9'), [])
+
+    def test_other_users_recipes(self):
+        response = self.client.get(reverse('recipe-similar', args=[self.other.pk]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(
+            reverse('recipe-similar', args=[self.pasta.pk]) + '?limit=0'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_index_follows_saves_and_deletes(self):
+        self.similar(self.pasta)  # build the index
+        copy = Recipe.objects.create(
+            name="Tomato pasta again",
+            ingredient=self.pasta.ingredient,
+            step=self.pasta.step,
+            user=self.test_user,
+        )
+        self.garlic_pasta.delete()
+        data = self.similar(self.pasta)
+        self.assertEqual([r['id'] for r in data], [copy.pk])
+        self.assertGreater(data[0]['similarity'], 0.8)
+
+        # another process reads the same snapshot and journal
+        index = SimilarityIndex()
+        ranked = index.similar(
+            self.pasta.pk, self.test_user.pk, recipe_signature(self.pasta)
+        )
+        self.assertEqual([recipe_id for recipe_id, _ in ranked], [copy.pk])
+
+    def test_journal_is_compacted(self):
+        self.similar(self.pasta)
+        generation = similarity_index.generation
+        # compacted once the journal outgrows the 4 recipes indexed
+        with mock.patch('recipe.similar.COMPACT_AFTER', 2):
+            for times in range(5):
+                self.garlic_pasta.step = f"Boil {times} times."
+                self.garlic_pasta.save()
+        self.assertNotEqual(similarity_index.generation, generation)
+        journals = list(similarity_index.directory.glob('journal-*.bin'))
+        self.assertEqual(
+            journals, [similarity_index.journal_path(similarity_index.generation)]
+        )
+        index = SimilarityIndex()
+        index.refresh()
+        self.assertEqual(set(index.rows), set(similarity_index.rows))
+
+    def test_built_by_the_worker(self):
+        from jobs.models import Job
+
+        from .tasks import build_similarity_index
+
+        url = reverse('recipe-similar', args=[self.pasta.pk])
+        with self.settings(JOBS_EAGER=False):
+            for _ in range(2):
+                response = self.client.get(url)
+                self.assertEqual(
+                    response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE
+                )
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(
+            Job.objects.filter(task=build_similarity_index.name).count(), 1
+        )
+        self.assertFalse(similarity_index.snapshot_path.exists())
+
+        build_similarity_index()
+        self.assertEqual(self.similar(self.pasta)[0]['id'], self.garlic_pasta.pk)
+
+    def test_build_command(self):
+        out = io.StringIO()
+        call_command('build_similarity_index', stdout=out)
+        self.assertIn("4 recipes indexed", out.getvalue())
+
+
+class SimilarBenchmark(SimpleTestCase):
+    """Querying 100k recipes should stay under 10ms, close to brute force"""
+
+    RECIPES = 100_000
+    USERS = 10
+
+    def test_similar_latency(self):
+        import numpy as np
+
+        rng = random.Random(42)
+        ingredients = [f"i:ingredient {i}" for i in range(2000)]
+        vocabulary = [f"w:word{i}" for i in range(500)]
+        # variations of a few thousand dishes, a fifth of their shingles swapped
+        dishes = [
+            rng.sample(ingredients, 6) + rng.sample(vocabulary, 12)
+            for _ in range(self.RECIPES // 20)
+        ]
+        index = SimilarityIndex()
+        index.grow(self.RECIPES)
+        for recipe_id in range(1, self.RECIPES + 1):
+            tokens = set(rng.sample(dishes[recipe_id % len(dishes)], 14))
+            tokens.update(rng.sample(ingredients, 2) + rng.sample(vocabulary, 2))
+            index._put(recipe_id, recipe_id % self.USERS, minhash(tokens))
+
+        timings, recall = [], []
+        for recipe_id in range(1, 101):
+            signature = index.signatures[index.rows[recipe_id]]
+            start = time.perf_counter()
+            ranked = index.nearest(recipe_id, recipe_id % self.USERS, signature, 10, 0)
+            timings.append(time.perf_counter() - start)
+
+            # exact ranking by the same estimate over all of the user's recipes
+            mine = np.flatnonzero(
+                (index.users == recipe_id % self.USERS) & (index.ids != recipe_id)
+            )
+            scores = (index.signatures[mine] == signature).mean(axis=1)
+            best = set(index.ids[mine[np.argsort(-scores)[:10]]].tolist())
+            recall.append(len(best & {pk for pk, _ in ranked}) / 10)
+
+        latency = statistics.quantiles(timings, n=20)[-1]
+        print(
+            f"\nsimilar over {self.RECIPES} recipes: p95 {latency * 1000:.2f}ms, "
+            f"recall@10 {statistics.mean(recall):.2f}"
+        )
+        self.assertLess(latency, 0.01)
+        self.assertGreater(statistics.mean(recall), 0.5)
+
+
+class RevisionTest(TestCase):
+    """Recipe history: delta revisions, /history/ and /revert/"""
+
+    def setUp(self) -> None:
+        get_store.cache_clear()
+        caches[settings.RECIPE_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.test_user = User.objects.create_user(username='test', password='test')
+        self.client.login(username='test', password='test')
+        self.recipe = Recipe.objects.create(
+            name="Pancakes",
+            ingredient="Flour, eggs, milk",
+            step="Mix, then fry.",
+            user=self.test_user,
+        )
+        self.detail = reverse('recipe-detail', kwargs={'pk': self.recipe.pk})
+        self.history = reverse('recipe-history', kwargs={'pk': self.recipe.pk})
+
+    def edit(self, **changes):
+        response = self.client.patch(self.detail, changes, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_diff_and_patch(self):
+        for old, new in [
+            ("Mix, then fry.", "Mix well, rest, then fry."),
+            ("", "Boil."),
+            ("Boil.", ""),
+            ("先放油，再放蛋", "先放油，炒香葱，再放蛋"),
+        ]:
+            self.assertEqual(patch(old, diff(old, new)), new)
+
+    def test_history_newest_first(self):
+        self.edit(step="Mix, rest, then fry.")
+        self.edit(ingredient="Flour, eggs, milk, sugar")
+        response = self.client.get(self.history)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([v['version'] for v in response.data], [3, 2, 1])
+        self.assertEqual(
+            {k: response.data[1][k] for k in ('name', 'ingredient', 'step')},
+            {
+                'name': "Pancakes",
+                'ingredient': "Flour, eggs, milk",
+                'step': "Mix, rest, then fry.",
+            },
+        )
+        self.assertEqual(response.data[2]['step'], "Mix, then fry.")
+
+        response = self.client.get(self.history, {'limit': 1, 'before': 3})
+        self.assertEqual([v['version'] for v in response.data], [2])
+        self.assertEqual(response.data[0]['step'], "Mix, rest, then fry.")
+
+    def test_unchanged_saves_add_no_revision(self):
+        self.edit(step="Mix, then fry.")
+        self.client.post(reverse('recipe-publish', kwargs={'pk': self.recipe.pk}))
+        self.assertEqual(self.recipe.revisions.count(), 1)
+
+    def test_revert(self):
+        self.edit(name="Crepes", step="Mix, rest, then fry thin.")
+        response = self.client.post(
+            reverse('recipe-revert', kwargs={'pk': self.recipe.pk}),
+            {'version': 1},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['name'], "Pancakes")
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.step, "Mix, then fry.")
+        # reverting is itself a new version
+        response = self.client.get(self.history)
+        self.assertEqual([v['version'] for v in response.data], [3, 2, 1])
+
+        response = self.client.post(
+            reverse('recipe-revert', kwargs={'pk': self.recipe.pk}),
+            {'version': 9},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_revert_to_a_taken_name(self):
+        self.edit(name="Crepes")
+        Recipe.objects.create(
+            name="Pancakes", ingredient="...", step="...", user=self.test_user
+        )
+        response = self.client.post(
+            reverse('recipe-revert', kwargs={'pk': self.recipe.pk}),
+            {'version': 1},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_history(self):
+        User.objects.create_user(username='other', password='other')
+        self.client.login(username='other', password='other')
+        self.assertEqual(
+            self.client.get(self.history).status_code, status.HTTP_404_NOT_FOUND
+        )
+
+    def test_bulk_update_records_revisions(self):
+        tea = Recipe.objects.create(
+            name="Tea", ingredient="Water, tea", step="Steep.", user=self.test_user
+        )
+        items = [
+            {'id': self.recipe.pk, 'step': "Mix, then bake."},
+            {'id': tea.pk, 'step': "Steep for 3 minutes."},
+        ]
+        response = self.client.patch(reverse('recipe-bulk'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(tea.revisions.count(), 2)
+        response = self.client.get(self.history)
+        self.assertEqual(response.data[0]['step'], "Mix, then bake.")
+
+    @override_settings(RECIPE_REVISION_SNAPSHOT_INTERVAL=3)
+    def test_snapshot_interval_bounds_the_chain(self):
+        for count in range(2, 9):
+            self.edit(step=f"Mix, then fry {count} times.")
+        self.assertEqual(
+            list(
+                self.recipe.revisions.filter(is_snapshot=True).values_list(
+                    'number', flat=True
+                )
+            ),
+            [1, 4, 7],
+        )
+        response = self.client.post(
+            reverse('recipe-revert', kwargs={'pk': self.recipe.pk}),
+            {'version': 6},
+            format='json',
+        )
+        self.assertEqual(response.data['step'], "Mix, then fry 6 times.")
+        response = self.client.get(self.history, {'limit': 3})
+        self.assertEqual([v['version'] for v in response.data], [9, 8, 7])
+        self.assertEqual(response.data[0]['step'], "Mix, then fry 6 times.")
+
+
+class RevisionStorageBenchmark(SimpleTestCase):
+    """Delta revisions should take a fraction of the space of full copies"""
+
+    EDITS = 500
+    INTERVAL = 10
+
+    def test_storage_and_rebuild(self):
+        rng = random.Random(7)
+        words = [f"word{i}" for i in range(300)]
+        content = {
+            'name': "Sourdough bread",
+            'ingredient': ", ".join(rng.sample(words, 12)),
+            # ~950 characters, under the 1000 of Recipe.step
+            'step': " ".join(rng.choice(words) for _ in range(120)),
+        }
+        revisions, contents, full, compressed = [], [], 0, 0
+        for number in range(1, self.EDITS + 1):
+            # tweak a few words of the steps, sometimes the ingredients
+            step = content['step'].split(" ")
+            for _ in range(rng.randint(1, 3)):
+                position = rng.randrange(len(step))
+                step[position] = rng.choice(
+                    [word for word in words if word != step[position]]
+                )
+            content = dict(content, step=" ".join(step))
+            if number % 5 == 0:
+                content['ingredient'] = ", ".join(rng.sample(words, 12))
+            is_snapshot, data = next_revision(
+                contents[-1] if contents else None, content, number, self.INTERVAL
+            )
+            revisions.append(
+                mock.Mock(number=number, is_snapshot=is_snapshot, data=data)
+            )
+            raw = json.dumps(content).encode()
+            full += len(raw)
+            compressed += len(zlib.compress(raw))
+            contents.append(content)
+        stored = sum(len(revision.data) for revision in revisions)
+
+        timings = []
+        for number in range(1, self.EDITS + 1, 7):
+            start = (number - 1) // self.INTERVAL * self.INTERVAL
+            chain = revisions[start:number]
+            self.assertLessEqual(len(chain), self.INTERVAL)
+            began = time.perf_counter()
+            rebuilt = rebuild(chain)
+            timings.append(time.perf_counter() - began)
+            self.assertEqual(rebuilt, contents[number - 1])
+
+        print(
+            f"\n{self.EDITS} revisions: {stored / 1024:.1f}KiB as deltas, "
+            f"{full / 1024:.1f}KiB as full copies, {compressed / 1024:.1f}KiB "
+            f"compressed; rebuild p95 "
+            f"{statistics.quantiles(timings, n=20)[-1] * 1000:.3f}ms"
+        )
+        self.assertLess(stored, full / 4)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], DATABASE_REPLICA_STICKY_SECONDS=60)
+class ReplicaRoutingTest(TransactionTestCase):
+    """Read replica routing, against a second SQLite database"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # added after the test case set up its database guards, which would
+        # otherwise block an alias missing from the settings
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.databases['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': str(Path(cls.directory.name) / 'replica.sqlite3'),
+        }
+        # the router never migrates replicas
+        with override_settings(DATABASE_ROUTERS=[]):
+            call_command('migrate', database='replica', verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections.databases['replica']
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        with connections['replica'].cursor() as cursor:
+            cursor.execute('DELETE FROM recipe_recipe')
+            cursor.execute('DELETE FROM auth_user')
+        caches[settings.RECIPE_CACHE_ALIAS].clear()
+        caches[settings.DATABASE_REPLICA_PIN_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.test_user = User.objects.create_user(username='test', password='test')
+        self.client.force_login(self.test_user)
+        self.recipe = Recipe.objects.create(
+            name="Pizza", ingredient="Flour", step="...", user=self.test_user
+        )
+        # a lagging replica: it still has the recipe under its old name
+        User.objects.using('replica').create(pk=self.test_user.pk, username='test')
+        Recipe.objects.using('replica').bulk_create(
+            [
+                Recipe(
+                    pk=self.recipe.pk,
+                    name="Old pizza",
+                    ingredient="Flour",
+                    step="...",
+                    user_id=self.test_user.pk,
+                )
+            ]
+        )
+        # creating the user's recipe pinned them
+        caches[settings.DATABASE_REPLICA_PIN_CACHE_ALIAS].clear()
+
+    def list_names(self):
+        return [
+            recipe['name'] for recipe in self.client.get(reverse('recipe-list')).data
+        ]
+
+    def test_reads_go_to_replica_writes_to_primary(self):
+        self.assertEqual(self.list_names(), ["Old pizza"])
+        response = self.client.get(reverse('recipe-detail', args=[self.recipe.pk]))
+        self.assertEqual(response.data['name'], "Old pizza")
+        # everything else still reads from the primary
+        self.assertEqual(Recipe.objects.get(pk=self.recipe.pk).name, "Pizza")
+
+        response = self.client.post(
+            reverse('recipe-list'),
+            {'name': "Soup", 'ingredient': "Water", 'step': "..."},
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(Recipe.objects.using('replica').filter(name="Soup").exists())
+
+    def test_writers_read_their_writes(self):
+        self.client.patch(
+            reverse('recipe-detail', args=[self.recipe.pk]),
+            {'step': "Bake"},
+            format='json',
+        )
+        self.assertEqual(self.list_names(), ["Pizza"])
+
+        # other users are not pinned
+        other = User.objects.create_user(username='other', password='other')
+        User.objects.using('replica').create(pk=other.pk, username='other')
+        self.client.force_login(other)
+        Recipe.objects.using('replica').bulk_create(
+            [Recipe(name="Stale", ingredient="...", step="...", user_id=other.pk)]
+        )
+        self.assertEqual(self.list_names(), ["Stale"])
+
+    def test_no_replicas_configured(self):
+        with self.settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.list_names(), ["Pizza"])
+
+    def test_router(self):
+        from backend.routers import ReplicaRouter, read_from_replicas
+
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Recipe), 'default')
+        with read_from_replicas() as enabled:
+            self.assertTrue(enabled)
+            self.assertEqual(router.db_for_read(Recipe), 'replica')
+            self.assertEqual(router.db_for_write(Recipe), 'default')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Recipe), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'recipe'))
+        self.assertTrue(router.allow_migrate('default', 'recipe'))
+
+    def test_pins_are_shared_between_processes(self):
+        from backend import routers
+
+        # a cache instance per server process, all on the shared pin backend
+        alias = settings.DATABASE_REPLICA_PIN_CACHE_ALIAS
+        writer, reader = caches.create_connection(alias), caches.create_connection(
+            alias
+        )
+        with mock.patch.object(routers, 'get_pin_cache', return_value=writer):
+            routers.pin_to_primary('user:0')
+        with mock.patch.object(routers, 'get_pin_cache', return_value=reader):
+            self.assertTrue(routers.is_pinned('user:0'))
+            self.assertFalse(routers.is_pinned('user:1'))
+        # not in the default cache, whatever backend that one uses
+        self.assertIsNone(caches['default'].get(routers.pinned_key('user:0')))
+
+
+class BenchmarkCommandTest(TestCase):
+    """seed_recipes and benchmark management commands"""
+
+    def test_seed_is_idempotent(self):
+        out = io.StringIO()
+        call_command('seed_recipes', users=2, recipes=5, prefix='t', stdout=out)
+        self.assertIn("2 users and 10 recipes created", out.getvalue())
+        self.assertEqual(Recipe.objects.filter(user__username='t1').count(), 5)
+        recipe = Recipe.objects.first()
+        self.assertEqual(recipe.ingredients.count(), 5)
+        self.assertTrue(self.client.login(username='t0', password='t'))
+
+        call_command('seed_recipes', users=3, recipes=5, prefix='t', stdout=out)
+        self.assertIn("1 users and 5 recipes created", out.getvalue())
+        self.assertEqual(Recipe.objects.count(), 15)
+
+    def test_seed_with_a_few_ingredients(self):
+        for name in ("flour", "eggs", "milk"):
+            Ingredient.objects.create(name=name)
+        out = io.StringIO()
+        call_command('seed_recipes', users=1, recipes=3, prefix='t', stdout=out)
+        self.assertIn("1 users and 3 recipes created", out.getvalue())
+        self.assertTrue(
+            Recipe.objects.filter(ingredient__startswith='ingredient-').exists()
+        )
+
+    def test_benchmark_run_and_baseline(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'results.json'
+            call_command(
+                'benchmark',
+                requests=3,
+                users=1,
+                recipes=5,
+                prefix='t',
+                output=output,
+                stdout=io.StringIO(),
+            )
+            results = json.loads(output.read_text())
+            self.assertEqual(
+                list(results['scenarios']),
+                ['list', 'detail', 'create', 'update', 'delete'],
+            )
+            for result in results['scenarios'].values():
+                self.assertEqual(result['requests'], 3)
+                self.assertEqual(result['errors'], 0)
+                self.assertGreater(result['queries'], 0)
+                self.assertGreaterEqual(result['p99_ms'], result['p50_ms'])
+            # the run cleans up after itself
+            self.assertEqual(Recipe.objects.count(), 5)
+
+            results['scenarios']['list']['queries'] = 0
+            baseline = Path(directory) / 'baseline.json'
+            baseline.write_text(json.dumps(results))
+            with self.assertRaisesMessage(CommandError, "list: "):
+                call_command(
+                    'benchmark',
+                    requests=3,
+                    prefix='t',
+                    scenario=['list'],
+                    baseline=baseline,
+                    stdout=io.StringIO(),
+                )
+
+    def test_default_request_count_is_not_throttled(self):
+        # 200 writes from one user, over the default write rate
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'results.json'
+            call_command(
+                'benchmark',
+                users=1,
+                recipes=5,
+                prefix='t',
+                scenario=['create'],
+                output=output,
+                stdout=io.StringIO(),
+            )
+            result = json.loads(output.read_text())['scenarios']['create']
+        self.assertEqual(result['requests'], 200)
+        self.assertEqual(result['errors'], 0)
+
+    def test_spawned_server_runs_one_worker_on_local_caches(self):
+        with mock.patch('recipe.loadtest.subprocess.Popen') as popen:
+            process = spawn_server('asgi', 8201, settings.BASE_DIR)
+        self.addCleanup(process.log.close)
+        env = popen.call_args.kwargs['env']
+        self.assertEqual(env['WEB_CONCURRENCY'], '1')
+        self.assertEqual(env['RECIPE_THROTTLE_DISABLED'], '1')
+
+        process.log.write(b'ImproperlyConfigured: no shared cache\n')
+        process.poll.return_value = 3
+        self.assertFalse(wait_for_server(process, '127.0.0.1', 8201, timeout=5))
+        self.assertIn('ImproperlyConfigured', server_output(process))
+
+    def test_compare_results(self):
+        def results(p95, rps, queries, errors=0):
+            return {
+                'scenarios': {
+                    'list': {
+                        'p95_ms': p95,
+                        'rps': rps,
+                        'queries': queries,
+                        'errors': errors,
+                    }
+                }
+            }
+
+        baseline = results(10, 100, 3)
+        self.assertEqual(compare_results(results(12, 85, 3), baseline, 0.25), [])
+        self.assertEqual(
+            len(compare_results(results(20, 50, 4, errors=1), baseline, 0.25)), 4
+        )
+        # query counts of a server run are unknown
+        self.assertEqual(compare_results(results(10, 100, None), baseline, 0.25), [])
+
+
+@override_settings(
+    RECIPE_THROTTLE_RATES={
+        'read': '3/min',
+        'write': '2/min',
+        'bulk': '1/min',
+        'auth': '2/min',
+    },
+    RECIPE_THROTTLE_FULL_LIST_COST=2,
+)
+class ThrottleTest(TestCase):
+    """Token-bucket rate limits per scope and client"""
+
+    def setUp(self) -> None:
+        caches[settings.RECIPE_CACHE_ALIAS].clear()
+        get_store.cache_clear()
+        self.addCleanup(get_store.cache_clear)
+        self.client = APIClient()
+        self.test_user = User.objects.create_user(username='test', password='test')
+        self.client.login(username='test', password='test')
+
+    def get_list(self, query='?page_size=10'):
+        return self.client.get(reverse('recipe-list') + query).status_code
+
+    def test_reads_then_retry_after(self):
+        self.assertEqual([self.get_list() for _ in range(3)], [200] * 3)
+        response = self.client.get(reverse('recipe-list') + '?page_size=10')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # one token comes back every 60 / 3 seconds
+        self.assertIn(int(response['Retry-After']), (19, 20))
+
+    def test_full_list_costs_more(self):
+        self.assertEqual(self.get_list(''), status.HTTP_200_OK)
+        self.assertEqual(self.get_list(''), status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.get_list(), status.HTTP_200_OK)
+
+    def test_scopes_and_clients_are_separate(self):
+        for _ in range(3):
+            self.get_list()
+        self.assertEqual(self.get_list(), status.HTTP_429_TOO_MANY_REQUESTS)
+        url = reverse('recipe-list')
+        for name in ("Soup", "Tea"):
+            response = self.client.post(
+                url, {'name': name, 'ingredient': "Water", 'step': "..."}
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(
+            url, {'name': "Cake", 'ingredient': "Flour", 'step': "..."}
+        )
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        response = self.client.delete(reverse('recipe-bulk'), [], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        User.objects.create_user(username='other', password='other')
+        self.client.login(username='other', password='other')
+        self.assertEqual(self.get_list(), status.HTTP_200_OK)
+
+        # anonymous clients are told apart by IP
+        self.client.logout()
+        url = reverse('catalog-list')
+        for _ in range(3):
+            self.client.get(url, REMOTE_ADDR='10.0.0.1')
+        response = self.client.get(url, REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        response = self.client.get(url, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_token_endpoint(self):
+        self.client.logout()
+        url = reverse('token-obtain')
+        codes = [
+            self.client.post(url, {'username': 'test', 'password': 'wrong'}).status_code
+            for _ in range(3)
+        ]
+        self.assertEqual(codes, [401, 401, 429])
+
+    @override_settings(RECIPE_THROTTLE_STORE='recipe.throttling.CacheBucketStore')
+    def test_cache_store(self):
+        self.assertEqual([self.get_list() for _ in range(4)], [200, 200, 200, 429])
+        # the buckets are in the shared cache, not in this process
+        get_store.cache_clear()
+        self.assertEqual(self.get_list(), status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_refill(self):
+        for store in (LocalBucketStore(), CacheBucketStore()):
+            key = f'test:{type(store).__name__}'
+            self.assertEqual(store.take(key, 2, 1.0, 1, now=100.0), 0)
+            self.assertEqual(store.take(key, 2, 1.0, 1, now=100.0), 0)
+            self.assertEqual(store.take(key, 2, 1.0, 1, now=100.0), 1.0)
+            self.assertEqual(store.take(key, 2, 1.0, 1, now=100.5), 0.5)
+            self.assertEqual(store.take(key, 2, 1.0, 1, now=101.0), 0)
+            # never more than the capacity
+            self.assertEqual(store.take(key, 2, 1.0, 2, now=500.0), 0)
+            self.assertGreater(store.take(key, 2, 1.0, 1, now=500.0), 0)
+
+    def test_local_store_keeps_at_most_max_keys(self):
+        store = LocalBucketStore(max_keys=3)
+        for key in ('ip:a', 'ip:b', 'ip:c', 'ip:a'):
+            store.take(key, 10, 1.0, 1, now=0.0)
+        # none has refilled: the least recently used one goes
+        store.take('ip:d', 10, 1.0, 1, now=0.5)
+        self.assertEqual(list(store.buckets), ['ip:c', 'ip:a', 'ip:d'])
+        # "ip:c" has refilled, "ip:a" took two tokens and has not
+        store.take('ip:e', 10, 1.0, 1, now=1.2)
+        self.assertEqual(list(store.buckets), ['ip:a', 'ip:d', 'ip:e'])
+
+        for index in range(1000):
+            store.take(f'ip:{index}', 10, 1.0, 1, now=2.0)
+        self.assertEqual(len(store.buckets), 3)
+
+
+class ThrottleBenchmark(SimpleTestCase):
+    """A throttle check should cost microseconds"""
+
+    CHECKS = 100_000
+
+    def test_check_cost(self):
+        from types import SimpleNamespace
+
+        throttle = TokenBucketThrottle()
+        view = SimpleNamespace(action='list')
+        requests = [
+            SimpleNamespace(
+                method='GET', user=SimpleNamespace(is_authenticated=True, pk=pk)
+            )
+            for pk in range(1000)
+        ]
+        with self.settings(RECIPE_THROTTLE_RATES={'read': '1000000/s'}):
+            get_store.cache_clear()
+            start = time.perf_counter()
+            for i in range(self.CHECKS):
+                throttle.allow_request(requests[i % 1000], view)
+            per_check = (time.perf_counter() - start) / self.CHECKS
+            get_store.cache_clear()
+        print(f"\nthrottle check: {per_check * 1e6:.2f}us")
+        self.assertLess(per_check, 50e-6)
+
+
+class QueryCountAssertionsMixin:
+    """Helpers keeping the per-endpoint query count flat as data grows."""
+
+    def count_queries(self, url):
+        caches[settings.RECIPE_CACHE_ALIAS].clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries)
+
+    def assertQueryCountWithin(self, url, budget):
+        count = self.count_queries(url)
+        self.assertLessEqual(count, budget, f"{url} ran {count} queries")
+        return count
+
+    def assertConstantQueries(self, url, grow):
+        """``grow()`` adds rows; ``url`` must not run more queries after it."""
+        before = self.count_queries(url)
+        grow()
+        self.assertEqual(self.count_queries(url), before)
+
+
+class MetricsTest(QueryCountAssertionsMixin, TestCase):
+    """Request instrumentation and /metrics"""
+
+    def setUp(self) -> None:
+        from backend.metrics import registry
+
+        self.registry = registry
+        registry.reset()
+        self.client = APIClient()
+        self.test_user = User.objects.create_user(username='test', password='test')
+        self.client.force_login(self.test_user)
+        self.recipe = Recipe.objects.create(
+            name="Pizza", ingredient="Flour, cheese", step="...", user=self.test_user
+        )
+
+    def grow(self):
+        start = Recipe.objects.count()
+        for i in range(start, start + 20):
+            Recipe.objects.create(
+                name=f"r{i}", ingredient="Flour, eggs", step="...", user=self.test_user
+            )
+
+    def test_recipe_list_query_count(self):
+        self.assertQueryCountWithin(reverse('recipe-list'), 3)
+        self.assertConstantQueries(reverse('recipe-list'), self.grow)
+        self.assertConstantQueries(
+            reverse('recipe-list') + '?page_size=5&ingredient=flour', self.grow
+        )
+
+    def test_recipe_detail_query_count(self):
+        url = reverse('recipe-detail', args=[self.recipe.pk])
+        self.assertQueryCountWithin(url, 3)
+        self.assertConstantQueries(url, self.grow)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('recipe-list'))
+        self.client.get(reverse('recipe-detail', args=[self.recipe.pk]))
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        labels = 'view="recipe-list",action="list",method="GET"'
+        self.assertIn(f'http_requests_total{{{labels},status="200"}} 1', body)
+        self.assertIn(
+            f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 1', body
+        )
+        self.assertIn(f'db_queries_per_request_count{{{labels}}} 1', body)
+        self.assertIn(f'serialization_duration_seconds_count{{{labels}}} 1', body)
+        self.assertIn('view="recipe-detail",action="retrieve"', body)
+
+    def test_query_budget_warning(self):
+        with self.settings(METRICS_QUERY_BUDGET=0):
+            with self.assertLogs('backend.metrics', level='WARNING') as logs:
+                self.client.get(reverse('recipe-list'))
+        self.assertIn('recipe-list', logs.output[0])
+        self.assertIn('query_budget_exceeded_total', self.registry.render())
@@ -0,0 +1,152 @@
+"""
+Token-bucket rate limits, per user or per client IP when anonymous.
+
+Every ``(scope, client)`` pair has a bucket of ``capacity`` tokens refilled
+at ``capacity / period`` tokens per second, so clients may burst up to the
+capacity and then sustain the rate. Scopes come from the request: ``read``
+for safe methods, ``write`` for the others, unless the view maps its action
+(``throttle_scopes``) or itself (``throttle_scope``) to another one, e.g.
+``bulk``. Rates are set per scope in ``RECIPE_THROTTLE_RATES``.
+
+Buckets live in ``RECIPE_THROTTLE_STORE``: by default a dict of the current
+process (a couple of microseconds per request, but each server process
+counts on its own), or ``CacheBucketStore`` to share them through a cache
+backend such as Redis.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """``'120/min'`` -> ``(capacity, tokens per second)``, as DRF spells rates."""
+    count, period = rate.split('/')
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+class LocalBucketStore:
+    """Buckets in a dict of this process, guarded by a lock.
+
+    At most ``max_keys`` buckets, least recently used first out: under many
+    distinct clients (IPs) the oldest go, refilled or not. An evicted client
+    starts again from a full bucket.
+    """
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        # key -> (tokens, updated, full again at), least recently used first
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, capacity, rate, cost, now):
+        """Take ``cost`` tokens; return 0, or the seconds until they are there."""
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                tokens = capacity
+                if len(self.buckets) >= self.max_keys:
+                    self.prune(now)
+            else:
+                tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                self.buckets.move_to_end(key)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+            self.buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            return wait
+
+    def prune(self, now):
+        """Make room for one bucket, the least recently used ones going first.
+
+        Those that have filled up again, the same as no bucket, go for free;
+        then, if still full, the least recently used one anyway.
+        """
+        buckets = self.buckets
+        while buckets:
+            key, bucket = next(iter(buckets.items()))
+            if bucket[2] > now and len(buckets) < self.max_keys:
+                return
+            del buckets[key]
+
+
+class CacheBucketStore:
+    """Buckets in the ``RECIPE_THROTTLE_CACHE_ALIAS`` cache, for every process.
+
+    Read-modify-write without a lock: concurrent requests of one client may
+    both get the last token, which is fine for rate limiting.
+    """
+
+    def take(self, key, capacity, rate, cost, now):
+        cache = caches[settings.RECIPE_THROTTLE_CACHE_ALIAS]
+        key = f'throttle:{key}'
+        bucket = cache.get(key)
+        if bucket is None:
+            tokens = capacity
+        else:
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / rate
+        # expires once full again, like a missing bucket
+        cache.set(key, (tokens, now), timeout=int((capacity - tokens) / rate) + 1)
+        return wait
+
+
+@lru_cache(maxsize=None)
+def get_store(path):
+    return import_string(path)()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Rate limit every request by scope, see the module docstring.
+
+    Views may also define ``throttle_cost(request)``, the number of tokens
+    a request takes (1 by default).
+    """
+
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope:
+            return scope
+        action = getattr(view, 'action', None)
+        scope = getattr(view, 'throttle_scopes', {}).get(action)
+        if scope:
+            return scope
+        return 'read' if request.method in SAFE_METHODS else 'write'
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(request, view)
+        rate = settings.RECIPE_THROTTLE_RATES.get(scope)
+        if not rate:
+            return True
+        capacity, per_second = parse_rate(rate)
+        cost = view.throttle_cost(request) if hasattr(view, 'throttle_cost') else 1
+
+        user = request.user
+        if user and user.is_authenticated:
+            ident = f'user:{user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        self.delay = get_store(settings.RECIPE_THROTTLE_STORE).take(
+            f'{scope}:{ident}', capacity, per_second, min(cost, capacity), time.time()
+        )
+        return not self.delay
+
+    def wait(self):
+        return self.delay
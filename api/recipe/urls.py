@@ -1,12 +1,32 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from .views import RecipeViewSet
+from . import async_views
+from .views import (
+    CatalogViewSet,
+    MealPlanView,
+    RecipeViewSet,
+    ShoppingListView,
+    TokenObtainView,
+    TokenRefreshView,
+)
 
 router = DefaultRouter()
 # list APi viewname: recipe-list.  ref: rest_framework.routers.SimpleRouter.routes
 router.register('recipes', RecipeViewSet, basename='recipe')
+router.register('catalog', CatalogViewSet, basename='catalog')
 
 urlpatterns = [
+    path('auth/token/', TokenObtainView.as_view(), name='token-obtain'),
+    path('auth/token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
+    path('mealplan/', MealPlanView.as_view(), name='mealplan'),
+    path('shopping-list/', ShoppingListView.as_view(), name='shopping-list'),
+    # read-only async variants for the ASGI server, see recipe/async_views.py
+    path('async/recipes/', async_views.recipe_list, name='recipe-async-list'),
+    path(
+        'async/recipes/<int:pk>/',
+        async_views.recipe_detail,
+        name='recipe-async-detail',
+    ),
     path('', include(router.urls)),
 ]
@@ -1,28 +1,538 @@
-from rest_framework.viewsets import ModelViewSet
-from rest_framework.permissions import IsAuthenticated
+from types import GeneratorType
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.authentication import SessionAuthentication
 
-from .serializers import RecipeSerializer
+from .serializers import (
+    CatalogRowSerializer,
+    HistoryQuerySerializer,
+    MealPlanQuerySerializer,
+    MealPlanSerializer,
+    RecipeCostSerializer,
+    RecipeNutritionSerializer,
+    RecipeRowSerializer,
+    RecipeSerializer,
+    RevertSerializer,
+    RevisionSerializer,
+    ShoppingListQuerySerializer,
+    ShoppingListSerializer,
+    SimilarQuerySerializer,
+    SuggestQuerySerializer,
+    TokenObtainSerializer,
+    TokenRefreshSerializer,
+)
+from .authentication import (
+    SignedTokenAuthentication,
+    issue_access_token,
+    issue_tokens,
+    user_from_refresh_token,
+)
+from .bulk import BulkWriter
+from .cache import (
+    CATALOG_SCOPE,
+    CachedReadMixin,
+    cached_for_scope,
+    last_modified,
+    user_scope,
+)
+from .export import EXPORT_FORMATS, export_response
+from .parsers import NDJSONParser
+from .reads import ReplicaReadMixin, ValuesReadMixin
+from .renderers import FastJSONRenderer
 from .models import Recipe
+from .pagination import CatalogCursorPagination, RecipeCursorPagination
+from .filters import (
+    CostFilter,
+    IngredientFilter,
+    NutritionFilter,
+    RecipeOrderingFilter,
+    RecipeSearchFilter,
+)
+from .ingredients import parse_ingredients
+from .nutrition import NUTRIENTS, nutrient_matrix
+from .pricing import price_table
+from .revisions import get_version, recent_versions
+from .shopping import shopping_list
+from .suggest import pantry_index
+from .tasks import build_similarity_index
+
+BULK_COUNTS = ('created', 'updated', 'deleted')
 
 
 # Create your views here.
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(CachedReadMixin, ReplicaReadMixin, ValuesReadMixin, ModelViewSet):
     serializer_class = RecipeSerializer
+    # list/retrieve skip model instances, see ValuesReadMixin
+    read_serializer_class = RecipeRowSerializer
     queryset = Recipe.objects.all()
+    renderer_classes = [
+        FastJSONRenderer,
+        BrowsableAPIRenderer,
+    ]
 
+    # session first: it keeps the 403 (not 401) answer for anonymous requests
     authentication_classes = [
         SessionAuthentication,
+        SignedTokenAuthentication,
     ]
     permission_classes = [
         IsAuthenticated,
     ]
+    pagination_class = RecipeCursorPagination
+    filter_backends = [
+        IngredientFilter,
+        CostFilter,
+        NutritionFilter,
+        RecipeOrderingFilter,
+        # keep last, it slices the queryset
+        RecipeSearchFilter,
+    ]
+    ordering_fields = ['cost', *NUTRIENTS]
+    ordering = ['id']
+    # see recipe/throttling.py, other actions are 'read' or 'write'
+    throttle_scopes = {'bulk': 'bulk', 'export': 'bulk'}
+
+    def throttle_cost(self, request):
+        # a full list reads every recipe of the user, charge it accordingly
+        if self.action == 'list' and self.paginator.get_page_size(request) is None:
+            return settings.RECIPE_THROTTLE_FULL_LIST_COST
+        return 1
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def paginate_queryset(self, queryset):
+        # ranked search results are already capped and can't be re-ordered by id
+        if queryset.query.is_sliced:
+            return None
+        return super().paginate_queryset(queryset)
+
     def get_queryset(self):
         user = self.request.user
         # filter out recipes belonging to this current user
-        queryset = Recipe.objects.filter(user=user)
+        queryset = Recipe.objects.filter(user=user).order_by('id')
         return queryset
+
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """Rank the user's recipes by how much of them the pantry covers.
+
+        ``?pantry=flour,eggs,sugar&limit=20&min_coverage=0.5``
+        """
+        params = request.query_params.copy()
+        params['pantry'] = ','.join(params.getlist('pantry'))
+        query = SuggestQuerySerializer(data=params)
+        query.is_valid(raise_exception=True)
+
+        ranked = pantry_index.suggest(
+            request.user.pk,
+            parse_ingredients(query.validated_data['pantry']),
+            limit=query.validated_data['limit'],
+            min_coverage=query.validated_data['min_coverage'],
+        )
+        # the index may briefly lag behind the database, trust the latter
+        recipes = self.get_queryset().in_bulk([recipe_id for recipe_id, _, _ in ranked])
+        suggestions = []
+        for recipe_id, coverage, missing in ranked:
+            if recipe_id not in recipes:
+                continue
+            data = self.get_serializer(recipes[recipe_id]).data
+            data.update(id=recipe_id, coverage=round(coverage, 4), missing=missing)
+            suggestions.append(data)
+        return Response(suggestions)
+
+    @action(detail=True, methods=['post', 'delete'])
+    def publish(self, request, pk=None):
+        """List the recipe in the public catalog (POST) or withdraw it (DELETE)."""
+        recipe = self.get_object()
+        recipe.is_public = request.method == 'POST'
+        recipe.save(update_fields=['is_public'])
+        return Response({'is_public': recipe.is_public})
+
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """Earlier versions of the recipe, newest first.
+
+        ``?limit=20&before=<version>``, see recipe/revisions.py.
+        """
+        recipe = self.get_object()
+        query = HistoryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+
+        def render():
+            versions = recent_versions(
+                recipe.pk,
+                query.validated_data['limit'],
+                query.validated_data.get('before'),
+            )
+            serializer = RevisionSerializer(
+                [
+                    {
+                        'version': revision.number,
+                        'created_at': revision.created_at,
+                        **content,
+                    }
+                    for revision, content in versions
+                ],
+                many=True,
+            )
+            return Response(serializer.data)
+
+        return self.cached_response(request, render)
+
+    @action(detail=True, methods=['post'])
+    def revert(self, request, pk=None):
+        """Restore the text of an earlier version, as a new version."""
+        recipe = self.get_object()
+        body = RevertSerializer(data=request.data)
+        body.is_valid(raise_exception=True)
+        content = get_version(recipe.pk, body.validated_data['version'])
+        if content is None:
+            return Response(
+                {'detail': 'No such version.'}, status=status.HTTP_404_NOT_FOUND
+            )
+        serializer = self.get_serializer(recipe, data=content)
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """The user's recipes closest to this one by ingredients and wording.
+
+        ``?limit=10&min_similarity=0.2``, see recipe/similar.py.
+        """
+        # NumPy based, imported on first use to keep process startup fast
+        from .similar import recipe_signature, similarity_index
+
+        recipe = self.get_object()
+        query = SimilarQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+
+        if not similarity_index.refresh():
+            # reads every recipe, left to the worker (run inline with JOBS_EAGER)
+            build_similarity_index.enqueue(dedup_key=build_similarity_index.name)
+            if not similarity_index.refresh():
+                return Response(
+                    {'detail': "The similarity index is being built, retry later."},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={'Retry-After': '30'},
+                )
+        # signed from the row just read, the index may lag behind a save
+        ranked = similarity_index.nearest(
+            recipe.pk,
+            recipe.user_id,
+            recipe_signature(recipe),
+            query.validated_data['limit'],
+            query.validated_data['min_similarity'],
+        )
+        recipes = self.get_queryset().in_bulk([recipe_id for recipe_id, _ in ranked])
+        similar = []
+        for recipe_id, similarity in ranked:
+            if recipe_id not in recipes:
+                continue
+            data = self.get_serializer(recipes[recipe_id]).data
+            data.update(id=recipe_id, similarity=round(similarity, 4))
+            similar.append(data)
+        return Response(similar)
+
+    @action(detail=True, methods=['get'])
+    def cost(self, request, pk=None):
+        """Estimated cost of a recipe and the price of each ingredient."""
+        recipe = self.get_object()
+        prices = price_table.get()
+        names = parse_ingredients(recipe.ingredient)
+        serializer = RecipeCostSerializer(
+            {
+                'cost': recipe.cost,
+                'ingredients': [
+                    {'name': name, 'price': prices.get(name)} for name in names
+                ],
+                'missing': [name for name in names if prices.get(name) is None],
+            }
+        )
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def nutrition(self, request, pk=None):
+        """Nutrient totals of a recipe and the nutrients of each ingredient."""
+        recipe = self.get_object()
+        table = nutrient_matrix.get()
+        ingredients = []
+        for name in parse_ingredients(recipe.ingredient):
+            row = table.matrix[table.rows_by_name.get(name, table.unknown)]
+            values = [None if value != value else value for value in row.tolist()]
+            ingredients.append({'name': name, **dict(zip(NUTRIENTS, values))})
+        serializer = RecipeNutritionSerializer(
+            {
+                'total': {name: getattr(recipe, name) for name in NUTRIENTS},
+                'ingredients': ingredients,
+            }
+        )
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream all of the user's recipes: ``?fmt=ndjson`` (default) or ``?fmt=csv``.
+
+        Accepts the list filters, e.g. ``?ingredient=flour``.
+        """
+        # not ?format=, DRF reserves it to pick a renderer
+        fmt = request.query_params.get('fmt', 'ndjson')
+        if fmt not in EXPORT_FORMATS:
+            return Response(
+                {'fmt': [f'Expected one of: {", ".join(EXPORT_FORMATS)}.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        with self.replica_reads():
+            queryset = self.filter_queryset(self.get_queryset())
+            # the rows are read after the view returns, pick the database now
+            queryset = queryset.using(queryset.db)
+        return export_response(
+            request._request, queryset, self.get_read_serializer(), fmt
+        )
+
+    @action(
+        detail=False,
+        methods=['post', 'put', 'patch', 'delete'],
+        parser_classes=[JSONParser, NDJSONParser],
+    )
+    def bulk(self, request):
+        """Create, update or delete many recipes in one request.
+
+        POST takes a JSON array (or an NDJSON stream) of recipes, PUT/PATCH
+        the same with an ``id`` on every item, DELETE a JSON array of ids.
+        Valid items are written even when others fail; failures are listed
+        per item by their position in the request.
+        """
+        items = request.data
+        # a JSON array, or the lazy item stream of NDJSONParser
+        if not isinstance(items, (list, GeneratorType)):
+            return Response(
+                {'detail': 'Expected a list of items.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        writer = BulkWriter(self.get_queryset(), self.get_serializer_context())
+        if request.method == 'POST':
+            ids = writer.create(items, request.user)
+            summary = {'created': len(ids), 'ids': ids}
+            success_status = status.HTTP_201_CREATED
+        elif request.method == 'DELETE':
+            summary = {'deleted': writer.delete(items)}
+            success_status = status.HTTP_200_OK
+        else:
+            ids = writer.update(items, partial=request.method == 'PATCH')
+            summary = {'updated': len(ids), 'ids': ids}
+            success_status = status.HTTP_200_OK
+
+        summary['errors'] = writer.errors
+        if not writer.errors:
+            response_status = success_status
+        elif any(count for key, count in summary.items() if key in BULK_COUNTS):
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(summary, status=response_status)
+
+
+class CatalogViewSet(CachedReadMixin, ValuesReadMixin, ReadOnlyModelViewSet):
+    """Recipes their authors published, readable by anyone.
+
+    The catalog is the same for every client, so responses are cached once
+    for everyone and marked ``Cache-Control: public`` for shared caches (a
+    CDN, the reverse proxy) to absorb most requests; ``ETag`` and
+    ``Last-Modified`` change whenever a public recipe does, see
+    recipe/signals.py.
+    """
+
+    read_serializer_class = CatalogRowSerializer
+    queryset = Recipe.objects.filter(is_public=True).order_by('id')
+    renderer_classes = RecipeViewSet.renderer_classes
+    # no sessions: responses must not depend on who asks
+    authentication_classes = []
+    permission_classes = [
+        AllowAny,
+    ]
+    pagination_class = CatalogCursorPagination
+    filter_backends = [
+        IngredientFilter,
+        # keep last, it slices the queryset
+        RecipeSearchFilter,
+    ]
+
+    def get_cache_scope(self):
+        return CATALOG_SCOPE
+
+    def get_cache_control(self):
+        return {'public': True, 'max_age': settings.RECIPE_CATALOG_MAX_AGE}
+
+    def get_last_modified(self):
+        return last_modified(CATALOG_SCOPE)
+
+    def paginate_queryset(self, queryset):
+        # ranked search results are already capped and can't be re-ordered by id
+        if queryset.query.is_sliced:
+            return None
+        return super().paginate_queryset(queryset)
+
+
+class MealPlanView(APIView):
+    """Pick recipes for the week, see recipe/mealplan.py.
+
+    ``?meals=7&pantry=rice,eggs&calories=14000&protein=500``: nutrient
+    targets are totals for the whole plan. Only recipes with a known cost
+    and nutrition take part.
+    """
+
+    authentication_classes = RecipeViewSet.authentication_classes
+    permission_classes = RecipeViewSet.permission_classes
+    renderer_classes = RecipeViewSet.renderer_classes
+
+    def get(self, request):
+        params = request.query_params.copy()
+        params['pantry'] = ','.join(params.getlist('pantry'))
+        query = MealPlanQuerySerializer(data=params)
+        query.is_valid(raise_exception=True)
+        meals = query.validated_data['meals']
+        pantry = parse_ingredients(query.validated_data['pantry'])
+        targets = {
+            name: query.validated_data[name]
+            for name in NUTRIENTS
+            if name in query.validated_data
+        }
+
+        try:
+            plan = cached_for_scope(
+                user_scope(request.user.pk),
+                'mealplan',
+                {'meals': meals, 'pantry': sorted(pantry), 'targets': targets},
+                lambda: self.build_plan(meals, pantry, targets),
+            )
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(plan)
+
+    def build_plan(self, meals, pantry, targets):
+        # NumPy based, imported on first use to keep process startup fast
+        from .mealplan import plan_meals
+
+        recipes = plan_meals(
+            self.request.user,
+            meals,
+            pantry,
+            targets,
+            candidates=settings.MEALPLAN_CANDIDATES,
+            time_budget=settings.MEALPLAN_TIME_BUDGET,
+        )
+        total = {'cost': sum(recipe.cost for recipe in recipes)}
+        for name in NUTRIENTS:
+            total[name] = round(sum(getattr(recipe, name) for recipe in recipes), 1)
+        shopping_list = []
+        for recipe in recipes:
+            for name in parse_ingredients(recipe.ingredient):
+                if name not in pantry and name not in shopping_list:
+                    shopping_list.append(name)
+        serializer = MealPlanSerializer(
+            {'meals': recipes, 'total': total, 'shopping_list': shopping_list}
+        )
+        return serializer.data
+
+
+class ShoppingListView(APIView):
+    """Merge the ingredients of some of the user's recipes into one list.
+
+    ``?recipes=3,5,8&pantry=flour 500g,salt``: quantities are added up per
+    ingredient, what the pantry has is subtracted, and the rest is grouped
+    by store section, see recipe/shopping.py.
+    """
+
+    authentication_classes = RecipeViewSet.authentication_classes
+    permission_classes = RecipeViewSet.permission_classes
+    renderer_classes = RecipeViewSet.renderer_classes
+
+    def get(self, request):
+        params = request.query_params.copy()
+        params.setlist(
+            'recipes',
+            [
+                pk.strip()
+                for value in params.getlist('recipes')
+                for pk in value.split(',')
+                if pk.strip()
+            ],
+        )
+        params['pantry'] = ','.join(params.getlist('pantry'))
+        query = ShoppingListQuerySerializer(data=params)
+        query.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(query.validated_data['recipes']))
+
+        # scoped like RecipeViewSet.get_queryset
+        found = set(
+            Recipe.objects.filter(user=request.user, id__in=ids).values_list(
+                'id', flat=True
+            )
+        )
+        sections = shopping_list(
+            [pk for pk in ids if pk in found], query.validated_data['pantry']
+        )
+        serializer = ShoppingListSerializer(
+            {'sections': sections, 'missing': [pk for pk in ids if pk not in found]}
+        )
+        return Response(serializer.data)
+
+
+class TokenObtainView(APIView):
+    """Exchange username and password for an access/refresh token pair."""
+
+    authentication_classes = []
+    permission_classes = [
+        AllowAny,
+    ]
+    throttle_scope = 'auth'
+
+    def post(self, request):
+        serializer = TokenObtainSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = authenticate(request, **serializer.validated_data)
+        if user is None:
+            return Response(
+                {'detail': 'Invalid username or password.'},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+        return Response(issue_tokens(user))
+
+
+class TokenRefreshView(APIView):
+    """Exchange a refresh token for a new access token."""
+
+    authentication_classes = []
+    permission_classes = [
+        AllowAny,
+    ]
+    throttle_scope = 'auth'
+
+    def post(self, request):
+        serializer = TokenRefreshSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = user_from_refresh_token(serializer.validated_data['refresh'])
+        if user is None:
+            return Response(
+                {'detail': 'Invalid or expired refresh token.'},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+        return Response(
+            {
+                'access': issue_access_token(user.pk),
+                'expires_in': settings.AUTH_TOKEN_ACCESS_TTL,
+            }
+        )
@@ -1,15 +1,25 @@
 #!/bin/bash
 
 
-# wait for migration until the db service starts
-while ! nc -z db 5432 ; do
-    echo "Waiting for the MySQL Server"
-    sleep 3
-done
+# wait for the database (exponential backoff) and check for unapplied
+# migrations, see api/recipe/management/commands/prestart.py; migrations are
+# generated at development time and committed, never at startup
+
+# SERVER_MODE=worker: background job worker, see api/jobs/queue.py; the web
+# container runs the migrations, the worker waits until they are applied; its
+# cache invalidations must reach the web processes, so it needs the shared cache
+if [ "$SERVER_MODE" = "worker" ]; then
+    python manage.py prestart --wait-for-migrations --require-shared-cache --timeout 300 || exit 1
+    exec python manage.py run_worker
+fi
 
 # python manage.py collectstatic --noinput&&
-python manage.py makemigrations &&
-python manage.py migrate &&
+python manage.py prestart --migrate || exit 1
+
+# SERVER_MODE=asgi: multi-worker production server, see api/gunicorn.conf.py
+if [ "$SERVER_MODE" = "asgi" ]; then
+    exec gunicorn backend.asgi:application -c gunicorn.conf.py
+fi
 python manage.py runserver 0.0.0.0:8000
 
 # uwsgi --ini /var/www/html/myproject/uwsgi.ini &&